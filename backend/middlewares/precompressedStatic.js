@@ -0,0 +1,76 @@
+import fsp from 'node:fs/promises';
+import path from 'node:path';
+
+// Serves files listed in <root>/etags.json (written by scripts/catalog_artifacts.py compress)
+// using their precompressed .br/.gz siblings and recorded strong ETags, so responses need
+// no compression or hashing per request. Anything not in the manifest, or whose original no
+// longer matches the recorded size/mtime (rewritten since it was precompressed), falls
+// through to next() so express.static serves the current bytes.
+export function precompressedStatic(root) {
+  const manifestPath = path.join(root, 'etags.json');
+  let cached = { mtimeMs: -1, files: {} };
+
+  async function loadManifest() {
+    try {
+      const st = await fsp.stat(manifestPath);
+      if (st.mtimeMs !== cached.mtimeMs) {
+        const data = JSON.parse(await fsp.readFile(manifestPath, 'utf-8'));
+        cached = { mtimeMs: st.mtimeMs, files: (data && data.files) || {} };
+      }
+    } catch {
+      cached = { mtimeMs: -1, files: {} };
+    }
+    return cached.files;
+  }
+
+  async function isCurrent(record, rel) {
+    try {
+      const st = await fsp.stat(path.join(root, rel));
+      // mtime_ns is beyond double precision, so compare at millisecond resolution
+      return st.size === record.bytes && Math.abs(st.mtimeMs - record.mtime_ns / 1e6) < 1;
+    } catch {
+      return false;
+    }
+  }
+
+  function pickEncoding(record, acceptEncoding) {
+    const encodings = record.encodings || {};
+    if (encodings.br && /\bbr\b/.test(acceptEncoding)) return 'br';
+    if (encodings.gzip && /\bgzip\b/.test(acceptEncoding)) return 'gzip';
+    return null;
+  }
+
+  return async (req, res, next) => {
+    if (req.method !== 'GET' && req.method !== 'HEAD') return next();
+    let rel;
+    try {
+      rel = decodeURIComponent(req.path).replace(/^\/+/, '');
+    } catch {
+      return next();
+    }
+    const files = await loadManifest();
+    const record = Object.prototype.hasOwnProperty.call(files, rel) ? files[rel] : null;
+    if (!record || !(await isCurrent(record, rel))) return next();
+
+    const encoding = pickEncoding(record, String(req.headers['accept-encoding'] || ''));
+    const variant = encoding ? record.encodings[encoding] : { file: rel, etag: record.etag };
+    res.setHeader('Vary', 'Accept-Encoding');
+    res.setHeader('ETag', variant.etag);
+    res.setHeader('Content-Type', record.type || 'application/octet-stream');
+    res.setHeader('Cache-Control', 'no-cache');
+    if (encoding) res.setHeader('Content-Encoding', encoding);
+
+    const ifNoneMatch = String(req.headers['if-none-match'] || '');
+    if (ifNoneMatch && ifNoneMatch.split(/\s*,\s*/).includes(variant.etag)) {
+      return res.status(304).end();
+    }
+    // Manifest keys are relative paths written by the pipeline, never raw request paths
+    return res.sendFile(path.join(root, variant.file), { etag: false, lastModified: false }, (err) => {
+      if (err && !res.headersSent) {
+        // Sibling vanished between manifest write and request; let express.static serve the original
+        for (const h of ['Vary', 'ETag', 'Content-Type', 'Cache-Control', 'Content-Encoding']) res.removeHeader(h);
+        next();
+      }
+    });
+  };
+}
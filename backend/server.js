@@ -6,6 +6,7 @@ import { fileURLToPath } from 'node:url';
 import medicinesRouter from './routes/medicines.js';
 import uploadRouter from './routes/upload.js';
 import categoriesRouter from './routes/categories.js';
+import { precompressedStatic } from './middlewares/precompressedStatic.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -21,6 +22,10 @@ app.use(morgan('dev'));
 // Serve shared images folder so admin can preview
 app.use('/medicines', express.static(path.join(PUBLIC_DIR, 'medicines')));
 
+// Catalog artifacts (shards/listing) built by scripts/catalog_artifacts.py; precompressed when etags.json lists them
+const CATALOG_DIR = path.join(PUBLIC_DIR, 'catalog');
+app.use('/catalog', precompressedStatic(CATALOG_DIR), express.static(CATALOG_DIR));
+
 // API routes
 app.use('/api', medicinesRouter);
 app.use('/api', uploadRouter);
@@ -1,7 +1,11 @@
+import os
 import re
 import json
+import argparse
 from pathlib import Path
 
+from json_stream import stream_transform
+
 DATA_PATH = Path(r"S:\MedCare\src\data\medicines.json")
 
 DETAIL_LABELS = [
@@ -45,8 +49,11 @@ def load_json(path: Path):
         return json.load(f)
 
 def save_json(path: Path, data):
-    with path.open("w", encoding="utf-8") as f:
+    # Write beside the target and rename, so a failed write never truncates the catalog
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
 
 
 def infer_strength(entry):
@@ -159,16 +166,39 @@ def normalize_details(entry):
     entry["details"] = merged
 
 
+def fill_entry(e) -> bool:
+    """Normalize e's details in place; True if they changed."""
+    before = json.dumps(e.get("details") or [], ensure_ascii=False)
+    normalize_details(e)
+    after = json.dumps(e.get("details") or [], ensure_ascii=False)
+    return before != after
+
+
 def main():
-    data = load_json(DATA_PATH)
+    parser = argparse.ArgumentParser(description="Fill missing detail rows in medicines.json from entry fields")
+    parser.add_argument("--path", type=str, default=str(DATA_PATH), help="Path to medicines.json")
+    parser.add_argument("--stream", action="store_true", help="Process entries one at a time (bounded memory, for very large files)")
+    args = parser.parse_args()
+    path = Path(args.path)
+
+    if args.stream:
+        updated = 0
+
+        def fill(e):
+            nonlocal updated
+            updated += fill_entry(e)
+            return e
+
+        total = stream_transform(str(path), str(path), fill)
+        print(f"Auto-filled details for {updated} medicines. Total: {total}")
+        return
+
+    data = load_json(path)
     updated = 0
     for e in data:
-        before = json.dumps(e.get("details") or [], ensure_ascii=False)
-        normalize_details(e)
-        after = json.dumps(e.get("details") or [], ensure_ascii=False)
-        if before != after:
+        if fill_entry(e):
             updated += 1
-    save_json(DATA_PATH, data)
+    save_json(path, data)
     print(f"Auto-filled details for {updated} medicines. Total: {len(data)}")
 
 if __name__ == "__main__":
@@ -0,0 +1,488 @@
+"""Derived catalog artifacts built from a finished medicines.json.
+
+medicines.json is ~800 KB and every consumer parses all of it. The writers here emit
+smaller, purpose-built files next to it so pages can load only what they need:
+
+  shards   one JSON file per category plus index.json with counts, SHA-256 and byte sizes:
+             <shard-dir>/index.json
+             <shard-dir>/erectile-dysfunction.json
+             ...
+           Shard file names use the same slug as the backend's category slugs
+           ("Hormones & Steroids" -> "hormones-and-steroids").
+
+  listing  a compact listing for grids/search plus one full detail file per medicine id:
+             <listing-dir>/index.json
+             <listing-dir>/listing.json        [{"id", "name", "category", "price", "image", ..., "detail"}]
+             <listing-dir>/details/<id>.json   the complete entry (details, images, description, ...)
+           Each listing row's "detail" is the detail file's path relative to the listing dir.
+
+  compress .gz (gzip -9) and, when the brotli module is installed, .br (quality 11) siblings
+           for every JSON/text artifact, plus <root>/etags.json with strong ETags per
+           encoding so a static server (or backend/middlewares/precompressedStatic.js)
+           can serve precompressed bytes without compressing or hashing per request.
+           Files whose size and mtime match the recorded entry are not recompressed.
+
+Every writer only rewrites files whose bytes changed, so reruns are cheap and file
+mtimes stay stable for static servers and caches. Shards are derived artifacts: rerun
+this (or the generator with --shard-dir) after editing medicines.json through the admin
+backend or scripts such as auto_fill_details.py.
+
+Usage (PowerShell):
+  py .\\scripts\\catalog_artifacts.py shards --json "s:\\MedCare\\src\\data\\medicines.json" --out-dir "s:\\MedCare\\public\\catalog\\categories"
+  py .\\scripts\\catalog_artifacts.py listing --json "s:\\MedCare\\src\\data\\medicines.json" --out-dir "s:\\MedCare\\public\\catalog"
+
+  py .\\scripts\\catalog_artifacts.py compress "s:\\MedCare\\public\\catalog"
+
+The unified generator runs the same writers with --shard-dir, --listing-dir and --precompress.
+
+Requirements (optional, for .br):
+  pip install brotli
+"""
+from __future__ import annotations
+import os
+import re
+import gzip
+import json
+import hashlib
+import argparse
+import mimetypes
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import brotli
+except Exception:  # pragma: no cover - optional dependency notification
+    brotli = None
+
+INDEX_NAME = "index.json"
+SHARD_FORMAT_VERSION = 1
+LISTING_FORMAT_VERSION = 1
+# Fields a card/grid needs; everything else stays in the per-id detail file
+LISTING_FIELDS = ("id", "name", "category", "categories", "price", "form", "strength", "manufacturer", "inStock", "requiresPrescription", "image")
+SAFE_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,150}$")
+ETAGS_NAME = "etags.json"
+ETAGS_FORMAT_VERSION = 1
+PRECOMPRESS_EXTS = {".json", ".svg", ".txt", ".css", ".js", ".html", ".xml", ".map"}
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+
+def category_slug(label: str) -> str:
+    """Slug matching backend/controllers/medicinesController.js `slug` for category labels."""
+    s = str(label or "").strip().lower().replace("&", " and ")
+    out: List[str] = []
+    prev_dash = False
+    for ch in s:
+        if ch.isascii() and ch.isalnum():
+            out.append(ch)
+            prev_dash = False
+        elif not prev_dash:
+            out.append("-")
+            prev_dash = True
+    return "".join(out).strip("-") or "uncategorized"
+
+
+def dump_compact(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return sha256_bytes(f.read())
+    except OSError:
+        return None
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Atomically write data to path unless it already holds exactly these bytes.
+
+    Rewriting a file also drops its .gz/.br siblings so they cannot outlive the bytes they
+    were made from; prune_precompressed() then clears the etags.json entries once per build.
+    """
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    if os.path.basename(path) != ETAGS_NAME and not path.endswith(tuple(COMPRESSED_SUFFIXES.values())):
+        for suffix in COMPRESSED_SUFFIXES.values():
+            if os.path.isfile(path + suffix):
+                os.remove(path + suffix)
+    return True
+
+
+def load_index(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def index_up_to_date(out_dir: str, version: int, source_sha256: Optional[str]) -> bool:
+    """True when out_dir/index.json was built by this format version from a source with this SHA-256."""
+    index = load_index(os.path.join(out_dir, INDEX_NAME))
+    return bool(source_sha256) and index.get("version") == version and (index.get("source") or {}).get("sha256") == source_sha256
+
+
+def shards_up_to_date(shard_dir: str, source_sha256: Optional[str]) -> bool:
+    return index_up_to_date(shard_dir, SHARD_FORMAT_VERSION, source_sha256)
+
+
+def listing_up_to_date(listing_dir: str, source_sha256: Optional[str]) -> bool:
+    return index_up_to_date(listing_dir, LISTING_FORMAT_VERSION, source_sha256)
+
+
+def remove_stale_json(out_dir: str, previous: Iterable[str], keep: set) -> int:
+    """Remove files a previous run wrote (previous) that are not in keep, with their precompressed siblings.
+
+    Only names recorded by the previous run are candidates, so unrelated JSON that happens
+    to share the directory is never touched.
+    """
+    removed = 0
+    for fname in set(previous) - set(keep):
+        # Recorded names are plain file names; anything else did not come from these writers
+        if not fname.endswith(".json") or os.path.basename(fname) != fname or fname in (INDEX_NAME, ETAGS_NAME):
+            continue
+        path = os.path.join(out_dir, fname)
+        if os.path.isfile(path):
+            os.remove(path)
+            removed += 1
+        for suffix in COMPRESSED_SUFFIXES.values():
+            if os.path.isfile(path + suffix):
+                os.remove(path + suffix)
+    return removed
+
+
+def shard_dir_conflict(shard_dir: Optional[str], listing_dir: Optional[str] = None, data_dir: Optional[str] = None) -> Optional[str]:
+    """Why shard_dir cannot be used, or None.
+
+    Shards share index.json with the listing and would mix category files into the data
+    directory, so both must live elsewhere.
+    """
+    if not shard_dir:
+        return None
+    target = os.path.normcase(os.path.abspath(shard_dir))
+    if listing_dir and target == os.path.normcase(os.path.abspath(listing_dir)):
+        return f"--shard-dir must differ from the listing directory ({listing_dir}); both write index.json"
+    if data_dir and target == os.path.normcase(os.path.abspath(data_dir)):
+        return f"--shard-dir must not be the data directory ({data_dir}); use e.g. public/catalog/categories"
+    return None
+
+
+def write_category_shards(entries: List[Dict], shard_dir: str, folder_by_category: Optional[Dict[str, str]] = None, source_sha256: Optional[str] = None) -> Dict:
+    """Write one compact JSON array per category plus an index manifest.
+
+    folder_by_category maps display names back to medicines/ folder names (the inverse of
+    CATEGORY_DISPLAY_MAP) and is recorded in the index for tooling. Returns the index.
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for e in entries:
+        if isinstance(e, dict):
+            groups.setdefault(str(e.get("category") or "Uncategorized"), []).append(e)
+
+    previous_files = [s.get("file") or "" for s in load_index(os.path.join(shard_dir, INDEX_NAME)).get("shards") or []]
+    shards: List[Dict] = []
+    written = 0
+    used_files = {INDEX_NAME}
+    for category in sorted(groups):
+        items = groups[category]
+        fname = f"{category_slug(category)}.json"
+        used_files.add(fname)
+        payload = dump_compact(items)
+        if write_if_changed(os.path.join(shard_dir, fname), payload):
+            written += 1
+        shard = {
+            "category": category,
+            "slug": fname[:-len(".json")],
+            "file": fname,
+            "count": len(items),
+            "bytes": len(payload),
+            "sha256": sha256_bytes(payload),
+        }
+        if folder_by_category and category in folder_by_category:
+            shard["folder"] = folder_by_category[category]
+        shards.append(shard)
+
+    # Drop shards for categories that no longer exist
+    removed = remove_stale_json(shard_dir, previous_files, used_files)
+
+    index = {
+        "version": SHARD_FORMAT_VERSION,
+        "total": sum(s["count"] for s in shards),
+        "source": {"sha256": source_sha256} if source_sha256 else None,
+        "shards": shards,
+    }
+    write_if_changed(os.path.join(shard_dir, INDEX_NAME), json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8"))
+    print(f"  Shards: {len(shards)} categories in {shard_dir} ({written} written, {removed} removed)")
+    return index
+
+
+def detail_file_name(entry_id: str) -> str:
+    """File name for an entry's detail file; ids that are not plain slugs get a stable hashed name."""
+    if SAFE_ID_RE.match(entry_id) and not entry_id.endswith("."):
+        return f"{entry_id}.json"
+    return f"{category_slug(entry_id)[:80]}-{hashlib.sha1(entry_id.encode('utf-8')).hexdigest()[:10]}.json"
+
+
+def listing_row(entry: Dict, detail_path: str) -> Dict:
+    row = {k: entry[k] for k in LISTING_FIELDS if k in entry}
+    # Keep only the primary image's dimensions/placeholder/variants for the card
+    meta = (entry.get("imageMeta") or {}).get(entry.get("image"))
+    if meta:
+        row["imageMeta"] = {entry["image"]: meta}
+    row["detail"] = detail_path
+    return row
+
+
+def previous_detail_files(listing_dir: str) -> List[str]:
+    """Detail file names referenced by the listing.json a previous run wrote."""
+    try:
+        with open(os.path.join(listing_dir, "listing.json"), "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    except Exception:
+        return []
+    out: List[str] = []
+    for row in rows if isinstance(rows, list) else []:
+        detail = row.get("detail") if isinstance(row, dict) else None
+        if isinstance(detail, str) and detail.startswith("details/"):
+            out.append(detail[len("details/"):])
+    return out
+
+
+def write_listing(entries: List[Dict], listing_dir: str, source_sha256: Optional[str] = None) -> Dict:
+    """Write listing.json (card fields only) and details/<id>.json (full entry) per medicine.
+
+    Entries without an id cannot be addressed and are skipped; duplicate ids keep the first
+    entry, matching how the backend's findIndex lookups resolve them. Returns the index.
+    """
+    details_dir = os.path.join(listing_dir, "details")
+    previous_files = previous_detail_files(listing_dir)
+    rows: List[Dict] = []
+    used_files = set()
+    written = 0
+    skipped = 0
+    for e in entries:
+        eid = str(e.get("id") or "") if isinstance(e, dict) else ""
+        if not eid:
+            skipped += 1
+            continue
+        fname = detail_file_name(eid)
+        if fname in used_files:
+            skipped += 1
+            continue
+        used_files.add(fname)
+        if write_if_changed(os.path.join(details_dir, fname), dump_compact(e)):
+            written += 1
+        rows.append(listing_row(e, f"details/{fname}"))
+
+    removed = remove_stale_json(details_dir, previous_files, used_files)
+    payload = dump_compact(rows)
+    write_if_changed(os.path.join(listing_dir, "listing.json"), payload)
+
+    index = {
+        "version": LISTING_FORMAT_VERSION,
+        "total": len(rows),
+        "source": {"sha256": source_sha256} if source_sha256 else None,
+        "listing": {"file": "listing.json", "bytes": len(payload), "sha256": sha256_bytes(payload), "fields": list(LISTING_FIELDS)},
+        "details": {"dir": "details", "count": len(rows)},
+    }
+    write_if_changed(os.path.join(listing_dir, INDEX_NAME), json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8"))
+    print(f"  Listing: {len(rows)} rows ({len(payload)} bytes) in {listing_dir}; details {written} written, {removed} removed, {skipped} skipped")
+    return index
+
+
+def compression_codecs() -> List[str]:
+    return ["gzip", "br"] if brotli is not None else ["gzip"]
+
+
+def strong_etag(digest: str, encoding: Optional[str] = None) -> str:
+    # Each encoding is a different representation and needs its own strong validator
+    return f'"{digest[:32]}-{encoding}"' if encoding else f'"{digest[:32]}"'
+
+
+def compress_bytes(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        # mtime=0 keeps the output byte-identical across runs
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def list_text_files(directory: str, recursive: bool = True) -> List[str]:
+    """Precompressible artifact files under directory (skipping etags.json and existing .gz/.br)."""
+    out: List[str] = []
+    if not os.path.isdir(directory):
+        return out
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for fname in sorted(filenames):
+            if fname != ETAGS_NAME and os.path.splitext(fname)[1].lower() in PRECOMPRESS_EXTS:
+                out.append(os.path.join(dirpath, fname))
+        if not recursive:
+            break
+    return out
+
+
+def precompress(root: str, files: Sequence[str], manifest_path: Optional[str] = None) -> Dict:
+    """Write compressed siblings for files under root and merge their ETags into root/etags.json.
+
+    A variant is only kept when it is smaller than the original. Manifest keys are paths
+    relative to root with forward slashes (the URL path below wherever root is served).
+    """
+    manifest_path = manifest_path or os.path.join(root, ETAGS_NAME)
+    manifest = load_index(manifest_path)
+    if manifest.get("version") != ETAGS_FORMAT_VERSION:
+        manifest = {}
+    records: Dict[str, Dict] = dict(manifest.get("files") or {})
+    codecs = compression_codecs()
+    compressed = 0
+    reused = 0
+    raw_bytes = 0
+    best_bytes = 0
+
+    for path in files:
+        rel = os.path.relpath(path, root).replace(os.sep, "/")
+        if rel.startswith("../"):
+            print(f"ERROR: {path} is outside {root}; skipping")
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        record = records.get(rel)
+        if (
+            record
+            and record.get("bytes") == st.st_size
+            and record.get("mtime_ns") == st.st_mtime_ns
+            and record.get("codecs") == codecs
+            and all(os.path.isfile(os.path.join(root, v["file"])) for v in (record.get("encodings") or {}).values())
+        ):
+            reused += 1
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = sha256_bytes(data)
+            record = {
+                "bytes": len(data),
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": digest,
+                "etag": strong_etag(digest),
+                "type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+                "codecs": codecs,
+                "encodings": {},
+            }
+            for codec in codecs:
+                sibling = path + COMPRESSED_SUFFIXES[codec]
+                packed = compress_bytes(data, codec)
+                if len(packed) < len(data):
+                    write_if_changed(sibling, packed)
+                    record["encodings"][codec] = {"file": rel + COMPRESSED_SUFFIXES[codec], "bytes": len(packed), "etag": strong_etag(digest, codec)}
+                elif os.path.exists(sibling):
+                    os.remove(sibling)
+            records[rel] = record
+            compressed += 1
+        raw_bytes += record["bytes"]
+        best_bytes += min([record["bytes"]] + [v["bytes"] for v in record["encodings"].values()])
+
+    # Forget files that no longer exist
+    records = {rel: r for rel, r in records.items() if os.path.isfile(os.path.join(root, rel.replace("/", os.sep)))}
+    manifest = {"version": ETAGS_FORMAT_VERSION, "files": dict(sorted(records.items()))}
+    write_if_changed(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    print(f"  Precompressed: {compressed} files ({', '.join(codecs)}), {reused} unchanged, {raw_bytes} -> {best_bytes} bytes in {root}")
+    return manifest
+
+
+def prune_precompressed(root: str) -> int:
+    """Drop etags.json entries under root whose file is gone or no longer matches its recorded size/mtime.
+
+    One read and (if anything changed) one write of the manifest, however many artifacts a
+    writer rewrote. Returns the number of entries dropped.
+    """
+    manifest_path = os.path.join(root, ETAGS_NAME)
+    manifest = load_index(manifest_path)
+    files = manifest.get("files") or {}
+    stale = []
+    for rel, record in files.items():
+        try:
+            st = os.stat(os.path.join(root, rel.replace("/", os.sep)))
+        except OSError:
+            stale.append(rel)
+            continue
+        if st.st_size != record.get("bytes") or st.st_mtime_ns != record.get("mtime_ns"):
+            stale.append(rel)
+    for rel in stale:
+        for variant in (files.pop(rel).get("encodings") or {}).values():
+            sibling = os.path.join(root, variant["file"].replace("/", os.sep))
+            if os.path.isfile(sibling):
+                os.remove(sibling)
+    if stale:
+        write_if_changed(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    return len(stale)
+
+
+def load_entries(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array in {path}")
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build derived catalog artifacts from medicines.json.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_shards = sub.add_parser("shards", help="Write one JSON file per category plus index.json")
+    p_shards.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="Source medicines.json")
+    p_shards.add_argument("--out-dir", default=os.path.join(os.getcwd(), "public", "catalog", "categories"), help="Shard output directory")
+    p_shards.add_argument("--catalog-root", default=os.path.join(os.getcwd(), "public", "catalog"), help="Directory whose etags.json is pruned of rewritten files")
+
+    p_listing = sub.add_parser("listing", help="Write listing.json plus one detail file per medicine id")
+    p_listing.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="Source medicines.json")
+    p_listing.add_argument("--out-dir", default=os.path.join(os.getcwd(), "public", "catalog"), help="Listing output directory")
+    p_listing.add_argument("--catalog-root", default=os.path.join(os.getcwd(), "public", "catalog"), help="Directory whose etags.json is pruned of rewritten files")
+
+    p_compress = sub.add_parser("compress", help="Write .gz/.br siblings and etags.json for JSON/text artifacts")
+    p_compress.add_argument("paths", nargs="+", help="Files or directories (searched recursively) to precompress")
+    p_compress.add_argument("--root", default=None, help="Directory the files are served from; etags.json is written there (default: the single directory given, else the common parent)")
+
+    args = parser.parse_args()
+
+    if args.command == "compress":
+        files: List[str] = []
+        for p in args.paths:
+            files.extend(list_text_files(p) if os.path.isdir(p) else [p])
+        root = args.root
+        if root is None:
+            if len(args.paths) == 1 and os.path.isdir(args.paths[0]):
+                root = args.paths[0]
+            else:
+                root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files]) if files else os.getcwd()
+        precompress(root, files)
+        return
+
+    if args.command == "shards":
+        conflict = shard_dir_conflict(args.out_dir, data_dir=os.path.dirname(os.path.abspath(args.json)))
+        if conflict:
+            parser.error(conflict)
+    entries = load_entries(args.json)
+    if args.command == "shards":
+        write_category_shards(entries, args.out_dir, source_sha256=sha256_file(args.json))
+    elif args.command == "listing":
+        write_listing(entries, args.out_dir, source_sha256=sha256_file(args.json))
+    prune_precompressed(args.catalog_root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Append-only, delta-encoded history of medicines.json.
+
+src/data used to keep whole copies of earlier catalogs (medicines.previous.json,
+medicines.previous2.json, medicines.backup.json) so merge_old_details.py could restore
+details lost by a regeneration. This store keeps every version in one JSON-lines log that
+records only what changed per entry between versions:
+
+  {"op": "put",    "v": 1, "id": "kamagra-100-mg", "entry": {...}}            new (or re-added) entry
+  {"op": "patch",  "v": 2, "id": "kamagra-100-mg", "set": {...}, "unset": [...]} changed fields
+  {"op": "del",    "v": 2, "id": "old-medicine"}
+  {"op": "commit", "v": 2, "ts": 1734950000.0, "source": "medicines.json", "sha256": "...",
+   "count": 516, "order": [...] or null}
+
+A version's records only count once its commit record is written (fsynced), so a crash
+mid-append leaves the previous versions intact; the uncommitted tail is truncated by the
+next append. "order" (the entry keys in array order) is stored only when it changed.
+Entries are keyed by id; a repeated id within one catalog gets "#2", "#3", ... suffixes.
+
+A sidecar <store>.idx.json maps every key to the byte offsets of its records, so per-entry
+queries ("last non-empty value of field X for id Y", an entry at version N) seek straight
+to those lines instead of replaying the log. It is rebuilt automatically when missing or
+out of date. Reconstructing a whole version replays the log once, sequentially.
+
+Usage (PowerShell):
+  # Migrate the old snapshot copies, oldest first (they can then be deleted)
+  py .\\scripts\\catalog_history.py import "s:\\MedCare\\src\\data\\medicines.backup.json" "s:\\MedCare\\src\\data\\medicines.previous2.json" "s:\\MedCare\\src\\data\\medicines.previous.json"
+
+  # Record the current catalog as a new version (no-op if nothing changed)
+  py .\\scripts\\catalog_history.py append --json "s:\\MedCare\\src\\data\\medicines.json"
+
+  py .\\scripts\\catalog_history.py log
+  py .\\scripts\\catalog_history.py show --version 2 --out medicines.v2.json
+  py .\\scripts\\catalog_history.py get --id kamagra-100-mg --field usage
+
+merge_old_details.py reads this store (when present) instead of the snapshot files.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+import argparse
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+HISTORY_FORMAT_VERSION = 1
+SNAPSHOT_ENCODINGS = ("utf-8", "utf-8-sig", "utf-16", "utf-16-le", "utf-16-be")
+
+
+def default_history_path(json_path: str) -> str:
+    base, _ = os.path.splitext(json_path)
+    return f"{base}.history.jsonl"
+
+
+def load_snapshot(path: str) -> List[Dict]:
+    """Load a catalog JSON array, accepting the UTF-16 files some editors and git checkouts produce."""
+    for enc in SNAPSHOT_ENCODINGS:
+        try:
+            with open(path, "r", encoding=enc) as f:
+                data = json.load(f)
+        except (UnicodeError, ValueError):
+            continue
+        if not isinstance(data, list):
+            raise ValueError(f"Expected a JSON array in {path}")
+        return data
+    raise ValueError(f"Failed to read JSON file: {path}")
+
+
+def is_empty(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return not value.strip()
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def entry_keys(entries: Sequence[Dict]) -> List[str]:
+    """Stable key per entry: its id, with #2, #3, ... for repeats (or #n by position when id is missing)."""
+    keys: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, entry in enumerate(entries):
+        base = str(entry.get("id") or f"#{i}")
+        seen[base] = seen.get(base, 0) + 1
+        keys.append(base if seen[base] == 1 else f"{base}#{seen[base]}")
+    return keys
+
+
+def diff_entry(old: Dict, new: Dict) -> Tuple[Dict, List[str]]:
+    changed = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+
+def apply_record(state: Dict[str, Dict], rec: Dict) -> None:
+    op = rec["op"]
+    if op == "put":
+        state[rec["id"]] = rec["entry"]
+    elif op == "patch":
+        entry = dict(state.get(rec["id"]) or {})
+        entry.update(rec.get("set") or {})
+        for field in rec.get("unset") or []:
+            entry.pop(field, None)
+        state[rec["id"]] = entry
+    elif op == "del":
+        state.pop(rec["id"], None)
+
+
+def merge_details(older: List, newer: List) -> List:
+    """Per label, the newer non-empty value wins; rows keep the newer order with older-only labels appended."""
+    rows: Dict[str, Dict] = {}
+    for source in (older, newer):
+        for row in source or []:
+            if isinstance(row, dict) and row.get("label"):
+                label = str(row["label"])
+                if label not in rows or not is_empty(row.get("value")):
+                    rows[label] = row
+    labels = [str(r["label"]) for r in newer or [] if isinstance(r, dict) and r.get("label")]
+    labels += [label for label in rows if label not in labels]
+    return [rows[label] for label in labels]
+
+
+class CatalogHistory:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = f"{path}.idx.json"
+        self._index: Optional[Dict] = None
+
+    # Index handling
+
+    def _scan(self) -> Iterator[Tuple[int, Dict]]:
+        """Yield (offset, record) for every committed record, in log order."""
+        if not os.path.exists(self.path):
+            return
+        pending: List[Tuple[int, Dict]] = []
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                start = offset
+                offset += len(line)
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash mid-append
+                pending.append((start, rec))
+                if rec.get("op") == "commit":
+                    yield from (p for p in pending if p[1].get("v") == rec["v"])
+                    pending = []
+
+    def _rebuild_index(self) -> Dict:
+        index = {"version": HISTORY_FORMAT_VERSION, "committed_bytes": 0, "versions": [], "ids": {}}
+        for offset, rec in self._scan():
+            self._index_record(index, offset, rec)
+        self._save_index(index)
+        return index
+
+    @staticmethod
+    def _index_record(index: Dict, offset: int, rec: Dict) -> None:
+        if rec["op"] == "commit":
+            index["versions"].append({k: rec.get(k) for k in ("v", "ts", "source", "sha256", "count")} | {"offset": offset})
+            # The commit line is the last of its version; committed data ends after it
+            index["committed_bytes"] = offset + len(json.dumps(rec, ensure_ascii=False).encode("utf-8")) + 1
+        else:
+            index["ids"].setdefault(rec["id"], []).append([rec["v"], offset])
+
+    def _save_index(self, index: Dict) -> None:
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.index_path)
+
+    @property
+    def index(self) -> Dict:
+        if self._index is None:
+            index = None
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, "r", encoding="utf-8") as f:
+                        index = json.load(f)
+                except ValueError:
+                    index = None
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if not index or index.get("version") != HISTORY_FORMAT_VERSION or index.get("committed_bytes") != size:
+                index = self._rebuild_index()
+            self._index = index
+        return self._index
+
+    def _read_at(self, offsets: Sequence[int]) -> List[Dict]:
+        records = []
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+    # Queries
+
+    def versions(self) -> List[Dict]:
+        return list(self.index["versions"])
+
+    def latest_version(self) -> int:
+        versions = self.index["versions"]
+        return versions[-1]["v"] if versions else 0
+
+    def keys(self) -> List[str]:
+        return list(self.index["ids"])
+
+    def records_for(self, key: str, version: Optional[int] = None) -> List[Dict]:
+        """Every record of one entry (up to version), read by offset from the index."""
+        refs = [off for v, off in self.index["ids"].get(key, []) if version is None or v <= version]
+        return self._read_at(refs)
+
+    def entry_at(self, key: str, version: Optional[int] = None) -> Optional[Dict]:
+        state: Dict[str, Dict] = {}
+        for rec in self.records_for(key, version):
+            apply_record(state, rec)
+        return state.get(key)
+
+    def last_non_empty(self, key: str, field: str, version: Optional[int] = None):
+        """The most recent non-empty value field ever had for key (up to version), or None."""
+        for rec in reversed(self.records_for(key, version)):
+            if rec["op"] == "put":
+                value = rec["entry"].get(field)
+            elif rec["op"] == "patch" and field in (rec.get("set") or {}):
+                value = rec["set"][field]
+            else:
+                continue
+            if not is_empty(value):
+                return value
+        return None
+
+    def reconstruct(self, version: Optional[int] = None) -> List[Dict]:
+        """The catalog exactly as it was at version (default: latest)."""
+        version = version or self.latest_version()
+        state: Dict[str, Dict] = {}
+        order: List[str] = []
+        for _, rec in self._scan():
+            if rec["v"] > version:
+                break
+            if rec["op"] == "commit":
+                if rec.get("order") is not None:
+                    order = rec["order"]
+            else:
+                apply_record(state, rec)
+        return [state[k] for k in order if k in state]
+
+    def composite_entries(self) -> List[Dict]:
+        """One entry per key ever seen, each field holding its last non-empty value.
+
+        details rows are merged per label the same way. Deleted entries are included (after
+        the current ones), since their details are exactly what a renamed medicine needs.
+        """
+        composite: Dict[str, Dict] = {}
+        order: List[str] = []
+        for _, rec in self._scan():
+            if rec["op"] == "commit":
+                if rec.get("order") is not None:
+                    order = rec["order"]
+                continue
+            if rec["op"] == "del":
+                continue
+            key = rec["id"]
+            merged = composite.setdefault(key, {})
+            for field, value in (rec["entry"] if rec["op"] == "put" else rec.get("set") or {}).items():
+                if field == "details":
+                    merged["details"] = merge_details(merged.get("details") or [], value or [])
+                elif not is_empty(value) or field not in merged:
+                    merged[field] = value
+        current = [k for k in order if k in composite]
+        current_set = set(current)
+        return [composite[k] for k in current + [k for k in composite if k not in current_set]]
+
+    # Appending
+
+    def append_version(self, entries: Sequence[Dict], source: Optional[str] = None) -> Optional[int]:
+        """Record entries as a new version; returns its number, or None if nothing changed."""
+        index = self.index
+        previous = self.latest_version()
+        old_state: Dict[str, Dict] = {}
+        old_order: List[str] = []
+        if previous:
+            for _, rec in self._scan():
+                if rec["op"] == "commit":
+                    if rec.get("order") is not None:
+                        old_order = rec["order"]
+                else:
+                    apply_record(old_state, rec)
+        version = previous + 1
+        keys = entry_keys(entries)
+        records: List[Dict] = []
+        for key, entry in zip(keys, entries):
+            old = old_state.get(key)
+            if old is None:
+                records.append({"op": "put", "v": version, "id": key, "entry": entry})
+                continue
+            changed, removed = diff_entry(old, entry)
+            if changed or removed:
+                rec = {"op": "patch", "v": version, "id": key, "set": changed}
+                if removed:
+                    rec["unset"] = removed
+                records.append(rec)
+        live = set(keys)
+        records.extend({"op": "del", "v": version, "id": key} for key in old_state if key not in live)
+        if not records and keys == old_order:
+            return None
+        payload = json.dumps(list(entries), sort_keys=True, ensure_ascii=False).encode("utf-8")
+        records.append({
+            "op": "commit",
+            "v": version,
+            "ts": time.time(),
+            "source": source,
+            "sha256": hashlib.sha256(payload).hexdigest(),
+            "count": len(entries),
+            "order": keys if keys != old_order else None,
+        })
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "ab") as f:
+            # Drop an uncommitted tail left by a crash so its records cannot join this version
+            f.truncate(index["committed_bytes"])
+            offset = index["committed_bytes"]
+            for rec in records:
+                line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                self._index_record(index, offset, rec)
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._save_index(index)
+        return version
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delta-encoded history of medicines.json versions.")
+    parser.add_argument("--store", default=None, help="History store path (default: <json without .json>.history.jsonl, i.e. src/data/medicines.history.jsonl)")
+    parser.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="Catalog JSON the default store path is derived from")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="Append snapshot files as versions, oldest first")
+    p.add_argument("files", nargs="+")
+    sub.add_parser("append", help="Append --json as a new version")
+    sub.add_parser("log", help="List versions")
+    p = sub.add_parser("show", help="Reconstruct a version")
+    p.add_argument("--version", type=int, default=None, help="Version number (default: latest)")
+    p.add_argument("--out", default=None, help="Write the reconstructed catalog here instead of printing a summary")
+    p = sub.add_parser("get", help="Query one entry")
+    p.add_argument("--id", required=True, help="Entry key (id, or id#2 for a repeated id)")
+    p.add_argument("--field", default=None, help="Print the last non-empty value of this field instead of the whole entry")
+    p.add_argument("--version", type=int, default=None, help="Only consider versions up to this one")
+    args = parser.parse_args()
+
+    history = CatalogHistory(args.store or default_history_path(args.json))
+
+    if args.command in ("import", "append"):
+        files = args.files if args.command == "import" else [args.json]
+        for path in files:
+            before = os.path.getsize(history.path) if os.path.exists(history.path) else 0
+            version = history.append_version(load_snapshot(path), os.path.basename(path))
+            if version is None:
+                print(f"  Unchanged: {path}")
+            else:
+                print(f"  Version {version}: {path} ({os.path.getsize(path)} bytes -> {os.path.getsize(history.path) - before} bytes of deltas)")
+        print(f"Store: {history.path} ({os.path.getsize(history.path) if os.path.exists(history.path) else 0} bytes, {len(history.versions())} versions)")
+        return
+
+    if args.command == "log":
+        for v in history.versions():
+            print(f"  v{v['v']:<4} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(v['ts']))}  {v['count']:>5} entries  {v['source'] or ''}")
+        return
+
+    if args.command == "show":
+        entries = history.reconstruct(args.version)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2, ensure_ascii=False)
+            print(f"Wrote {len(entries)} entries to {args.out}")
+        else:
+            print(f"Version {args.version or history.latest_version()}: {len(entries)} entries")
+        return
+
+    if args.field:
+        value = history.last_non_empty(args.id, args.field, args.version)
+    else:
+        value = history.entry_at(args.id, args.version)
+    print(json.dumps(value, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
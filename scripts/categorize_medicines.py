@@ -10,6 +10,9 @@ Features:
 - Handles conflicts safely (skip if destination exists)
 - Prints a clear summary at the end
 - Optional: --dry-run to preview actions without moving
+- Moves are recorded in a write-ahead journal (see move_journal.py); --resume finishes an interrupted run
+- Optional: --plan-out to write the planned moves to a reviewable plan file, --apply to execute it
+  later without rescanning (see plan_file.py)
 - Optional: --base-dir to change the base directory (default: ./final_web)
 
 Usage (PowerShell on Windows):
@@ -23,10 +26,15 @@ If you run from the project root and your final_web lives alongside the repo, ad
 """
 from __future__ import annotations
 import os
-import shutil
 import argparse
 from typing import Dict, List, Tuple
 
+from keyword_matcher import KeywordMatcher
+from medicine_tree import list_subdirs
+from move_journal import MoveJournal, default_journal_path, resume_moves
+from plan_file import check_plan, dir_stamps, load_plan, move_ops, plan_moves, write_plan
+from unclear_classifier import UnclearClassifier, propose_categories
+
 # Ordered category list and keyword mapping
 # Note: matching is substring-based (case-insensitive). Add common variants/hyphenations.
 CATEGORY_KEYWORDS: List[Tuple[str, List[str]]] = [
@@ -173,17 +181,15 @@ UNCLEAR_CATEGORY = "Unclear"
 
 ALL_CATEGORY_NAMES = [name for name, _ in CATEGORY_KEYWORDS] + [UNCLEAR_CATEGORY]
 
+# Compiled once; each folder name is then scanned a single time for all keywords
+CATEGORY_MATCHER = KeywordMatcher(CATEGORY_KEYWORDS)
+
 
 def detect_category(folder_name: str) -> str:
     """Return best category name for a given folder by keyword matching.
     First match wins (priority based on CATEGORY_KEYWORDS order).
     """
-    low = folder_name.lower()
-    for cat, keywords in CATEGORY_KEYWORDS:
-        for kw in keywords:
-            if kw in low:
-                return cat
-    return UNCLEAR_CATEGORY
+    return CATEGORY_MATCHER.first_category(folder_name, UNCLEAR_CATEGORY)
 
 
 def ensure_category_dirs(base_dir: str) -> None:
@@ -209,42 +215,98 @@ def main() -> None:
         action="store_true",
         help="Also scan inside existing category folders (including 'Unclear') and move items to a better-matched category.",
     )
+    parser.add_argument("--classifier-model", default=None, help="Trained unclear_classifier.py model; used for folders no keyword matches")
+    parser.add_argument("--classifier-threshold", type=float, default=0.7, help="Minimum classifier confidence to use its category instead of Unclear")
+    parser.add_argument("--journal", default=None, help="Move journal path (default: <base-dir>.categorize.journal beside the base directory)")
+    parser.add_argument("--resume", action="store_true", help="Finish the moves recorded in the journal by an interrupted run, without rescanning")
+    parser.add_argument("--plan-out", default=None, help="Write the planned moves to this plan file instead of moving anything")
+    parser.add_argument("--apply", default=None, help="Execute the moves in a plan file written by --plan-out (no rescan)")
+    parser.add_argument("--force", action="store_true", help="With --apply, apply the plan even if the tree changed since it was written")
     args = parser.parse_args()
 
     base_dir = args.base_dir
     dry_run = args.dry_run
+    plan_out = args.plan_out
     do_reclassify = args.reclassify
+    classifier = UnclearClassifier.load(args.classifier_model) if args.classifier_model else None
+    learned_categories = [c for c in ALL_CATEGORY_NAMES if c != UNCLEAR_CATEGORY]
 
     if not os.path.isdir(base_dir):
         print(f"ERROR: Base directory not found: {base_dir}")
         return
 
+    journal_path = args.journal or default_journal_path(base_dir, "categorize")
+    if args.resume:
+        resume_moves(journal_path, os.path.basename(__file__))
+        return
+    journal = MoveJournal(None if dry_run or plan_out else journal_path, os.path.basename(__file__))
+    if journal.has_pending():
+        print(f"ERROR: Unfinished moves in journal {journal_path}; re-run with --resume first")
+        return
+
+    if args.apply:
+        plan = load_plan(args.apply, os.path.basename(__file__))
+        print(f"Applying plan: {args.apply}")
+        if not check_plan(plan, args.force):
+            return
+        moved = errors = 0
+        for src_path, dest_path, err in journal.execute(plan_moves(plan)):
+            name = os.path.basename(src_path)
+            if err is None:
+                print(f"MOVED: '{name}' from {os.path.basename(os.path.dirname(src_path))} -> {os.path.basename(os.path.dirname(dest_path))}")
+                moved += 1
+            else:
+                print(f"ERROR moving '{name}': {err}")
+                errors += 1
+        journal.close()
+        print(f"\nSummary:\n  Moved: {moved}\n  Conflicts/Errors: {errors}")
+        return
+
     print(f"Scanning base directory: {base_dir}")
 
-    ensure_category_dirs(base_dir)
+    # Listings the plan depends on, snapshotted before they are scanned
+    watch = dir_stamps([base_dir] + [os.path.join(base_dir, c) for c in ALL_CATEGORY_NAMES]) if plan_out else {}
+    if not plan_out:
+        ensure_category_dirs(base_dir)
 
     categorized = 0
     moved = 0
     skipped = 0
     conflicts = 0
     unclear = 0
+    classified = 0
 
     try:
-        entries = sorted(os.listdir(base_dir))
+        entries = list_subdirs(base_dir)
     except Exception as e:
         print(f"ERROR: Unable to list directory '{base_dir}': {e}")
         return
 
-    # Process only immediate subdirectories that are not category names
-    for name in entries:
-        src_path = os.path.join(base_dir, name)
-        if not os.path.isdir(src_path):
-            continue  # ignore files
+    detected = {e.name: detect_category(e.name) for e in entries if e.name not in ALL_CATEGORY_NAMES}
+    proposals = {}
+    if classifier is not None:
+        # One batched multiply for every folder keyword matching could not place
+        unmatched = [n for n, c in detected.items() if c == UNCLEAR_CATEGORY]
+        proposals = propose_categories(classifier, unmatched, learned_categories, args.classifier_threshold)
+
+    # Decide every move first, then run them through the journal in fsynced batches
+    moves: List[Tuple[str, str]] = []
+    # With --plan-out every pass's moves are collected here instead of executed
+    planned: List[Tuple[str, str]] = []
+
+    # Process only immediate subdirectories that are not category names (files are ignored)
+    for dir_entry in entries:
+        name = dir_entry.name
+        src_path = dir_entry.path
         if name in ALL_CATEGORY_NAMES:
             # Skip category folders themselves
             continue
 
-        category = detect_category(name)
+        category = detected[name]
+        if name in proposals:
+            category, confidence = proposals[name]
+            print(f"CLASSIFIED: '{name}' -> {category} ({confidence:.2f})")
+            classified += 1
         if category == UNCLEAR_CATEGORY:
             unclear += 1
             categorized += 1
@@ -269,60 +331,90 @@ def main() -> None:
         if dry_run:
             print(f"DRY-RUN MOVE: '{src_path}' -> '{dest_path}'")
         else:
-            try:
-                shutil.move(src_path, dest_dir)
-                print(f"MOVED: '{name}' -> {os.path.basename(dest_dir)}")
-                moved += 1
-            except Exception as e:
-                print(f"ERROR moving '{name}': {e}")
-                conflicts += 1
+            moves.append((src_path, dest_path))
+
+    if plan_out:
+        planned.extend(moves)
+        moves = []
+    for src_path, dest_path, err in journal.execute(moves):
+        name = os.path.basename(src_path)
+        if err is None:
+            print(f"MOVED: '{name}' -> {os.path.basename(os.path.dirname(dest_path))}")
+            moved += 1
+        else:
+            print(f"ERROR moving '{name}': {err}")
+            conflicts += 1
 
     # Optional reclassification pass: scan existing category folders and move items if they match a different category
     reclassified = 0
     if do_reclassify:
+        moves = []
+        # Planned first-pass moves have not happened yet, so reserve their destinations
+        planned_dests = {dest for _, dest in planned}
         for current_category in ALL_CATEGORY_NAMES:
             current_dir = os.path.join(base_dir, current_category)
             if not os.path.isdir(current_dir):
                 continue
             try:
-                sub_entries = sorted(os.listdir(current_dir))
+                sub_entries = list_subdirs(current_dir)
             except Exception as e:
                 print(f"ERROR: Unable to list '{current_dir}': {e}")
                 conflicts += 1
                 continue
 
-            for name in sub_entries:
-                src_path = os.path.join(current_dir, name)
-                if not os.path.isdir(src_path):
-                    continue
-
-                new_category = detect_category(name)
+            detected = {e.name: detect_category(e.name) for e in sub_entries}
+            proposals = {}
+            if classifier is not None:
+                unmatched = [n for n, c in detected.items() if c == UNCLEAR_CATEGORY]
+                proposals = propose_categories(classifier, unmatched, learned_categories, args.classifier_threshold)
+
+            for dir_entry in sub_entries:
+                name = dir_entry.name
+                src_path = dir_entry.path
+
+                new_category = detected[name]
+                if name in proposals:
+                    new_category = proposals[name][0]
+                    if new_category != current_category:
+                        print(f"CLASSIFIED: '{name}' -> {new_category} ({proposals[name][1]:.2f})")
+                        classified += 1
                 if new_category == current_category:
                     continue  # already in best category
 
                 dest_dir = os.path.join(base_dir, new_category)
-                if not os.path.isdir(dest_dir):
+                if not plan_out and not os.path.isdir(dest_dir):
                     os.makedirs(dest_dir, exist_ok=True)
 
                 dest_path = os.path.join(dest_dir, name)
-                if os.path.exists(dest_path):
+                if os.path.exists(dest_path) or dest_path in planned_dests:
                     print(f"RECLASS CONFLICT: Destination exists: {dest_path} — skipping")
                     conflicts += 1
                     continue
+                planned_dests.add(dest_path)
 
                 if dry_run:
                     print(f"RECLASS DRY-RUN MOVE: '{src_path}' -> '{dest_path}'")
                 else:
-                    try:
-                        shutil.move(src_path, dest_dir)
-                        print(
-                            f"RECLASS MOVED: '{name}' from {current_category} -> {new_category}"
-                        )
-                        moved += 1
-                        reclassified += 1
-                    except Exception as e:
-                        print(f"ERROR reclassifying '{name}': {e}")
-                        conflicts += 1
+                    moves.append((src_path, dest_path))
+
+        if plan_out:
+            planned.extend(moves)
+            moves = []
+        for src_path, dest_path, err in journal.execute(moves):
+            name = os.path.basename(src_path)
+            if err is None:
+                print(
+                    f"RECLASS MOVED: '{name}' from {os.path.basename(os.path.dirname(src_path))} -> {os.path.basename(os.path.dirname(dest_path))}"
+                )
+                moved += 1
+                reclassified += 1
+            else:
+                print(f"ERROR reclassifying '{name}': {err}")
+                conflicts += 1
+
+    journal.close()
+    if plan_out:
+        write_plan(plan_out, os.path.basename(__file__), move_ops(planned), watch)
 
     print("\nSummary:")
     print(f"  Total categorized: {categorized}")
@@ -332,8 +424,12 @@ def main() -> None:
     print(f"  Unclear (placed into '{UNCLEAR_CATEGORY}'): {unclear}")
     if do_reclassify:
         print(f"  Reclassified (moved between categories): {reclassified}")
+    if classifier is not None:
+        print(f"  Classified by model (>= {args.classifier_threshold:.2f} confidence): {classified}")
     if dry_run:
         print("\nNote: This was a dry run. Re-run without --dry-run to apply changes.")
+    elif plan_out:
+        print(f"\nNote: Nothing was moved. Review the plan, then apply it with --apply {plan_out}")
 
 
 if __name__ == "__main__":
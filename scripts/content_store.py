@@ -0,0 +1,124 @@
+"""Content-addressed image store shared by the medicines JSON generators.
+
+public/medicines/ and public/medicines_web2/ hold many byte-identical images (the same
+pack shot under two slugs or two catalogs), each stored and served separately. With
+--content-addressed the generators instead publish every image once under its SHA-256:
+
+  public/cas/<first 2 hex>/<sha256><ext>   ->   URL /cas/<first 2 hex>/<sha256><ext>
+
+and point the `image`/`images` fields at those URLs. Identical images share one URL, so
+the deploy artifact shrinks and browser/CDN caches hit across medicines and catalogs.
+Because the URL changes whenever the bytes change, the store can be served with
+immutable, far-future cache headers.
+
+Source hashes are cached (default: <output>.cas-cache.json next to the generated JSON,
+never inside public/) keyed by path, size and mtime so rebuilds only hash new or
+modified images.
+
+Note: the admin backend edits/deletes images under /medicines/<id>/; use this mode for
+static catalog deploys, not for a tree managed through the admin UI.
+"""
+from __future__ import annotations
+import os
+import json
+from typing import Dict, List, Optional
+
+from publish_images import ImagePublisher, file_digest
+
+
+class ContentStore:
+    """Map source images to deduplicated content-addressed URLs, publishing each unique file once."""
+
+    def __init__(self, store_dir: str, cache_path: Optional[str] = None, url_prefix: str = "/cas", publisher: Optional[ImagePublisher] = None):
+        self.store_dir = store_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.publisher = publisher
+        self._cache_path = cache_path
+        self._hash_cache: Dict[str, List] = self._load_cache()
+        self._by_digest: Dict[str, str] = {}
+        self.stats: Dict[str, int] = {
+            "referenced": 0,
+            "referenced_bytes": 0,
+            "unique": 0,
+            "unique_bytes": 0,
+            "already_stored": 0,
+            "hashed": 0,
+        }
+
+    def _load_cache(self) -> Dict[str, List]:
+        if not self._cache_path:
+            return {}
+        try:
+            with open(self._cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def digest(self, src: str, size: int, mtime_ns: int) -> str:
+        key = os.path.abspath(src)
+        cached = self._hash_cache.get(key)
+        if cached and cached[0] == size and cached[1] == mtime_ns:
+            return cached[2]
+        digest = file_digest(src)
+        self._hash_cache[key] = [size, mtime_ns, digest]
+        self.stats["hashed"] += 1
+        return digest
+
+    def add(self, src: str) -> str:
+        """Return the content-addressed URL for src, scheduling its publication if not seen yet."""
+        st = os.stat(src)
+        digest = self.digest(src, st.st_size, st.st_mtime_ns)
+        self.stats["referenced"] += 1
+        self.stats["referenced_bytes"] += st.st_size
+        rel = self._by_digest.get(digest)
+        if rel is None:
+            # First extension seen wins so the same bytes never get two URLs
+            ext = os.path.splitext(src)[1].lower()
+            rel = f"{digest[:2]}/{digest}{ext}"
+            self._by_digest[digest] = rel
+            self.stats["unique"] += 1
+            self.stats["unique_bytes"] += st.st_size
+            dst = os.path.join(self.store_dir, digest[:2], f"{digest}{ext}")
+            if os.path.exists(dst):
+                # Published by an earlier run or by the other catalog's generator
+                self.stats["already_stored"] += 1
+            if self.publisher is not None:
+                self.publisher.submit(src, dst)
+        return f"{self.url_prefix}/{rel}"
+
+    def close(self) -> Dict[str, int]:
+        """Persist the hash cache and return dedupe statistics."""
+        if self._cache_path and self._hash_cache:
+            os.makedirs(os.path.dirname(self._cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self._cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._hash_cache, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self._cache_path)
+        return dict(self.stats, saved_bytes=self.stats["referenced_bytes"] - self.stats["unique_bytes"])
+
+
+def default_cache_path(output_path: str) -> str:
+    base, _ = os.path.splitext(output_path)
+    return f"{base}.cas-cache.json"
+
+
+def format_bytes(n: float) -> str:
+    if n < 1024:
+        return f"{int(n)} B"
+    for unit in ("KB", "MB", "GB"):
+        n /= 1024.0
+        if n < 1024 or unit == "GB":
+            break
+    return f"{n:.1f} {unit}"
+
+
+def print_store_summary(stats: Dict[str, int]) -> None:
+    ref_bytes = stats["referenced_bytes"]
+    pct = (100.0 * stats["saved_bytes"] / ref_bytes) if ref_bytes else 0.0
+    print(
+        f"  Content store: {stats['referenced']} images ({format_bytes(ref_bytes)}) -> "
+        f"{stats['unique']} unique ({format_bytes(stats['unique_bytes'])}), "
+        f"saved {format_bytes(stats['saved_bytes'])} ({pct:.1f}%)"
+    )
+    print(f"  Content store: {stats['already_stored']} unique images already stored, {stats['hashed']} hashed this run")
@@ -1,8 +1,11 @@
+import os
 import json
 import re
 import argparse
 from pathlib import Path
 
+from json_stream import ArrayWriter, iter_array
+
 DATA_PATH = Path(r"S:\MedCare\src\data\medicines.json")
 
 # Patterns for normalization
@@ -45,29 +48,86 @@ MOJIBAKE_MAP = {
     "Â®": "®",
 }
 
+# Every mojibake key plus the stray 'Â' before whitespace, as one alternation. Most strings
+# contain none of them and are skipped after this single search. Strings that do match are
+# fixed key by key in MOJIBAKE_MAP order, because one replacement can complete a later key
+# ('Ã' + 'â€”' -> 'Ã—' -> '×', 'Â' + '┬░' -> 'Â°' -> '°'), and only the sequential order
+# reproduces those chains exactly.
+MOJIBAKE_RE = re.compile("|".join(re.escape(bad) for bad in MOJIBAKE_MAP) + r"|Â\s")
+STRAY_A_RE = re.compile(r"Â\s")
+
+# The month/day rules in one pass: singular units (any case) become a plural range with an
+# en dash; capitalized plurals are lowercased, keeping the original spacing and dash.
+RANGE_RE = re.compile(r"(\b\d+)(\s*[–-]\s*)(\d+)(\s*)(?:((?i:month|day))|(Months|Days))\b")
+
+
+def _fix_mojibake(s: str) -> str:
+    for bad, good in MOJIBAKE_MAP.items():
+        if bad in s:
+            s = s.replace(bad, good)
+    # Remove stray 'Â' when followed by a space
+    return STRAY_A_RE.sub(" ", s)
+
+
+def _fix_range(m: re.Match) -> str:
+    start, sep, end, space, singular, plural = m.groups()
+    if singular:
+        return f"{start}–{end} {singular.lower()}s"
+    return f"{start}{sep}{end}{space}{plural.lower()}"
+
+
 def normalize_text(s: str) -> str:
     if not isinstance(s, str):
         return s
-    t = s
-    # Fix common mojibake artifacts
-    for bad, good in MOJIBAKE_MAP.items():
-        if bad in t:
-            t = t.replace(bad, good)
-    # Remove stray 'Â' when followed by a space
-    t = re.sub(r"Â\s", " ", t)
-    # Normalize month/day ranges to plural
-    # e.g., 6–12 month -> 6–12 months; also accept hyphen '-'
-    t = re.sub(r"(\b\d+)\s*[–-]\s*(\d+)\s*month\b", r"\1–\2 months", t, flags=re.IGNORECASE)
-    t = re.sub(r"(\b\d+)\s*[–-]\s*(\d+)\s*day\b", r"\1–\2 days", t, flags=re.IGNORECASE)
-    # Standardize casing to lowercase for units within sentences, except in detail values kept as-is
-    # For ranges we already convert; now normalize capitalized Months/Days following numbers
-    t = re.sub(r"(\b\d+\s*[–-]\s*\d+\s*)Months\b", r"\1months", t)
-    t = re.sub(r"(\b\d+\s*[–-]\s*\d+\s*)Days\b", r"\1days", t)
-    return t
+    # Fix common mojibake artifacts and stray 'Â' before spaces
+    t = _fix_mojibake(s) if MOJIBAKE_RE.search(s) else s
+    # Normalize month/day ranges to plural, e.g. 6–12 month -> 6–12 months (hyphen accepted)
+    return RANGE_RE.sub(_fix_range, t)
+
+
+def format_path(path) -> str:
+    return "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in path) or "$"
+
+
+def change_excerpt(before: str, after: str, width: int = 60):
+    """The stretch of before/after around their first difference."""
+    i = next((i for i, (a, b) in enumerate(zip(before, after)) if a != b), min(len(before), len(after)))
+    start = max(0, i - 20)
+    return before[start:start + width], after[start:start + width]
+
+
+def normalize_in_place(obj, path=(), changes=None):
+    """Normalize every string value under obj in one walk, mutating containers in place.
+
+    Returns (obj, changes), where changes lists (path, before, after) for each string that
+    changed; a changed top-level string is returned rather than mutated.
+    """
+    if changes is None:
+        changes = []
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    elif isinstance(obj, str):
+        fixed = normalize_text(obj)
+        if fixed != obj:
+            changes.append((path, obj, fixed))
+        return fixed, changes
+    else:
+        return obj, changes
+    for key, value in items:
+        if isinstance(value, str):
+            fixed = normalize_text(value)
+            if fixed != value:
+                obj[key] = fixed
+                changes.append((path + (key,), value, fixed))
+        elif isinstance(value, (dict, list)):
+            normalize_in_place(value, path + (key,), changes)
+    return obj, changes
 
 
 def normalize_entry(obj):
-    # Recursively normalize all strings in dict/list
+    # Recursively normalize all strings in dict/list (returns a normalized copy)
     if isinstance(obj, dict):
         return {k: normalize_entry(v) for k, v in obj.items()}
     if isinstance(obj, list):
@@ -77,12 +137,57 @@ def normalize_entry(obj):
     return obj
 
 
+def print_change(path, before: str, after: str) -> None:
+    print("  {}: {!r} -> {!r}".format(format_path(path), *change_excerpt(before, after)))
+
+
+def normalize_stream(target_path: Path, dry_run: bool = False, show: int = 10) -> None:
+    """Normalize a JSON array entry by entry; memory stays bounded by the largest entry.
+
+    Entries go to a temp file that replaces the original only if something changed.
+    """
+    writer = None if dry_run else ArrayWriter(str(target_path), indent=2, ensure_ascii=False)
+    total = entries = 0
+    try:
+        for i, entry in enumerate(iter_array(str(target_path))):
+            entry, changes = normalize_in_place(entry, (i,))
+            if changes:
+                entries += 1
+                for path, before, after in changes[:max(0, show - total)]:
+                    print_change(path, before, after)
+                total += len(changes)
+            if writer:
+                writer.write(entry)
+    except BaseException:
+        if writer:
+            writer.abort()
+        raise
+    if not total:
+        if writer:
+            writer.abort()
+        print(f"No changes needed for {target_path.name}.")
+        return
+    if total > show:
+        print(f"  ... and {total - show} more")
+    if dry_run:
+        print(f"Dry run: {total} strings in {entries} entries would change in {target_path.name}.")
+        return
+    writer.commit()
+    print(f"Normalized encoding artifacts in {target_path.name}. Updated {total} strings in {entries} entries.")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Normalize encoding artifacts in a JSON dataset")
     parser.add_argument("--path", type=str, default=str(DATA_PATH), help="Path to JSON file to normalize")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--show", type=int, default=10, help="Print up to this many changed paths (default: 10)")
+    parser.add_argument("--stream", action="store_true", help="Process a top-level array entry by entry (bounded memory, for very large files)")
     args = parser.parse_args()
 
     target_path = Path(args.path)
+    if args.stream:
+        normalize_stream(target_path, args.dry_run, args.show)
+        return
     # Robust load with encoding fallbacks
     encodings = ["utf-8", "utf-8-sig", "utf-16", "utf-16-le", "utf-16-be"]
     last_err = None
@@ -97,15 +202,24 @@ def main():
             data = None
     if data is None:
         raise RuntimeError(f"Failed to load JSON {target_path} due to encoding: {last_err}")
-    before = json.dumps(data, ensure_ascii=False)
-    data_norm = [normalize_entry(e) for e in data]
-    after = json.dumps(data_norm, ensure_ascii=False)
-    if before != after:
-        with target_path.open("w", encoding="utf-8") as f:
-            json.dump(data_norm, f, indent=2, ensure_ascii=False)
-        print(f"Normalized encoding artifacts in {target_path.name}. Updated {len(data_norm)} entries.")
-    else:
+    # One walk finds and fixes every string; no before/after serialization to compare
+    data, changes = normalize_in_place(data)
+    if not changes:
         print(f"No changes needed for {target_path.name}.")
+        return
+    entries = {path[0] for path, _, _ in changes if path}
+    for path, before, after in changes[:args.show]:
+        print_change(path, before, after)
+    if len(changes) > args.show:
+        print(f"  ... and {len(changes) - args.show} more")
+    if args.dry_run:
+        print(f"Dry run: {len(changes)} strings in {len(entries)} entries would change in {target_path.name}.")
+        return
+    tmp_path = target_path.with_name(target_path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, target_path)
+    print(f"Normalized encoding artifacts in {target_path.name}. Updated {len(changes)} strings in {len(entries)} entries.")
 
 
 if __name__ == "__main__":
@@ -17,16 +17,22 @@ Usage (PowerShell):
 
 Dry run (no file writes, only summary):
   py .\scripts\generate_medicines_json.py --base-dir "s:\MedCare\final_web" --dry-run
+
+Plan, review, then apply without rescanning (see plan_file.py):
+  py .\scripts\generate_medicines_json.py --base-dir "s:\MedCare\final_web" --copy-images --plan-out generate.plan.json
+  py .\scripts\generate_medicines_json.py --apply generate.plan.json
 """
 from __future__ import annotations
 import os
 import re
 import json
-import shutil
 import argparse
 from typing import List, Dict, Optional
 
-IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+from medicine_tree import scan_images, walk_tree
+from content_store import ContentStore, default_cache_path, print_store_summary
+from plan_file import PlanRecorder, apply_copies, apply_json_writes, check_plan, copy_ops, load_plan, write_json_op, write_plan
+from publish_images import PUBLISH_MODES, ImagePublisher, print_publish_summary, write_publish_report
 
 CATEGORY_DISPLAY_MAP = {
     "Erectile_Dysfunction": "Erectile Dysfunction",
@@ -108,37 +114,27 @@ def slugify(raw: str) -> str:
 
 
 def find_images(folder: str) -> List[str]:
-    files: List[str] = []
-    try:
-        for entry in sorted(os.listdir(folder)):
-            p = os.path.join(folder, entry)
-            if os.path.isfile(p):
-                _, ext = os.path.splitext(entry)
-                if ext.lower() in IMAGE_EXTS:
-                    files.append(entry)
-    except FileNotFoundError:
-        return []
-    return files
-
-
-def build_entry(cat_folder: str, med_folder: str, display_category: str, base_dir: str, public_dir: str, copy_images: bool) -> Dict:
+    return [img.name for img in scan_images(folder)]
+
+
+def build_entry(cat_folder: str, med_folder: str, display_category: str, base_dir: str, public_dir: str, publisher: Optional[ImagePublisher] = None, image_files: Optional[List[str]] = None, store: Optional[ContentStore] = None) -> Dict:
     full_path = os.path.join(base_dir, cat_folder, med_folder)
-    image_files = find_images(full_path)
+    if image_files is None:
+        image_files = find_images(full_path)
     slug = slugify(med_folder)
     image_rel = None
     images_rel: List[str] = []
     if image_files:
         target_dir = os.path.join(public_dir, "medicines", slug)
-        if copy_images:
-            os.makedirs(target_dir, exist_ok=True)
         for fname in image_files:
-            rel = f"/medicines/{slug}/{fname}"
-            images_rel.append(rel)
-            if copy_images:
-                src = os.path.join(full_path, fname)
-                dst = os.path.join(target_dir, fname)
-                if not os.path.exists(dst):
-                    shutil.copy2(src, dst)
+            src = os.path.join(full_path, fname)
+            if store is not None:
+                # Deduplicated URL; the store publishes each unique image once
+                images_rel.append(store.add(src))
+                continue
+            images_rel.append(f"/medicines/{slug}/{fname}")
+            if publisher is not None:
+                publisher.submit(src, os.path.join(target_dir, fname))
         image_rel = images_rel[0] if images_rel else None
     dosage = extract_dosage(med_folder)
     display_name = clean_base_name(med_folder)
@@ -166,36 +162,76 @@ def build_entry(cat_folder: str, med_folder: str, display_category: str, base_di
 
 def main():
     parser = argparse.ArgumentParser(description="Generate medicines.json from categorized folders")
-    parser.add_argument("--base-dir", required=True, help="Path to categorized final_web directory")
+    parser.add_argument("--base-dir", default=None, help="Path to categorized final_web directory (required unless --apply)")
     parser.add_argument("--public-dir", default="public", help="Path to Vite public directory")
     parser.add_argument("--output", default=os.path.join("src", "data", "medicines.json"), help="Output JSON file path")
     parser.add_argument("--copy-images", action="store_true", help="Copy representative images into public/medicines")
     parser.add_argument("--dry-run", action="store_true", help="Preview without writing or copying")
+    parser.add_argument("--workers", type=int, default=0, help="Image publishing threads (0 = auto)")
+    parser.add_argument("--verify-hash", action="store_true", help="Compare SHA-256 of existing published images instead of trusting size+mtime")
+    parser.add_argument("--publish-mode", choices=PUBLISH_MODES, default="copy", help="How --copy-images publishes files; link modes fall back to copying when not possible")
+    parser.add_argument("--publish-report", default=None, help="Write a JSON report of the publish mode used for each image")
+    parser.add_argument("--content-addressed", action="store_true", help="Publish images once per SHA-256 into a shared store and point image URLs at it")
+    parser.add_argument("--cas-dir", default=None, help="Content-addressed store directory (default: <public-dir>/cas, served as /cas)")
+    parser.add_argument("--plan-out", default=None, help="Write the image copies and JSON output to this plan file instead of performing them")
+    parser.add_argument("--apply", default=None, help="Perform the copies and writes in a plan file written by --plan-out (no rescan)")
+    parser.add_argument("--force", action="store_true", help="With --apply, apply the plan even if the tree changed since it was written")
     args = parser.parse_args()
 
+    if args.apply:
+        plan = load_plan(args.apply, os.path.basename(__file__))
+        print(f"Applying plan: {args.apply}")
+        if not check_plan(plan, args.force):
+            return
+        publish_stats = apply_copies(plan, args.workers or None, args.verify_hash)
+        if publish_stats is not None and args.publish_report:
+            write_publish_report(args.publish_report, publish_stats)
+        apply_json_writes(plan)
+        return
+    if not args.base_dir:
+        parser.error("--base-dir is required unless --apply is given")
+
     base_dir = args.base_dir
     public_dir = args.public_dir
     output_file = args.output
+    plan_out = args.plan_out
 
     if not os.path.isdir(base_dir):
         print(f"ERROR: Base directory not found: {base_dir}")
         return
 
-    categories = [d for d in sorted(os.listdir(base_dir)) if os.path.isdir(os.path.join(base_dir, d))]
     entries: List[Dict] = []
     skipped = 0
-
-    for cat in categories:
-        display_category = CATEGORY_DISPLAY_MAP.get(cat, cat.replace("_", " "))
-        cat_path = os.path.join(base_dir, cat)
-        meds = [m for m in sorted(os.listdir(cat_path)) if os.path.isdir(os.path.join(cat_path, m))]
-        for med in meds:
-            entry = build_entry(cat, med, display_category, base_dir, public_dir, copy_images=not args.dry_run and args.copy_images)
-            if entry["image"] is None:
-                skipped += 1
-            entries.append(entry)
+    publisher = ImagePublisher(args.workers or None, args.verify_hash, args.publish_mode) if args.copy_images and not args.dry_run else None
+    watch: Dict[str, int] = {}
+    if plan_out and publisher is not None:
+        # Record the copies instead of performing them
+        publisher = PlanRecorder()
+    store = None
+    if args.content_addressed and not args.dry_run:
+        cas_dir = args.cas_dir or os.path.join(public_dir, "cas")
+        store = ContentStore(cas_dir, default_cache_path(output_file), publisher=publisher)
+
+    for folder in walk_tree(base_dir, stamps=watch):
+        display_category = CATEGORY_DISPLAY_MAP.get(folder.category, folder.category.replace("_", " "))
+        entry = build_entry(folder.category, folder.name, display_category, base_dir, public_dir, publisher, [img.name for img in folder.images], store)
+        if entry["image"] is None:
+            skipped += 1
+        entries.append(entry)
 
     print(f"Processed {len(entries)} medicines. Missing images: {skipped}.")
+    if store is not None:
+        print_store_summary(store.close())
+    if plan_out:
+        ops = copy_ops(publisher.copies) if publisher is not None else []
+        ops.append(write_json_op(output_file, entries, ensure_ascii=True))
+        write_plan(plan_out, os.path.basename(__file__), ops, watch, {"publish_mode": args.publish_mode})
+        return
+    if publisher is not None:
+        publish_stats = publisher.close()
+        print_publish_summary(publish_stats)
+        if args.publish_report:
+            write_publish_report(args.publish_report, publish_stats)
 
     if args.dry_run:
         print("Dry run complete. Not writing output.")
@@ -17,16 +17,22 @@ Usage (PowerShell):
 
 Dry run (no file writes, only summary):
   py .\scripts\generate_medicines_web2_json.py --base-dir "s:\MedCare\final_web_2\final_web_2" --dry-run
+
+Plan, review, then apply without rescanning (see plan_file.py):
+  py .\scripts\generate_medicines_web2_json.py --copy-images --plan-out web2.plan.json
+  py .\scripts\generate_medicines_web2_json.py --apply web2.plan.json
 """
 from __future__ import annotations
 import os
 import re
 import json
-import shutil
 import argparse
 from typing import List, Dict, Optional
 
-IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+from medicine_tree import list_subdirs, scan_images
+from content_store import ContentStore, default_cache_path, print_store_summary
+from plan_file import PlanRecorder, apply_copies, apply_json_writes, check_plan, copy_ops, dir_stamps, load_plan, write_json_op, write_plan
+from publish_images import PUBLISH_MODES, ImagePublisher, print_publish_summary, write_publish_report
 
 CATEGORY_DISPLAY_MAP = {
     "Erectile_Dysfunction": "Erectile Dysfunction",
@@ -149,38 +155,28 @@ def slugify(raw: str) -> str:
 
 
 def find_images(folder: str) -> List[str]:
-    files: List[str] = []
-    try:
-        for entry in sorted(os.listdir(folder)):
-            p = os.path.join(folder, entry)
-            if os.path.isfile(p):
-                _, ext = os.path.splitext(entry)
-                if ext.lower() in IMAGE_EXTS:
-                    files.append(entry)
-    except FileNotFoundError:
-        return []
-    return files
-
-
-def build_entry(cat_folder: str, med_folder: str, display_category: str, base_dir: str, public_dir: str, copy_images: bool) -> Dict:
+    return [img.name for img in scan_images(folder)]
+
+
+def build_entry(cat_folder: str, med_folder: str, display_category: str, base_dir: str, public_dir: str, publisher: Optional[ImagePublisher] = None, image_files: Optional[List[str]] = None, store: Optional[ContentStore] = None) -> Dict:
     full_path = os.path.join(base_dir, cat_folder, med_folder)
-    image_files = find_images(full_path)
+    if image_files is None:
+        image_files = find_images(full_path)
     slug = slugify(med_folder)
     image_rel = None
     images_rel: List[str] = []
     
     if image_files:
         target_dir = os.path.join(public_dir, "medicines_web2", slug)
-        if copy_images:
-            os.makedirs(target_dir, exist_ok=True)
         for fname in image_files:
-            rel = f"/medicines_web2/{slug}/{fname}"
-            images_rel.append(rel)
-            if copy_images:
-                src = os.path.join(full_path, fname)
-                dst = os.path.join(target_dir, fname)
-                if not os.path.exists(dst):
-                    shutil.copy2(src, dst)
+            src = os.path.join(full_path, fname)
+            if store is not None:
+                # Deduplicated URL; the store publishes each unique image once
+                images_rel.append(store.add(src))
+                continue
+            images_rel.append(f"/medicines_web2/{slug}/{fname}")
+            if publisher is not None:
+                publisher.submit(src, os.path.join(target_dir, fname))
         image_rel = images_rel[0] if images_rel else None
     
     dosage = extract_dosage(med_folder)
@@ -215,14 +211,35 @@ def main() -> None:
     parser.add_argument("--output", default=os.path.join(os.getcwd(), "src", "data", "medicines_web2.json"), help="Output JSON file path")
     parser.add_argument("--copy-images", action="store_true", help="Copy images to public directory")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done without writing files")
+    parser.add_argument("--workers", type=int, default=0, help="Image publishing threads (0 = auto)")
+    parser.add_argument("--verify-hash", action="store_true", help="Compare SHA-256 of existing published images instead of trusting size+mtime")
+    parser.add_argument("--publish-mode", choices=PUBLISH_MODES, default="copy", help="How --copy-images publishes files; link modes fall back to copying when not possible")
+    parser.add_argument("--publish-report", default=None, help="Write a JSON report of the publish mode used for each image")
+    parser.add_argument("--content-addressed", action="store_true", help="Publish images once per SHA-256 into a shared store and point image URLs at it")
+    parser.add_argument("--cas-dir", default=None, help="Content-addressed store directory (default: <public-dir>/cas, served as /cas)")
     
+    parser.add_argument("--plan-out", default=None, help="Write the image copies and JSON output to this plan file instead of performing them")
+    parser.add_argument("--apply", default=None, help="Perform the copies and writes in a plan file written by --plan-out (no rescan)")
+    parser.add_argument("--force", action="store_true", help="With --apply, apply the plan even if the tree changed since it was written")
     args = parser.parse_args()
 
+    if args.apply:
+        plan = load_plan(args.apply, os.path.basename(__file__))
+        print(f"Applying plan: {args.apply}")
+        if not check_plan(plan, args.force):
+            return
+        publish_stats = apply_copies(plan, args.workers or None, args.verify_hash)
+        if publish_stats is not None and args.publish_report:
+            write_publish_report(args.publish_report, publish_stats)
+        apply_json_writes(plan)
+        return
+
     base_dir = args.base_dir
     public_dir = args.public_dir
     output_path = args.output
     copy_images = args.copy_images
     dry_run = args.dry_run
+    plan_out = args.plan_out
 
     if not os.path.isdir(base_dir):
         print(f"ERROR: Base directory not found: {base_dir}")
@@ -235,35 +252,46 @@ def main() -> None:
     print(f"Scanning: {base_dir}")
     print(f"Copy images: {copy_images}")
     print(f"Output: {output_path}")
+    publisher = ImagePublisher(args.workers or None, args.verify_hash, args.publish_mode) if copy_images and not dry_run else None
+    # With --plan-out, each directory is stamped before it is listed and copies are only recorded
+    watch: Dict[str, int] = {}
+    if plan_out and publisher is not None:
+        publisher = PlanRecorder()
+    store = None
+    if args.content_addressed and not dry_run:
+        cas_dir = args.cas_dir or os.path.join(public_dir, "cas")
+        store = ContentStore(cas_dir, default_cache_path(output_path), publisher=publisher)
     
+    if plan_out:
+        watch.update(dir_stamps([base_dir]))
     try:
-        category_dirs = sorted(os.listdir(base_dir))
+        category_dirs = list_subdirs(base_dir)
     except Exception as e:
         print(f"ERROR: Cannot list base directory: {e}")
         return
 
-    for cat_folder in category_dirs:
-        cat_path = os.path.join(base_dir, cat_folder)
-        if not os.path.isdir(cat_path):
-            continue
+    for cat_entry in category_dirs:
+        cat_folder = cat_entry.name
 
         display_category = CATEGORY_DISPLAY_MAP.get(cat_folder, cat_folder.replace("_", " ").title())
         categories_found.add(display_category)
 
+        if plan_out:
+            watch.update(dir_stamps([cat_entry.path]))
         try:
-            med_folders = sorted(os.listdir(cat_path))
+            med_folders = list_subdirs(cat_entry.path)
         except Exception as e:
             print(f"ERROR: Cannot list category '{cat_folder}': {e}")
             continue
 
-        for med_folder in med_folders:
-            med_path = os.path.join(cat_path, med_folder)
-            if not os.path.isdir(med_path):
-                continue
+        for med_entry in med_folders:
+            med_folder = med_entry.name
 
             total_found += 1
             if not dry_run:
-                entry = build_entry(cat_folder, med_folder, display_category, base_dir, public_dir, copy_images)
+                if plan_out:
+                    watch.update(dir_stamps([med_entry.path]))
+                entry = build_entry(cat_folder, med_folder, display_category, base_dir, public_dir, publisher, store=store)
                 medicines.append(entry)
                 print(f"✓ {entry['name']} ({display_category})")
             else:
@@ -276,6 +304,19 @@ def main() -> None:
     print(f"\nSummary:")
     print(f"  Total medicines found: {total_found}")
     print(f"  Categories: {len(categories_found)} - {', '.join(sorted(categories_found))}")
+    if store is not None:
+        print_store_summary(store.close())
+    if plan_out:
+        ops = copy_ops(publisher.copies) if publisher is not None else []
+        if not dry_run and medicines:
+            ops.append(write_json_op(output_path, medicines))
+        write_plan(plan_out, os.path.basename(__file__), ops, watch, {"publish_mode": args.publish_mode})
+        return
+    if publisher is not None:
+        publish_stats = publisher.close()
+        print_publish_summary(publish_stats)
+        if args.publish_report:
+            write_publish_report(args.publish_report, publish_stats)
 
     if not dry_run and medicines:
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
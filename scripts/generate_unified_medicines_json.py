@@ -13,16 +13,63 @@ Usage (PowerShell):
 
 Dry run (no file writes, only summary):
   py .\scripts\generate_unified_medicines_json.py --medicines-dir "s:\MedCare\medicines" --dry-run
+
+Incremental rebuilds:
+  A build manifest (default: <output>.manifest.json, e.g. src\data\medicines.manifest.json)
+  records each medicine folder's directory mtime, image files, sizes and derived entry hash.
+  Later runs only rebuild new, changed or deleted folders and splice them into the output;
+  a run where nothing changed skips writing entirely. Images of unchanged folders are still
+  handed to the publisher, so published copies deleted or edited since are restored. Use
+  --full-rebuild to ignore the manifest.
+
+Image publishing (--copy-images) runs through a bounded thread pool (--workers) using kernel
+zero-copy where available; existing images are skipped only if size and mtime match, or the
+SHA-256 matches with --verify-hash. --publish-mode {copy,hardlink,symlink,reflink} avoids
+duplicating the tree when public/ lives on the same volume as medicines/. See publish_images.py.
+
+--derivatives resizes each image to a few widths in WebP/AVIF (process pool, cached by source
+hash) and records srcset-ready variants under each entry's imageMeta. See image_derivatives.py.
+--image-meta adds per-image width/height (parsed from headers), byte size and a ~20px inline
+placeholder to imageMeta so the grid can reserve space before images load. See image_probe.py.
+
+--shard-dir additionally writes one JSON file per display category plus index.json (counts,
+SHA-256, byte sizes) so category pages can load only their shard. --listing-dir writes a
+compact listing.json (card fields only) plus details/<id>.json per medicine. --precompress writes
+.gz/.br siblings for those artifacts that the backend serves from <public-dir>/catalog, with one
+etags.json at its root. See catalog_artifacts.py.
+--search-index writes a trigram inverted index over names, brands, compositions and categories
+for substring search without scanning every entry. See search_index.py. --spelling-index writes a
+SymSpell-style delete dictionary for typo correction. See spelling_index.py.
+
+Plan, review, then apply without rescanning (see plan_file.py):
+  --plan-out plan.json records the image copies, the output JSON and the manifest instead of
+  writing them; --apply plan.json performs them after a stat-only staleness check and then
+  builds the artifacts the plan was made with. --derivatives cannot be planned (it writes
+  derivative files while building entries).
+  py .\scripts\generate_unified_medicines_json.py --copy-images --plan-out generate.plan.json
+  py .\scripts\generate_unified_medicines_json.py --apply generate.plan.json
 """
 from __future__ import annotations
 import os
 import re
 import json
-import shutil
+import time
+import hashlib
 import argparse
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+from catalog_artifacts import list_text_files, listing_up_to_date, precompress, prune_precompressed, sha256_file, shard_dir_conflict, shards_up_to_date, write_category_shards, write_listing
+from medicine_tree import ImageFile, list_subdirs, scan_images
+from content_store import ContentStore, default_cache_path, print_store_summary
+from image_derivatives import DEFAULT_WIDTHS, attach_variants, available_formats, build_derivatives
+from image_probe import attach_image_meta, probe_images
+from plan_file import PlanRecorder, apply_copies, apply_json_writes, check_plan, copy_ops, dir_stamps, load_plan, write_json_op, write_plan
+from search_index import search_index_up_to_date, write_search_index
+from spelling_index import spelling_index_up_to_date, write_spelling_index
+from publish_images import PUBLISH_MODES, ImagePublisher, print_publish_summary, write_publish_report
 
-IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+# Bump when build_entry output changes shape so stale manifests trigger a full rebuild
+MANIFEST_VERSION = 1
 
 CATEGORY_DISPLAY_MAP = {
     "Erectile_Dysfunction": "Erectile Dysfunction",
@@ -148,39 +195,32 @@ def slugify(raw: str) -> str:
 
 
 def find_images(folder: str) -> List[str]:
-    files: List[str] = []
-    try:
-        for entry in sorted(os.listdir(folder)):
-            p = os.path.join(folder, entry)
-            if os.path.isfile(p):
-                _, ext = os.path.splitext(entry)
-                if ext.lower() in IMAGE_EXTS:
-                    files.append(entry)
-    except FileNotFoundError:
-        return []
-    return files
-
-
-def build_entry(cat_folder: str, med_folder: str, display_category: str, medicines_dir: str, public_dir: str, copy_images: bool) -> Dict:
+    return [img.name for img in scan_images(folder)]
+
+
+def publish_folder_images(full_path: str, slug: str, image_files: List[str], public_dir: str, publisher: Optional[ImagePublisher] = None, store: Optional[ContentStore] = None) -> List[str]:
+    """Schedule a folder's images for publishing and return their URLs."""
+    images_rel: List[str] = []
+    target_dir = os.path.join(public_dir, "medicines", slug)
+    for fname in image_files:
+        src = os.path.join(full_path, fname)
+        if store is not None:
+            # Deduplicated URL; the store publishes each unique image once
+            images_rel.append(store.add(src))
+            continue
+        images_rel.append(f"/medicines/{slug}/{fname}")
+        if publisher is not None:
+            publisher.submit(src, os.path.join(target_dir, fname))
+    return images_rel
+
+
+def build_entry(cat_folder: str, med_folder: str, display_category: str, medicines_dir: str, public_dir: str, publisher: Optional[ImagePublisher] = None, image_files: Optional[List[str]] = None, store: Optional[ContentStore] = None) -> Dict:
     full_path = os.path.join(medicines_dir, cat_folder, med_folder)
-    image_files = find_images(full_path)
+    if image_files is None:
+        image_files = find_images(full_path)
     slug = slugify(med_folder)
-    image_rel = None
-    images_rel: List[str] = []
-    
-    if image_files:
-        target_dir = os.path.join(public_dir, "medicines", slug)
-        if copy_images:
-            os.makedirs(target_dir, exist_ok=True)
-        for fname in image_files:
-            rel = f"/medicines/{slug}/{fname}"
-            images_rel.append(rel)
-            if copy_images:
-                src = os.path.join(full_path, fname)
-                dst = os.path.join(target_dir, fname)
-                if not os.path.exists(dst):
-                    shutil.copy2(src, dst)
-        image_rel = images_rel[0] if images_rel else None
+    images_rel = publish_folder_images(full_path, slug, image_files, public_dir, publisher, store) if image_files else []
+    image_rel = images_rel[0] if images_rel else None
     
     dosage = extract_dosage(med_folder)
     display_name = clean_base_name(med_folder)
@@ -209,6 +249,197 @@ def build_entry(cat_folder: str, med_folder: str, display_category: str, medicin
     }
 
 
+def default_manifest_path(output_path: str) -> str:
+    base, _ = os.path.splitext(output_path)
+    return f"{base}.manifest.json"
+
+
+def entry_hash(entry: Dict) -> str:
+    payload = json.dumps(entry, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def folder_signature(folder: str, images: List[ImageFile]) -> Optional[Dict]:
+    """Return the directory mtime plus (name, size, mtime) of each scanned image, or None if unreadable."""
+    try:
+        dir_mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        return None
+    return {"mtime_ns": dir_mtime, "files": [[img.name, img.size, img.mtime_ns] for img in images]}
+
+
+def is_folder_fresh(folder: str, record: Dict) -> bool:
+    """Check a manifest record against the folder without re-listing it.
+
+    The directory mtime covers added/removed/renamed files; recorded file stats cover
+    images rewritten in place.
+    """
+    try:
+        if os.stat(folder).st_mtime_ns != record.get("mtime_ns"):
+            return False
+        for fname, size, mtime_ns in record.get("files") or []:
+            st = os.stat(os.path.join(folder, fname))
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                return False
+    except OSError:
+        return False
+    return True
+
+
+def empty_manifest(options: Dict) -> Dict:
+    return {"version": MANIFEST_VERSION, "options": options, "root": None, "categories": {}, "folders": {}}
+
+
+def load_manifest(path: str, options: Dict) -> Dict:
+    """Load a build manifest; returns an empty one if missing, unreadable or built with other options."""
+    empty = empty_manifest(options)
+    if not os.path.isfile(path):
+        return empty
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception:
+        return empty
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION or manifest.get("options") != options:
+        return empty
+    manifest.setdefault("categories", {})
+    manifest.setdefault("folders", {})
+    return manifest
+
+
+def save_manifest(path: str, manifest: Dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def list_cached(path: str, record: Optional[Dict]) -> Tuple[List[str], int, bool]:
+    """List subdirectories of path, reusing the recorded listing when the directory mtime is unchanged.
+
+    Returns (names, mtime_ns, reused).
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    if record and record.get("mtime_ns") == mtime_ns:
+        return list(record.get("names") or []), mtime_ns, True
+    names = [e.name for e in list_subdirs(path)]
+    return names, mtime_ns, False
+
+
+def write_catalog_artifacts(args: argparse.Namespace, output_path: str, entries: Optional[List[Dict]], folder_by_category: Dict[str, str]) -> None:
+    """Write the requested derived artifacts for output_path.
+
+    entries=None means the output was not rewritten this run; artifacts are then only
+    rebuilt if medicines.json was edited since they were written (admin backend,
+    auto_fill_details.py), which is detected from the source SHA-256 in their index.
+    """
+    if not (args.shard_dir or args.listing_dir or args.search_index or args.spelling_index):
+        return
+    source_sha = sha256_file(output_path)
+    stale_shards = bool(args.shard_dir) and (entries is not None or not shards_up_to_date(args.shard_dir, source_sha))
+    stale_listing = bool(args.listing_dir) and (entries is not None or not listing_up_to_date(args.listing_dir, source_sha))
+    stale_search = bool(args.search_index) and (entries is not None or not search_index_up_to_date(args.search_index, source_sha))
+    stale_spelling = bool(args.spelling_index) and (entries is not None or not spelling_index_up_to_date(args.spelling_index, source_sha))
+    if not (stale_shards or stale_listing or stale_search or stale_spelling):
+        return
+    if entries is None:
+        with open(output_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    if stale_shards:
+        write_category_shards(entries, args.shard_dir, folder_by_category, source_sha)
+    if stale_listing:
+        write_listing(entries, args.listing_dir, source_sha)
+    if stale_search:
+        write_search_index(entries, args.search_index, source_sha)
+    if stale_spelling:
+        write_spelling_index(entries, args.spelling_index, source_sha)
+    # Rewritten artifacts lost their .gz/.br siblings; drop their ETags in one manifest update
+    prune_precompressed(catalog_root(args))
+
+
+def catalog_root(args: argparse.Namespace) -> str:
+    """<public-dir>/catalog, served at /catalog by the backend."""
+    return os.path.abspath(os.path.join(args.public_dir or os.path.join(os.getcwd(), "public"), "catalog"))
+
+
+def precompress_outputs(args: argparse.Namespace, output_path: str) -> None:
+    """Precompress the artifacts served under /catalog; unchanged files are skipped via etags.json.
+
+    backend/middlewares/precompressedStatic.js reads a single etags.json at the root of
+    <public-dir>/catalog, so only artifacts below it are compressed and recorded there. The
+    output JSON is bundled by the frontend build and is not precompressed.
+    """
+    root = catalog_root(args)
+    files: List[str] = []
+    if args.shard_dir:
+        files.extend(list_text_files(args.shard_dir, recursive=False))
+    if args.listing_dir:
+        files.extend(list_text_files(args.listing_dir, recursive=False))
+        files.extend(list_text_files(os.path.join(args.listing_dir, "details")))
+    files.extend(p for p in (args.search_index, args.spelling_index) if p and os.path.isfile(p))
+    files = list(dict.fromkeys(os.path.abspath(f) for f in files))
+    served: List[str] = []
+    for path in files:
+        try:
+            if os.path.commonpath([root, path]) == root:
+                served.append(path)
+        except ValueError:
+            pass  # different drive
+    if len(served) < len(files):
+        print(f"  Precompress: skipping {len(files) - len(served)} files outside {root} (not served by /catalog)")
+    if served:
+        precompress(root, served)
+
+
+ARTIFACT_OPTIONS = ("shard_dir", "listing_dir", "search_index", "spelling_index", "precompress", "public_dir")
+
+
+def manifest_stamps(medicines_dir: str, manifest: Dict) -> Dict[str, int]:
+    """Directory mtimes a build depended on, taken from the manifest it produced."""
+    stamps: Dict[str, int] = {}
+    if manifest.get("root"):
+        stamps[os.path.abspath(medicines_dir)] = manifest["root"]["mtime_ns"]
+    for cat_folder, record in manifest["categories"].items():
+        stamps[os.path.abspath(os.path.join(medicines_dir, cat_folder))] = record["mtime_ns"]
+    for key, record in manifest["folders"].items():
+        stamps[os.path.abspath(os.path.join(medicines_dir, *key.split("/", 1)))] = record["mtime_ns"]
+    return stamps
+
+
+def write_build_plan(args: argparse.Namespace, medicines_dir: str, output_path: str, manifest_path: str, manifest: Dict, publisher: Optional[PlanRecorder], out_arr: Optional[List[Dict]], folder_by_category: Dict[str, str]) -> None:
+    """Record this build's copies and writes; out_arr=None means the output is already up to date."""
+    ops = copy_ops(publisher.copies) if publisher is not None else []
+    if out_arr is not None:
+        ops.append(write_json_op(output_path, out_arr))
+    ops.append(write_json_op(manifest_path, manifest, indent=None))
+    watch = manifest_stamps(medicines_dir, manifest)
+    # The output feeds --preserve-existing and the up-to-date check, so admin edits also invalidate the plan
+    watch.update(dir_stamps([output_path]))
+    options = {name: getattr(args, name) for name in ARTIFACT_OPTIONS}
+    options.update(publish_mode=args.publish_mode, output=output_path, output_written=out_arr is not None, folder_by_category=folder_by_category)
+    write_plan(args.plan_out, os.path.basename(__file__), ops, watch, options)
+
+
+def apply_build_plan(args: argparse.Namespace) -> None:
+    plan = load_plan(args.apply, os.path.basename(__file__))
+    print(f"Applying plan: {args.apply}")
+    if not check_plan(plan, args.force):
+        return
+    options = plan["options"]
+    publish_stats = apply_copies(plan, args.workers or None, args.verify_hash)
+    if publish_stats is not None and args.publish_report:
+        write_publish_report(args.publish_report, publish_stats)
+    apply_json_writes(plan)
+    # Artifacts are derived from the output, so they are rebuilt here rather than stored in the plan
+    output_path = options["output"]
+    planned_args = argparse.Namespace(**{name: options.get(name) for name in ARTIFACT_OPTIONS})
+    entries = next((op["data"] for op in plan["operations"] if op["op"] == "write_json" and op["path"] == output_path), None)
+    write_catalog_artifacts(planned_args, output_path, entries, options.get("folder_by_category") or {})
+    if planned_args.precompress:
+        precompress_outputs(planned_args, output_path)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate unified medicines.json from merged medicines directory.")
     parser.add_argument("--medicines-dir", default=os.path.join(os.getcwd(), "medicines"), help="Path to unified medicines directory")
@@ -217,58 +448,140 @@ def main() -> None:
     parser.add_argument("--copy-images", action="store_true", help="Copy images to public directory")
     parser.add_argument("--preserve-existing", action="store_true", help="Merge with existing output JSON, preserving existing entries and details")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done without writing files")
+    parser.add_argument("--manifest", default=None, help="Build manifest path for incremental rebuilds (default: <output>.manifest.json)")
+    parser.add_argument("--full-rebuild", action="store_true", help="Ignore the build manifest and rebuild every folder")
+    parser.add_argument("--workers", type=int, default=0, help="Image publishing threads (0 = auto)")
+    parser.add_argument("--verify-hash", action="store_true", help="Compare SHA-256 of existing published images instead of trusting size+mtime")
+    parser.add_argument("--publish-mode", choices=PUBLISH_MODES, default="copy", help="How --copy-images publishes files; link modes fall back to copying when not possible")
+    parser.add_argument("--publish-report", default=None, help="Write a JSON report of the publish mode used for each image")
+    parser.add_argument("--content-addressed", action="store_true", help="Publish images once per SHA-256 into a shared store and point image URLs at it")
+    parser.add_argument("--cas-dir", default=None, help="Content-addressed store directory (default: <public-dir>/cas, served as /cas)")
+    parser.add_argument("--derivatives", action="store_true", help="Generate responsive WebP/AVIF derivatives into <public-dir>/derivatives and record them in imageMeta")
+    parser.add_argument("--derivative-widths", default=",".join(str(w) for w in DEFAULT_WIDTHS), help="Comma-separated derivative widths")
+    parser.add_argument("--image-meta", action="store_true", help="Record width/height/bytes (from file headers) and a tiny placeholder per image in imageMeta")
+    parser.add_argument("--shard-dir", default=None, help="Also write one JSON shard per category plus index.json into this directory")
+    parser.add_argument("--listing-dir", default=None, help="Also write listing.json (card fields) and details/<id>.json into this directory")
+    parser.add_argument("--search-index", default=None, help="Also write a trigram search index (e.g. public/catalog/search-index.json)")
+    parser.add_argument("--spelling-index", default=None, help="Also write a typo-correction delete dictionary (e.g. public/catalog/spelling-index.json)")
+    parser.add_argument("--precompress", action="store_true", help="Write .gz (and .br with the brotli module) siblings plus <public-dir>/catalog/etags.json for the artifacts served from there")
+    parser.add_argument("--plan-out", default=None, help="Write the image copies, output JSON and manifest to this plan file instead of performing them")
+    parser.add_argument("--apply", default=None, help="Perform the copies and writes in a plan file written by --plan-out (no rescan), then build its artifacts")
+    parser.add_argument("--force", action="store_true", help="With --apply, apply the plan even if the tree changed since it was written")
     
     args = parser.parse_args()
 
+    if args.apply:
+        apply_build_plan(args)
+        return
+    if args.plan_out and (args.derivatives or args.dry_run):
+        parser.error("--plan-out cannot be combined with --derivatives or --dry-run")
+    conflict = shard_dir_conflict(args.shard_dir, args.listing_dir, os.path.dirname(os.path.abspath(args.output)))
+    if conflict:
+        parser.error(conflict)
+
     medicines_dir = args.medicines_dir
     public_dir = args.public_dir
     output_path = args.output
     copy_images = args.copy_images
     preserve_existing = args.preserve_existing
     dry_run = args.dry_run
+    plan_out = args.plan_out
+    manifest_path = args.manifest or default_manifest_path(output_path)
+    derivative_widths = [int(w) for w in args.derivative_widths.split(",") if w.strip()] if args.derivatives else []
 
     if not os.path.isdir(medicines_dir):
         print(f"ERROR: Medicines directory not found: {medicines_dir}")
         return
+    if derivative_widths and not available_formats():
+        # Checked up front: failing after the walk would leave images published without derivatives
+        print("ERROR: --derivatives requires Pillow with WebP or AVIF support (pip install pillow). See image_derivatives.py.")
+        return
 
     medicines: List[Dict] = []
     total_found = 0
     categories_found = set()
+    folder_by_category: Dict[str, str] = {}
+    started = time.perf_counter()
 
     print(f"Scanning: {medicines_dir}")
     print(f"Copy images: {copy_images}")
     print(f"Output: {output_path}")
+
+    # The manifest is only valid for the same inputs/targets; any option change forces a full rebuild
+    options = {
+        "medicines_dir": os.path.abspath(medicines_dir),
+        "public_dir": os.path.abspath(public_dir),
+        "copy_images": copy_images,
+        "publish_mode": args.publish_mode if copy_images else None,
+        "content_addressed": os.path.abspath(args.cas_dir or os.path.join(public_dir, "cas")) if args.content_addressed else None,
+        "derivatives": derivative_widths or None,
+        "image_meta": args.image_meta,
+    }
+    if args.full_rebuild or dry_run:
+        manifest = empty_manifest(options)
+    else:
+        manifest = load_manifest(manifest_path, options)
+    old_folders: Dict[str, Dict] = manifest["folders"]
+    new_manifest = empty_manifest(options)
+    reused = 0
+    rebuilt = 0
+    changed = 0
+    # Rebuilt folders are finalized (derivatives, hash, manifest record) after the walk
+    pending: List[Tuple[str, Dict, Optional[Dict], Dict, List[str]]] = []
+    publisher = ImagePublisher(args.workers or None, args.verify_hash, args.publish_mode) if copy_images and not dry_run else None
+    if plan_out and publisher is not None:
+        # Record the copies instead of performing them
+        publisher = PlanRecorder()
+    store = None
+    if args.content_addressed and not dry_run:
+        cas_dir = args.cas_dir or os.path.join(public_dir, "cas")
+        store = ContentStore(cas_dir, default_cache_path(output_path), publisher=publisher)
     
     try:
-        category_dirs = sorted(os.listdir(medicines_dir))
+        category_dirs, root_mtime, _ = list_cached(medicines_dir, manifest.get("root"))
     except Exception as e:
         print(f"ERROR: Cannot list medicines directory: {e}")
         return
+    new_manifest["root"] = {"mtime_ns": root_mtime, "names": category_dirs}
 
     for cat_folder in category_dirs:
         cat_path = os.path.join(medicines_dir, cat_folder)
-        if not os.path.isdir(cat_path):
-            continue
 
         display_category = CATEGORY_DISPLAY_MAP.get(cat_folder, cat_folder.replace("_", " ").title())
         categories_found.add(display_category)
+        folder_by_category.setdefault(display_category, cat_folder)
 
         try:
-            med_folders = sorted(os.listdir(cat_path))
+            med_folders, cat_mtime, _ = list_cached(cat_path, manifest["categories"].get(cat_folder))
         except Exception as e:
             print(f"ERROR: Cannot list category '{cat_folder}': {e}")
             continue
+        new_manifest["categories"][cat_folder] = {"mtime_ns": cat_mtime, "names": med_folders}
 
         for med_folder in med_folders:
             med_path = os.path.join(cat_path, med_folder)
-            if not os.path.isdir(med_path):
-                continue
 
             total_found += 1
             if not dry_run:
-                entry = build_entry(cat_folder, med_folder, display_category, medicines_dir, public_dir, copy_images)
+                key = f"{cat_folder}/{med_folder}"
+                record = old_folders.get(key)
+                if record and record.get("entry") and is_folder_fresh(med_path, record):
+                    medicines.append(record["entry"])
+                    new_manifest["folders"][key] = record
+                    reused += 1
+                    if publisher is not None or store is not None:
+                        # Only the scan and rebuild are skipped: published copies deleted or edited
+                        # since the last run are restored (up-to-date ones are skipped cheaply)
+                        fnames = [f[0] for f in record.get("files") or []]
+                        publish_folder_images(med_path, slugify(med_folder), fnames, public_dir, publisher, store)
+                    continue
+                images = scan_images(med_path)
+                signature = folder_signature(med_path, images)
+                if signature is None:
+                    continue
+                entry = build_entry(cat_folder, med_folder, display_category, medicines_dir, public_dir, publisher, [img.name for img in images], store)
                 medicines.append(entry)
-                print(f"✓ {entry['name']} ({display_category})")
+                pending.append((key, signature, record, entry, [img.path for img in images]))
             else:
                 dosage = extract_dosage(med_folder)
                 display_name = clean_base_name(med_folder)
@@ -276,9 +589,59 @@ def main() -> None:
                     display_name = f"{display_name} {dosage}"
                 print(f"DRY-RUN: {display_name} ({display_category})")
 
+    if derivative_widths and pending:
+        # Batch every rebuilt image through one process pool; reused entries keep their recorded imageMeta
+        jobs = [(url, src) for _, _, _, entry, srcs in pending for url, src in zip(entry["images"], srcs)]
+        variants, errors = build_derivatives(jobs, os.path.join(public_dir, "derivatives"), widths=derivative_widths, workers=args.workers or None)
+        for _, _, _, entry, _ in pending:
+            attach_variants(entry, variants)
+        print(f"  Derivatives: {len(variants)} images, {len(errors)} errors")
+        for url, err in errors:
+            print(f"  ERROR deriving '{url}': {err}")
+
+    if args.image_meta and pending:
+        jobs = [(url, src) for _, _, _, entry, srcs in pending for url, src in zip(entry["images"], srcs)]
+        probed, errors = probe_images(jobs, workers=args.workers or None)
+        for _, _, _, entry, _ in pending:
+            attach_image_meta(entry, probed)
+        print(f"  Image meta: {len(probed)} images probed, {len(errors)} errors")
+        for url, err in errors:
+            print(f"  ERROR probing '{url}': {err}")
+
+    for key, signature, record, entry, _ in pending:
+        digest = entry_hash(entry)
+        new_manifest["folders"][key] = dict(signature, hash=digest, entry=entry)
+        rebuilt += 1
+        if not record or record.get("hash") != digest:
+            changed += 1
+            print(f"✓ {entry['name']} ({entry['category']})")
+
+    removed = len(set(old_folders) - set(new_manifest["folders"]))
+
     print(f"\nSummary:")
     print(f"  Total medicines found: {total_found}")
     print(f"  Categories: {len(categories_found)} - {', '.join(sorted(categories_found))}")
+    if store is not None:
+        print_store_summary(store.close())
+    if publisher is not None and not plan_out:
+        publish_stats = publisher.close()
+        print_publish_summary(publish_stats)
+        if args.publish_report:
+            write_publish_report(args.publish_report, publish_stats)
+    if not dry_run:
+        print(f"  Incremental: {reused} reused, {rebuilt} rebuilt ({changed} changed), {removed} removed in {time.perf_counter() - started:.3f}s")
+
+    if not dry_run and medicines and changed == 0 and removed == 0 and os.path.isfile(output_path):
+        # Nothing derived from the tree changed; keep the existing output untouched
+        if plan_out:
+            write_build_plan(args, medicines_dir, output_path, manifest_path, new_manifest, publisher, None, folder_by_category)
+            return
+        save_manifest(manifest_path, new_manifest)
+        print(f"  Up to date: {output_path}")
+        write_catalog_artifacts(args, output_path, None, folder_by_category)
+        if args.precompress:
+            precompress_outputs(args, output_path)
+        return
 
     if not dry_run and medicines:
         # If preserving existing, merge instead of replacing
@@ -319,10 +682,17 @@ def main() -> None:
         else:
             out_arr = medicines
 
+        if plan_out:
+            write_build_plan(args, medicines_dir, output_path, manifest_path, new_manifest, publisher, out_arr, folder_by_category)
+            return
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         with open(output_path, "w", encoding="utf-8") as f:
             json.dump(out_arr, f, indent=2, ensure_ascii=False)
         print(f"  Wrote: {output_path} ({len(out_arr)} entries)")
+        save_manifest(manifest_path, new_manifest)
+        write_catalog_artifacts(args, output_path, out_arr, folder_by_category)
+        if args.precompress:
+            precompress_outputs(args, output_path)
     elif dry_run:
         print("  NOTE: This was a dry run. Use --copy-images to actually process files.")
 
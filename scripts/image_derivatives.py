@@ -0,0 +1,215 @@
+"""Responsive image derivatives (WebP/AVIF at several widths) for the medicines catalog.
+
+The catalog grid (MedicineCard.jsx, FeaturedMedicines.jsx) used to load the original
+full-size photos that build_entry publishes verbatim. This stage resizes every image to a
+few target widths in WebP (and AVIF when Pillow supports it) using a process pool, and
+records srcset-ready variants with byte sizes under each entry's `imageMeta`:
+
+  "imageMeta": {
+    "/medicines/kamagra-100-mg/unnamed.jpg": {
+      "variants": [
+        {"src": "/derivatives/ab/<sha256>-320w.webp", "type": "image/webp", "width": 320, "height": 240, "bytes": 10432},
+        ...
+      ]
+    }
+  }
+
+Derivatives are named after the source image's SHA-256, so reruns skip images whose
+bytes have not changed and identical images share derivatives.
+
+Requirements:
+  pip install pillow            (AVIF needs Pillow >= 11.3 built with libavif, or pillow-avif-plugin)
+
+Usage (standalone, annotating an existing medicines.json):
+  py .\\scripts\\image_derivatives.py --json "s:\\MedCare\\src\\data\\medicines.json" --public-dir "s:\\MedCare\\public"
+
+The unified generator runs the same stage with --derivatives.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, features
+except Exception:  # pragma: no cover - optional dependency notification
+    Image = None
+    features = None
+
+from publish_images import file_digest
+
+DEFAULT_WIDTHS = (320, 640, 960)
+MIME_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+QUALITY = {"webp": 78, "avif": 55}
+
+
+def available_formats() -> List[str]:
+    """Return the derivative formats this Pillow build can encode, best compression last."""
+    if Image is None:
+        return []
+    formats = []
+    for fmt in ("webp", "avif"):
+        try:
+            if features.check(fmt):
+                formats.append(fmt)
+                continue
+        except Exception:
+            pass
+        if fmt == "avif":
+            try:
+                import pillow_avif  # noqa: F401  registers the AVIF plugin
+                formats.append(fmt)
+            except Exception:
+                pass
+    return formats
+
+
+def target_widths(source_width: int, widths: Sequence[int]) -> List[int]:
+    """Widths to produce for a source image; never upscale, but always produce at least one."""
+    out = sorted({w for w in widths if w < source_width})
+    if source_width <= max(widths):
+        out.append(source_width)
+    return sorted(set(out))
+
+
+def derive_image(src: str, out_dir: str, url_prefix: str, widths: Sequence[int], formats: Sequence[str]) -> List[Dict]:
+    """Create (or reuse) derivatives for one source image. Runs in a worker process."""
+    digest = file_digest(src)
+    sub = os.path.join(out_dir, digest[:2])
+    with Image.open(src) as img:
+        # Image.open only parses the header; size is known before decoding pixels
+        src_w, src_h = img.size
+        plan: List[Tuple[int, int, str, str]] = []
+        for w in target_widths(src_w, widths):
+            h = max(1, round(src_h * w / src_w))
+            for fmt in formats:
+                name = f"{digest}-{w}w.{fmt}"
+                plan.append((w, h, fmt, name))
+        missing = [p for p in plan if not os.path.isfile(os.path.join(sub, p[3]))]
+        if missing:
+            os.makedirs(sub, exist_ok=True)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            resized: Dict[int, "Image.Image"] = {}
+            for w, h, fmt, name in missing:
+                if w not in resized:
+                    resized[w] = img.resize((w, h), Image.LANCZOS, reducing_gap=3.0)
+                tmp = os.path.join(sub, f"{name}.part")
+                save_kwargs = {"quality": QUALITY[fmt]}
+                if fmt == "webp":
+                    save_kwargs["method"] = 6
+                resized[w].save(tmp, format=fmt.upper(), **save_kwargs)
+                os.replace(tmp, os.path.join(sub, name))
+    variants = []
+    for w, h, fmt, name in plan:
+        variants.append({
+            "src": f"{url_prefix}/{digest[:2]}/{name}",
+            "type": MIME_TYPES[fmt],
+            "width": w,
+            "height": h,
+            "bytes": os.path.getsize(os.path.join(sub, name)),
+        })
+    return variants
+
+
+def _derive_job(args: Tuple) -> Tuple[str, Optional[List[Dict]], Optional[str]]:
+    url, src, out_dir, url_prefix, widths, formats = args
+    try:
+        return url, derive_image(src, out_dir, url_prefix, widths, formats), None
+    except Exception as e:
+        return url, None, str(e)
+
+
+def build_derivatives(
+    jobs: Sequence[Tuple[str, str]],
+    out_dir: str,
+    url_prefix: str = "/derivatives",
+    widths: Sequence[int] = DEFAULT_WIDTHS,
+    formats: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+) -> Tuple[Dict[str, List[Dict]], List[Tuple[str, str]]]:
+    """Derive every (image URL, source path) pair in a process pool.
+
+    Returns ({url: variants}, [(url, error)]). Decoding/resizing is CPU-bound, so this
+    uses processes rather than the threads used for publishing.
+    """
+    if Image is None:
+        raise RuntimeError("pillow is required for image derivatives. See script header for install steps.")
+    formats = list(formats) if formats else available_formats()
+    unique: Dict[str, str] = {}
+    for url, src in jobs:
+        unique.setdefault(url, src)
+    args = [(url, src, out_dir, url_prefix.rstrip("/"), tuple(widths), tuple(formats)) for url, src in unique.items()]
+    results: Dict[str, List[Dict]] = {}
+    errors: List[Tuple[str, str]] = []
+    if not args:
+        return results, errors
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for url, variants, err in pool.map(_derive_job, args, chunksize=8):
+            if err is not None:
+                errors.append((url, err))
+            else:
+                results[url] = variants
+    return results, errors
+
+
+def attach_variants(entry: Dict, variants_by_url: Dict[str, List[Dict]]) -> None:
+    """Record variants under entry['imageMeta'][url]['variants'] for each of the entry's images."""
+    meta = dict(entry.get("imageMeta") or {})
+    for url in entry.get("images") or []:
+        if url in variants_by_url:
+            meta[url] = dict(meta.get(url) or {}, variants=variants_by_url[url])
+    if meta:
+        entry["imageMeta"] = meta
+
+
+def resolve_public_path(public_dir: str, url: str) -> str:
+    return os.path.join(public_dir, url.lstrip("/").replace("/", os.sep))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate responsive WebP/AVIF derivatives for medicines.json images.")
+    parser.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="medicines.json to annotate with imageMeta variants")
+    parser.add_argument("--public-dir", default=os.path.join(os.getcwd(), "public"), help="Public directory the image URLs resolve against")
+    parser.add_argument("--out-dir", default=None, help="Derivative output directory (default: <public-dir>/derivatives)")
+    parser.add_argument("--widths", default=",".join(str(w) for w in DEFAULT_WIDTHS), help="Comma-separated target widths")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Generate derivatives but do not rewrite the JSON")
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    out_dir = args.out_dir or os.path.join(args.public_dir, "derivatives")
+    widths = [int(w) for w in args.widths.split(",") if w.strip()]
+
+    jobs: List[Tuple[str, str]] = []
+    missing = 0
+    for entry in data:
+        for url in entry.get("images") or []:
+            src = resolve_public_path(args.public_dir, url)
+            if os.path.isfile(src):
+                jobs.append((url, src))
+            else:
+                missing += 1
+
+    started = time.perf_counter()
+    variants, errors = build_derivatives(jobs, out_dir, widths=widths, workers=args.workers or None)
+    for entry in data:
+        attach_variants(entry, variants)
+    print(f"Derived {len(variants)} images ({', '.join(available_formats())}) in {time.perf_counter() - started:.2f}s. Missing sources: {missing}. Errors: {len(errors)}.")
+    for url, err in errors:
+        print(f"  ERROR {url}: {err}")
+
+    if args.dry_run:
+        print("Dry run complete. Not writing output.")
+        return
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
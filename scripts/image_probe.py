@@ -0,0 +1,222 @@
+"""Image dimensions from file headers plus tiny inline placeholders for medicines.json.
+
+Without dimensions the frontend only learns an image's size after downloading it, which
+shifts the card grid while it renders. This stage records, per image URL under the
+entry's `imageMeta`:
+
+  {"width": 1200, "height": 800, "bytes": 143201, "placeholder": "data:image/webp;base64,..."}
+
+Width/height come from parsing the JPEG SOF / PNG IHDR / WebP VP8* headers, reading a few
+KB per file instead of decoding the image. The placeholder is a ~20px preview; JPEGs are
+decoded at reduced scale (draft mode), so it stays cheap. Placeholders need Pillow;
+dimensions do not. Work runs in parallel (threads for header-only probing, processes
+when placeholders are generated).
+
+Usage (standalone, annotating an existing medicines.json):
+  py .\\scripts\\image_probe.py --json "s:\\MedCare\\src\\data\\medicines.json" --public-dir "s:\\MedCare\\public"
+
+The unified generator runs the same stage with --image-meta.
+"""
+from __future__ import annotations
+import io
+import os
+import json
+import time
+import base64
+import struct
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, features
+except Exception:  # pragma: no cover - optional dependency notification
+    Image = None
+    features = None
+
+from image_derivatives import resolve_public_path
+
+PLACEHOLDER_SIZE = 20
+# SOF markers carrying frame dimensions (excludes DHT 0xC4, JPG 0xC8, DAC 0xCC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue  # standalone markers without a length
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, io.SEEK_CUR)
+
+
+def _png_size(head: bytes) -> Optional[Tuple[int, int]]:
+    if len(head) >= 24 and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    return None
+
+
+def _webp_size(head: bytes) -> Optional[Tuple[int, int]]:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30:
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25:
+        b = head[21:25]
+        w = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        h = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return w, h
+    if chunk == b"VP8X" and len(head) >= 30:
+        w = 1 + int.from_bytes(head[24:27], "little")
+        h = 1 + int.from_bytes(head[27:30], "little")
+        return w, h
+    return None
+
+
+def read_dimensions(path: str) -> Optional[Tuple[int, int]]:
+    """Return (width, height) from the file header, or None for unknown/corrupt files.
+
+    Note: JPEG EXIF orientation is not applied; sizes are as stored.
+    """
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head[:2] == b"\xff\xd8":
+            return _jpeg_size(f)
+        if head[:8] == b"\x89PNG\r\n\x1a\n":
+            return _png_size(head)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return _webp_size(head)
+    return None
+
+
+def make_placeholder(path: str, size: int = PLACEHOLDER_SIZE) -> Optional[str]:
+    """Return a tiny base64 data URI preview of the image, or None without Pillow."""
+    if Image is None:
+        return None
+    with Image.open(path) as img:
+        # For JPEG this makes the decoder scale by up to 1/8 instead of decoding full size
+        img.draft("RGB", (size * 2, size * 2))
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        buf = io.BytesIO()
+        if features is not None and features.check("webp"):
+            img.save(buf, format="WEBP", quality=40)
+            mime = "image/webp"
+        else:
+            img.save(buf, format="JPEG", quality=40)
+            mime = "image/jpeg"
+    return f"data:{mime};base64,{base64.b64encode(buf.getvalue()).decode('ascii')}"
+
+
+def probe_image(path: str, placeholder: bool = True) -> Dict:
+    meta: Dict = {"bytes": os.path.getsize(path)}
+    dims = read_dimensions(path)
+    if dims:
+        meta["width"], meta["height"] = dims
+    if placeholder:
+        preview = make_placeholder(path)
+        if preview:
+            meta["placeholder"] = preview
+    return meta
+
+
+def _probe_job(args: Tuple[str, str, bool]) -> Tuple[str, Optional[Dict], Optional[str]]:
+    url, src, placeholder = args
+    try:
+        return url, probe_image(src, placeholder), None
+    except Exception as e:
+        return url, None, str(e)
+
+
+def probe_images(jobs: Sequence[Tuple[str, str]], placeholders: bool = True, workers: Optional[int] = None) -> Tuple[Dict[str, Dict], List[Tuple[str, str]]]:
+    """Probe every (image URL, source path) pair in parallel. Returns ({url: meta}, [(url, error)])."""
+    placeholders = placeholders and Image is not None
+    unique: Dict[str, str] = {}
+    for url, src in jobs:
+        unique.setdefault(url, src)
+    args = [(url, src, placeholders) for url, src in unique.items()]
+    results: Dict[str, Dict] = {}
+    errors: List[Tuple[str, str]] = []
+    if not args:
+        return results, errors
+    if placeholders:
+        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    else:
+        # Header parsing is I/O-bound
+        pool = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4))
+    with pool:
+        for url, meta, err in pool.map(_probe_job, args, chunksize=16):
+            if err is not None:
+                errors.append((url, err))
+            else:
+                results[url] = meta
+    return results, errors
+
+
+def attach_image_meta(entry: Dict, meta_by_url: Dict[str, Dict]) -> None:
+    """Merge probed fields into entry['imageMeta'][url] for each of the entry's images."""
+    meta = dict(entry.get("imageMeta") or {})
+    for url in entry.get("images") or []:
+        if url in meta_by_url:
+            meta[url] = dict(meta.get(url) or {}, **meta_by_url[url])
+    if meta:
+        entry["imageMeta"] = meta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record image dimensions, byte sizes and placeholders in medicines.json.")
+    parser.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="medicines.json to annotate with imageMeta")
+    parser.add_argument("--public-dir", default=os.path.join(os.getcwd(), "public"), help="Public directory the image URLs resolve against")
+    parser.add_argument("--no-placeholders", action="store_true", help="Only record dimensions and sizes")
+    parser.add_argument("--workers", type=int, default=0, help="Parallel workers (0 = auto)")
+    parser.add_argument("--dry-run", action="store_true", help="Probe images but do not rewrite the JSON")
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    jobs: List[Tuple[str, str]] = []
+    missing = 0
+    for entry in data:
+        for url in entry.get("images") or []:
+            src = resolve_public_path(args.public_dir, url)
+            if os.path.isfile(src):
+                jobs.append((url, src))
+            else:
+                missing += 1
+
+    started = time.perf_counter()
+    meta, errors = probe_images(jobs, placeholders=not args.no_placeholders, workers=args.workers or None)
+    for entry in data:
+        attach_image_meta(entry, meta)
+    print(f"Probed {len(meta)} images in {time.perf_counter() - started:.2f}s. Missing sources: {missing}. Errors: {len(errors)}.")
+    for url, err in errors:
+        print(f"  ERROR {url}: {err}")
+
+    if args.dry_run:
+        print("Dry run complete. Not writing output.")
+        return
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Streaming read/transform/write of JSON array files.
+
+The catalog scripts load a whole JSON array, transform it and dump it back, so memory
+grows with the file and a crash mid-write leaves a truncated catalog. This module keeps
+only one element in memory at a time:
+
+  iter_array(path)          yields the top-level array's elements one by one, decoding
+                            from a rolling buffer (raw_decode) that is trimmed as it goes
+  ArrayWriter(path)         writes elements to <path>.tmp as they come and os.replace()s
+                            it over path on commit; an exception discards the temp file
+  stream_transform(src, dst, fn)
+                            both together: fn(entry) -> entry (or None to drop it)
+
+Output is byte-identical to json.dump(list, f, indent=..., ensure_ascii=...), so a
+streamed run and an in-memory run produce the same file. Peak memory is bounded by the
+largest single element plus one read chunk. The encoding (UTF-8, UTF-8 with BOM, UTF-16
+LE/BE with or without BOM) is detected from the first bytes, as the scripts' encoding
+fallbacks did. src and dst may be the same file: the source is closed before the temp
+file replaces it.
+"""
+from __future__ import annotations
+import os
+import re
+import json
+from typing import Callable, Iterator, Optional
+
+CHUNK_SIZE = 1 << 16
+_WS = " \t\r\n"
+_SCALAR_END = re.compile(r"[ \t\r\n,\]]")
+
+
+def sniff_encoding(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "utf-16"
+    # A JSON text starts with an ASCII character, so UTF-16 without a BOM shows a NUL next to it
+    if len(head) >= 2 and head[0] == 0 and head[1] != 0:
+        return "utf-16-be"
+    if len(head) >= 2 and head[0] != 0 and head[1] == 0:
+        return "utf-16-le"
+    return "utf-8"
+
+
+def iter_array(path: str, encoding: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yield the elements of the JSON array in path without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding=encoding or sniff_encoding(path)) as f:
+        buf = ""
+        pos = 0
+        consumed = 0  # characters dropped from the front of buf, for error positions
+        eof = False
+
+        def fill(min_size: int) -> bool:
+            nonlocal buf, pos, consumed, eof
+            if eof:
+                return False
+            # Drop what has been consumed before growing the buffer
+            consumed += pos
+            buf = buf[pos:]
+            pos = 0
+            data = f.read(max(chunk_size, min_size))
+            if not data:
+                eof = True
+                return False
+            buf += data
+            return True
+
+        def skip_ws() -> bool:
+            """Advance past whitespace; False at end of input."""
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WS:
+                    pos += 1
+                if pos < len(buf):
+                    return True
+                if not fill(chunk_size):
+                    return False
+
+        if not skip_ws() or buf[pos] != "[":
+            raise ValueError(f"Expected a JSON array in {path}")
+        pos += 1
+        first = True
+        while True:
+            if not skip_ws():
+                raise ValueError(f"Unterminated JSON array in {path}")
+            if buf[pos] == "]":
+                pos += 1
+                if skip_ws():
+                    raise ValueError(f"Unexpected data after the JSON array at character {consumed + pos} in {path}")
+                return
+            if not first:
+                if buf[pos] != ",":
+                    raise ValueError(f"Expected ',' or ']' at character {consumed + pos} in {path}")
+                pos += 1
+                if not skip_ws():
+                    raise ValueError(f"Unterminated JSON array in {path}")
+            first = False
+            if buf[pos] not in '{["':
+                # Numbers and literals have no closing character of their own ("1." parses as 1):
+                # make sure the delimiter after them is in the buffer
+                while not _SCALAR_END.search(buf, pos) and fill(chunk_size):
+                    pass
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # Element not complete yet: read at least as much again (keeps big elements linear)
+                    if not fill(len(buf) - pos):
+                        raise
+                    continue
+                break
+            pos = end
+            yield value
+
+
+class ArrayWriter:
+    """Write a JSON array element by element to a temp file; commit() renames it into place."""
+
+    def __init__(self, path: str, indent: Optional[int] = 2, ensure_ascii: bool = False):
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        self.indent = indent
+        self.ensure_ascii = ensure_ascii
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(self.tmp, "w", encoding="utf-8")
+
+    def write(self, value) -> None:
+        text = json.dumps(value, indent=self.indent, ensure_ascii=self.ensure_ascii)
+        if self.indent is None:
+            self._f.write(", " + text if self.count else "[" + text)
+        else:
+            # Same layout json.dump gives a list: every element line indented one level
+            pad = " " * self.indent
+            self._f.write((",\n" if self.count else "[\n") + pad + text.replace("\n", "\n" + pad))
+        self.count += 1
+
+    def commit(self) -> None:
+        if not self.count:
+            self._f.write("[]")
+        else:
+            self._f.write("]" if self.indent is None else "\n]")
+        self._f.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+    def __enter__(self) -> "ArrayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None and not self._f.closed:
+            self.commit()
+        else:
+            self.abort()
+
+
+def stream_transform(src: str, dst: str, fn: Callable, indent: Optional[int] = 2, ensure_ascii: bool = False) -> int:
+    """Apply fn to every element of the array in src and write the results to dst atomically.
+
+    fn returns the element to write, or None to drop it. Returns the number written.
+    """
+    with ArrayWriter(dst, indent, ensure_ascii) as out:
+        for entry in iter_array(src):
+            result = fn(entry)
+            if result is not None:
+                out.write(result)
+    return out.count
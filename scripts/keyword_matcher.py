@@ -0,0 +1,174 @@
+"""Aho–Corasick keyword matcher for the categorize scripts.
+
+detect_category used to test every keyword of every category with `kw in name`, so each
+folder name cost one substring scan per keyword (all of them for names that end up in
+Unclear), and --reclassify repeated that for every folder in the tree. KeywordMatcher
+compiles all keywords once into a deterministic automaton and reads each name a single
+time, reporting every hit with its position.
+
+Priority is unchanged: categories are ranked by their order in CATEGORY_KEYWORDS and the
+best-ranked category with any hit wins, exactly like the old nested loop. A keyword
+listed under several categories belongs to the first of them.
+
+Usage:
+  matcher = KeywordMatcher(CATEGORY_KEYWORDS)
+  matcher.first_category("Tadalafil 20mg Tablets", "Unclear")   # -> "Erectile_Dysfunction"
+  matcher.find_all("tadalafil + dapoxetine")                    # -> [(0, 9, "tadalafil", "Erectile_Dysfunction"), ...]
+
+Benchmark against the old loop on synthetic folder names (PowerShell):
+  py .\\scripts\\keyword_matcher.py --benchmark --count 100000
+"""
+from __future__ import annotations
+import time
+import random
+import argparse
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+NO_MATCH = 1 << 30
+
+
+class KeywordMatcher:
+    def __init__(self, category_keywords: Sequence[Tuple[str, Sequence[str]]]):
+        self.categories: List[str] = [cat for cat, _ in category_keywords]
+        self.keywords: List[str] = []
+        self._keyword_rank: List[int] = []
+        rank_of: Dict[str, int] = {}
+        for rank, (_, keywords) in enumerate(category_keywords):
+            for kw in keywords:
+                kw = kw.lower()
+                if kw and kw not in rank_of:
+                    rank_of[kw] = rank
+                    self.keywords.append(kw)
+                    self._keyword_rank.append(rank)
+
+        # Trie
+        goto: List[Dict[str, int]] = [{}]
+        ends: List[List[int]] = [[]]
+        for idx, kw in enumerate(self.keywords):
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    ends.append([])
+                state = nxt
+            ends[state].append(idx)
+
+        # Failure links in BFS order, folded into a complete transition table (a DFA), so
+        # matching never follows failure links at run time
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in range(len(goto) - 1)]
+        outputs: List[List[int]] = [list(e) for e in ends]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            trans = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                trans[ch] = nxt
+                queue.append(nxt)
+            delta[state] = trans
+        self._delta = delta
+        # Bound dict.get per state avoids an attribute lookup per character in the hot loop
+        self._step = [d.get for d in delta]
+        self._outputs: List[Tuple[int, ...]] = [tuple(sorted(o, key=lambda i: (len(self.keywords[i]), i))) for o in outputs]
+        self._best_rank: List[int] = [min((self._keyword_rank[i] for i in o), default=NO_MATCH) for o in outputs]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """Return every keyword hit in text as (start, end, keyword, category), in end order."""
+        hits: List[Tuple[int, int, str, str]] = []
+        step = self._step
+        outputs = self._outputs
+        state = 0
+        for pos, ch in enumerate(text.lower()):
+            state = step[state](ch, 0)
+            for idx in outputs[state]:
+                kw = self.keywords[idx]
+                hits.append((pos + 1 - len(kw), pos + 1, kw, self.categories[self._keyword_rank[idx]]))
+        return hits
+
+    def first_category(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the highest-priority category with a keyword in text, or default."""
+        step = self._step
+        best_rank = self._best_rank
+        best = NO_MATCH
+        state = 0
+        for ch in text.lower():
+            state = step[state](ch, 0)
+            rank = best_rank[state]
+            if rank < best:
+                best = rank
+                if best == 0:
+                    break
+        return self.categories[best] if best != NO_MATCH else default
+
+
+def naive_first_category(category_keywords: Sequence[Tuple[str, Sequence[str]]], text: str, default: Optional[str] = None) -> Optional[str]:
+    """The original nested-loop detect_category, kept as the benchmark baseline."""
+    low = text.lower()
+    for cat, keywords in category_keywords:
+        for kw in keywords:
+            if kw in low:
+                return cat
+    return default
+
+
+def synthetic_names(category_keywords: Sequence[Tuple[str, Sequence[str]]], count: int, seed: int = 7) -> List[str]:
+    """Folder-like names; roughly a third contain no keyword (the slow Unclear path)."""
+    rng = random.Random(seed)
+    keywords = [kw.strip() for _, kws in category_keywords for kw in kws]
+    fillers = ["tablets", "capsules", "forte", "plus", "extra", "oral", "jelly", "gel", "cream", "strip", "usp", "ip", "pharma", "healthcare", "lab"]
+    names = []
+    for _ in range(count):
+        parts = [f"{rng.choice([5, 10, 20, 50, 100, 200, 500])}mg"] + rng.sample(fillers, 3)
+        if rng.random() < 0.66:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(keywords))
+        names.append(" ".join(parts).title())
+    return names
+
+
+def run_benchmark(count: int) -> None:
+    import categorize_medicines
+    import categorize_medicines_web2
+
+    for module in (categorize_medicines, categorize_medicines_web2):
+        ck = module.CATEGORY_KEYWORDS
+        names = synthetic_names(ck, count)
+        matcher = KeywordMatcher(ck)
+
+        # Best of three runs to damp scheduler noise
+        naive_s = matcher_s = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            expected = [naive_first_category(ck, n, "Unclear") for n in names]
+            naive_s = min(naive_s, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            got = [matcher.first_category(n, "Unclear") for n in names]
+            matcher_s = min(matcher_s, time.perf_counter() - started)
+
+        mismatches = sum(1 for a, b in zip(expected, got) if a != b)
+        unclear = sum(1 for c in expected if c == "Unclear")
+        print(
+            f"{module.__name__}: {count} names ({unclear} unclear), {len(matcher.keywords)} keywords: "
+            f"nested loop {naive_s:.3f}s, automaton {matcher_s:.3f}s ({naive_s / matcher_s if matcher_s else 0:.1f}x), mismatches {mismatches}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Aho–Corasick keyword matcher against the nested-loop detect_category.")
+    parser.add_argument("--benchmark", action="store_true", help="Run the benchmark")
+    parser.add_argument("--count", type=int, default=100000, help="Synthetic folder names to classify")
+    args = parser.parse_args()
+    if args.benchmark:
+        run_benchmark(args.count)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Single-pass os.scandir walker over a categorized medicines tree.
+
+Layout shared by medicines/, final_web/ and final_web_2/final_web_2/:
+  <base>/<Category>/<medicine folder>/<image files>
+
+The catalog scripts used to pair os.listdir with os.path.isdir/os.path.isfile for every
+entry and then stat each image again in find_images. On a network share (s:\\MedCare)
+every one of those is a round trip. os.scandir returns the entry type with the listing
+(and full stat data on Windows), and DirEntry caches its stat result, so each directory
+is read once and each image is stat'ed at most once.
+
+Usage:
+  for folder in walk_tree(base_dir):
+      print(folder.category, folder.name, [img.name for img in folder.images])
+"""
+from __future__ import annotations
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+class ImageFile(NamedTuple):
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class MedicineFolder(NamedTuple):
+    category: str
+    name: str
+    path: str
+    images: List[ImageFile]
+
+
+def is_image_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTS
+
+
+def list_subdirs(path: str) -> List[os.DirEntry]:
+    """Return the immediate subdirectories of path sorted by name (raises OSError like os.listdir)."""
+    with os.scandir(path) as it:
+        dirs = [e for e in it if e.is_dir()]
+    dirs.sort(key=lambda e: e.name)
+    return dirs
+
+
+def scan_images(folder: str) -> List[ImageFile]:
+    """Return image files directly inside folder sorted by name; [] if the folder is missing."""
+    images: List[ImageFile] = []
+    try:
+        with os.scandir(folder) as it:
+            for e in it:
+                if not is_image_name(e.name):
+                    continue
+                try:
+                    if not e.is_file():
+                        continue
+                    st = e.stat()
+                except OSError:
+                    continue
+                images.append(ImageFile(e.name, e.path, st.st_size, st.st_mtime_ns))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    images.sort(key=lambda i: i.name)
+    return images
+
+
+def walk_tree(base_dir: str, categories: Optional[List[str]] = None, with_images: bool = True, on_error=None, stamps: Optional[Dict[str, int]] = None) -> Iterator[MedicineFolder]:
+    """Yield every medicine folder under base_dir in (category, name) order.
+
+    categories restricts the walk to those category folder names. with_images=False skips
+    reading the medicine folders themselves (for scripts that only move folders).
+    on_error(path, exc) is called for unreadable directories, which are then skipped.
+    stamps, if given, receives {absolute dir path: st_mtime_ns} for every directory listed,
+    taken before it is listed (plan_file.py compares them to detect a stale plan).
+    """
+    def stamp(path: str, entry: Optional[os.DirEntry] = None) -> None:
+        if stamps is not None:
+            try:
+                stamps[os.path.abspath(path)] = (entry.stat() if entry is not None else os.stat(path)).st_mtime_ns
+            except OSError:
+                stamps[os.path.abspath(path)] = -1
+
+    stamp(base_dir)
+    try:
+        cat_entries = list_subdirs(base_dir)
+    except OSError as e:
+        if on_error is None:
+            raise
+        on_error(base_dir, e)
+        return
+    for cat in cat_entries:
+        if categories is not None and cat.name not in categories:
+            continue
+        stamp(cat.path, cat)
+        try:
+            med_entries = list_subdirs(cat.path)
+        except OSError as e:
+            if on_error is None:
+                raise
+            on_error(cat.path, e)
+            continue
+        for med in med_entries:
+            if with_images:
+                stamp(med.path, med)
+            images = scan_images(med.path) if with_images else []
+            yield MedicineFolder(cat.name, med.name, med.path, images)
@@ -5,8 +5,13 @@ This script:
 1. Creates a unified 'medicines' directory
 2. Merges medicines from both source directories
 3. Handles duplicate categories by combining them
-4. Handles duplicate medicine names by adding suffixes
+4. Skips folders whose contents exactly match a same-named destination folder, and resolves
+   genuine name conflicts by adding _vN suffixes (see DestinationIndex)
 5. Maintains proper categorization
+6. Records moves in a write-ahead journal (see move_journal.py) so an interrupted merge can be
+   finished with --resume
+7. Can write the planned moves to a reviewable plan file (--plan-out) and apply it later
+   without rescanning (--apply, see plan_file.py)
 
 Usage (PowerShell):
   # Dry run to see what will be merged
@@ -14,12 +19,25 @@ Usage (PowerShell):
 
   # Actual merge
   python .\scripts\merge_medicines.py
+
+  # Finish a merge that was interrupted
+  python .\scripts\merge_medicines.py --resume
+
+  # Review-then-apply: one scan, the plan can be diffed before applying
+  python .\scripts\merge_medicines.py --plan-out merge.plan.json
+  python .\scripts\merge_medicines.py --apply merge.plan.json
 """
 from __future__ import annotations
 import os
-import shutil
+import re
+import hashlib
 import argparse
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
+
+from medicine_tree import list_subdirs, walk_tree
+from publish_images import file_digest
+from move_journal import MoveJournal, default_journal_path, resume_moves
+from plan_file import check_plan, dir_stamps, load_plan, move_ops, plan_moves, write_plan
 
 def get_all_categories(base_dirs: List[str]) -> Set[str]:
     """Get all unique categories from both source directories."""
@@ -27,11 +45,8 @@ def get_all_categories(base_dirs: List[str]) -> Set[str]:
     for base_dir in base_dirs:
         if os.path.isdir(base_dir):
             try:
-                entries = os.listdir(base_dir)
-                for entry in entries:
-                    entry_path = os.path.join(base_dir, entry)
-                    if os.path.isdir(entry_path):
-                        categories.add(entry)
+                for entry in list_subdirs(base_dir):
+                    categories.add(entry.name)
             except Exception as e:
                 print(f"ERROR: Cannot list directory '{base_dir}': {e}")
     return categories
@@ -43,35 +58,131 @@ def ensure_category_dirs(medicines_dir: str, categories: Set[str]) -> None:
         if not os.path.isdir(cat_path):
             os.makedirs(cat_path, exist_ok=True)
 
-def get_unique_name(dest_dir: str, medicine_name: str) -> str:
-    """Get a unique name for the medicine folder if it already exists."""
-    original_name = medicine_name
-    counter = 1
-    dest_path = os.path.join(dest_dir, medicine_name)
-    
-    while os.path.exists(dest_path):
-        medicine_name = f"{original_name}_v{counter}"
-        dest_path = os.path.join(dest_dir, medicine_name)
-        counter += 1
-    
-    return medicine_name
+VARIANT_RE = re.compile(r"^(.*)_v(\d+)$")
+
+def _raise(exc: OSError) -> None:
+    raise exc
+
+def folder_shape(path: str) -> Optional[Tuple[Tuple[str, int], ...]]:
+    """Sorted (relative file name, size) of every file under path, or None if unreadable."""
+    files: List[Tuple[str, int]] = []
+    try:
+        for root, _, names in os.walk(path, onerror=_raise):
+            for name in names:
+                full = os.path.join(root, name)
+                files.append((os.path.relpath(full, path).replace(os.sep, "/"), os.stat(full).st_size))
+    except OSError:
+        return None
+    return tuple(sorted(files))
+
+class DestinationIndex:
+    """In-memory index of destination folder names and contents, built once per category.
+
+    Replaces probing os.path.exists for every _v1, _v2, ... candidate: each destination
+    category is listed once and planned moves are added as they are decided. Content
+    fingerprints (sorted file names, sizes, then SHA-256) are computed lazily and only for
+    folders whose name collides; hashing only happens when names and sizes already match.
+    """
+
+    def __init__(self, medicines_dir: str):
+        self.medicines_dir = medicines_dir
+        # category -> base name -> names taken (the base name itself and its _vN variants)
+        self._variants: Dict[str, Dict[str, List[str]]] = {}
+        self._names: Dict[str, Set[str]] = {}
+        # destination path -> folder its contents will come from (itself, or a planned source)
+        self._content: Dict[str, str] = {}
+        self._next_suffix: Dict[Tuple[str, str], int] = {}
+        self._shapes: Dict[str, Optional[Tuple[Tuple[str, int], ...]]] = {}
+        self._digests: Dict[str, str] = {}
+
+    def _load(self, category: str) -> None:
+        if category in self._names:
+            return
+        self._names[category] = set()
+        self._variants[category] = {}
+        cat_dir = os.path.join(self.medicines_dir, category)
+        try:
+            entries = list_subdirs(cat_dir)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            self._add(category, entry.name, entry.path)
+
+    def _add(self, category: str, name: str, content_path: str) -> None:
+        self._names[category].add(name)
+        match = VARIANT_RE.match(name)
+        self._variants[category].setdefault(match.group(1) if match else name, []).append(name)
+        self._content[os.path.join(self.medicines_dir, category, name)] = content_path
+
+    def _shape(self, path: str):
+        if path not in self._shapes:
+            self._shapes[path] = folder_shape(path)
+        return self._shapes[path]
+
+    def _digest(self, path: str) -> str:
+        if path not in self._digests:
+            h = hashlib.sha256()
+            for rel, _ in self._shape(path) or ():
+                h.update(rel.encode("utf-8") + b"\0" + file_digest(os.path.join(path, rel)).encode("ascii"))
+            self._digests[path] = h.hexdigest()
+        return self._digests[path]
+
+    def same_content(self, a: str, b: str) -> bool:
+        shape = self._shape(a)
+        if shape is None or shape != self._shape(b):
+            return False
+        return self._digest(a) == self._digest(b)
+
+    def find_duplicate(self, category: str, name: str, src: str) -> Optional[str]:
+        """Return the existing or planned destination name whose contents exactly match src."""
+        self._load(category)
+        match = VARIANT_RE.match(name)
+        base = match.group(1) if match else name
+        for candidate in self._variants[category].get(base, []):
+            content = self._content[os.path.join(self.medicines_dir, category, candidate)]
+            if self.same_content(src, content):
+                return candidate
+        return None
 
-def merge_medicines(source_dirs: List[str], medicines_dir: str, dry_run: bool = False) -> Dict[str, int]:
-    """Merge medicines from source directories into the medicines directory."""
-    stats = {
+    def unique_name(self, category: str, name: str) -> str:
+        """Return name, or the first free name_vN, without touching the filesystem."""
+        self._load(category)
+        names = self._names[category]
+        if name not in names:
+            return name
+        counter = self._next_suffix.get((category, name), 1)
+        while f"{name}_v{counter}" in names:
+            counter += 1
+        self._next_suffix[(category, name)] = counter + 1
+        return f"{name}_v{counter}"
+
+    def reserve(self, category: str, name: str, src: str) -> None:
+        """Record a planned move of src to category/name."""
+        self._load(category)
+        self._add(category, name, src)
+
+def new_merge_stats() -> Dict[str, int]:
+    return {
         'total_processed': 0,
         'total_moved': 0,
         'duplicates_renamed': 0,
+        'duplicates_skipped': 0,
         'skipped': 0,
         'errors': 0
     }
-    
-    # Get all categories first
-    all_categories = get_all_categories(source_dirs)
-    print(f"Found categories: {', '.join(sorted(all_categories))}")
-    
-    if not dry_run:
-        ensure_category_dirs(medicines_dir, all_categories)
+
+def plan_merge(source_dirs: List[str], medicines_dir: str, stats: Dict[str, int], dry_run: bool = False) -> Tuple[List[Tuple[str, str]], Dict[str, str]]:
+    """Decide every move (destination names reserved in memory) without touching the tree.
+
+    Returns ([(src, dst)], {src: label}).
+    """
+    def report_error(path: str, exc: Exception) -> None:
+        print(f"ERROR: Cannot list '{path}': {exc}")
+        stats['errors'] += 1
+
+    moves: List[Tuple[str, str]] = []
+    labels: Dict[str, str] = {}
+    index = DestinationIndex(medicines_dir)
     
     for source_idx, source_dir in enumerate(source_dirs):
         source_name = f"final_web{'_2' if source_idx == 1 else ''}"
@@ -81,65 +192,123 @@ def merge_medicines(source_dirs: List[str], medicines_dir: str, dry_run: bool =
             
         print(f"\nProcessing {source_name}: {source_dir}")
         
-        try:
-            categories = sorted(os.listdir(source_dir))
-        except Exception as e:
-            print(f"ERROR: Cannot list source directory: {e}")
-            stats['errors'] += 1
-            continue
-            
-        for category in categories:
-            cat_path = os.path.join(source_dir, category)
-            if not os.path.isdir(cat_path):
-                continue
-                
+        # Directory listings only; the folders themselves are moved whole
+        for folder in walk_tree(source_dir, with_images=False, on_error=report_error):
+            category = folder.category
+            medicine = folder.name
+            medicine_path = folder.path
             dest_cat_dir = os.path.join(medicines_dir, category)
+
+            stats['total_processed'] += 1
             
-            try:
-                medicines = sorted(os.listdir(cat_path))
-            except Exception as e:
-                print(f"ERROR: Cannot list category '{category}': {e}")
-                stats['errors'] += 1
+            # An exact copy of a folder already there (or already planned) adds nothing
+            duplicate = index.find_duplicate(category, medicine, medicine_path)
+            if duplicate is not None:
+                stats['duplicates_skipped'] += 1
+                print(f"  DUPLICATE: {source_name}/{category}/{medicine} matches medicines/{category}/{duplicate} — skipped")
                 continue
-                
-            for medicine in medicines:
-                medicine_path = os.path.join(cat_path, medicine)
-                if not os.path.isdir(medicine_path):
-                    continue
-                    
-                stats['total_processed'] += 1
-                
-                # Check if destination already exists and get unique name
-                unique_name = get_unique_name(dest_cat_dir, medicine)
-                dest_path = os.path.join(dest_cat_dir, unique_name)
-                
-                if unique_name != medicine:
-                    stats['duplicates_renamed'] += 1
-                    print(f"  RENAMED: '{medicine}' -> '{unique_name}' (duplicate)")
-                
-                if dry_run:
-                    print(f"  DRY-RUN MOVE: {source_name}/{category}/{medicine} -> medicines/{category}/{unique_name}")
-                else:
-                    try:
-                        shutil.move(medicine_path, dest_path)
-                        print(f"  MOVED: {source_name}/{category}/{medicine} -> medicines/{category}/{unique_name}")
-                        stats['total_moved'] += 1
-                    except Exception as e:
-                        print(f"  ERROR moving '{medicine}': {e}")
-                        stats['errors'] += 1
+
+            # Otherwise take the name, or the first free _vN variant
+            unique_name = index.unique_name(category, medicine)
+            dest_path = os.path.join(dest_cat_dir, unique_name)
+            index.reserve(category, unique_name, medicine_path)
+            
+            if unique_name != medicine:
+                stats['duplicates_renamed'] += 1
+                print(f"  RENAMED: '{medicine}' -> '{unique_name}' (duplicate)")
+            
+            if dry_run:
+                print(f"  DRY-RUN MOVE: {source_name}/{category}/{medicine} -> medicines/{category}/{unique_name}")
+            else:
+                moves.append((medicine_path, dest_path))
+                labels[medicine_path] = f"{source_name}/{category}/{medicine} -> medicines/{category}/{unique_name}"
+
+    return moves, labels
+
+def execute_moves(moves: List[Tuple[str, str]], labels: Dict[str, str], journal: MoveJournal, stats: Dict[str, int]) -> None:
+    for src, dest_path, err in journal.execute(moves):
+        if err is None:
+            print(f"  MOVED: {labels.get(src) or f'{src} -> {dest_path}'}")
+            stats['total_moved'] += 1
+        else:
+            print(f"  ERROR moving '{os.path.basename(src)}': {err}")
+            stats['errors'] += 1
+
+def merge_watch_dirs(source_dirs: List[str], medicines_dir: str) -> List[str]:
+    """Directories whose listings a merge plan depends on (sources, their categories, destinations)."""
+    categories = get_all_categories(source_dirs)
+    watch = [medicines_dir] + [os.path.join(medicines_dir, c) for c in sorted(categories)]
+    for source_dir in source_dirs:
+        watch.append(source_dir)
+        watch.extend(os.path.join(source_dir, c) for c in sorted(categories))
+    return watch
+
+def merge_medicines(source_dirs: List[str], medicines_dir: str, dry_run: bool = False, journal: Optional[MoveJournal] = None) -> Dict[str, int]:
+    """Merge medicines from source directories into the medicines directory.
+
+    All moves are planned first (destination names reserved in memory) and then executed
+    through the journal in fsynced batches.
+    """
+    stats = new_merge_stats()
+
+    # Get all categories first
+    all_categories = get_all_categories(source_dirs)
+    print(f"Found categories: {', '.join(sorted(all_categories))}")
     
+    if not dry_run:
+        ensure_category_dirs(medicines_dir, all_categories)
+    moves, labels = plan_merge(source_dirs, medicines_dir, stats, dry_run)
+    execute_moves(moves, labels, journal or MoveJournal(None), stats)
+
     return stats
 
+def print_merge_summary(stats: Dict[str, int]) -> None:
+    print(f"\nMerge Summary:")
+    print(f"  Total medicines processed: {stats['total_processed']}")
+    print(f"  Successfully moved: {stats['total_moved']}")
+    print(f"  Duplicates renamed: {stats['duplicates_renamed']}")
+    print(f"  Exact duplicates skipped (left in source): {stats['duplicates_skipped']}")
+    print(f"  Errors: {stats['errors']}")
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Merge medicines from source directories into a single medicines directory.")
     parser.add_argument("--medicines-dir", default="medicines", help="Path (relative or absolute) to the unified medicines directory")
     parser.add_argument("--source-dir", action="append", dest="source_dirs", help="Source directory to merge from (can be specified multiple times)")
     parser.add_argument("--dry-run", action="store_true", help="Preview actions without moving folders")
+    parser.add_argument("--journal", default=None, help="Move journal path (default: <medicines-dir>.merge.journal beside the medicines directory)")
+    parser.add_argument("--resume", action="store_true", help="Finish the moves recorded in the journal by an interrupted merge, without rescanning")
+    parser.add_argument("--plan-out", default=None, help="Write the planned moves to this plan file instead of moving anything")
+    parser.add_argument("--apply", default=None, help="Execute the moves in a plan file written by --plan-out (no rescan)")
+    parser.add_argument("--force", action="store_true", help="With --apply, apply the plan even if the tree changed since it was written")
 
     args = parser.parse_args()
 
     medicines_dir = os.path.join(os.getcwd(), args.medicines_dir) if not os.path.isabs(args.medicines_dir) else args.medicines_dir
     dry_run = args.dry_run
+    journal_path = args.journal or default_journal_path(medicines_dir, "merge")
+
+    if args.resume:
+        resume_moves(journal_path, os.path.basename(__file__))
+        return
+
+    if args.apply:
+        plan = load_plan(args.apply, os.path.basename(__file__))
+        print(f"Applying plan: {args.apply}")
+        if not check_plan(plan, args.force):
+            return
+        journal = MoveJournal(journal_path, os.path.basename(__file__))
+        if journal.has_pending():
+            print(f"ERROR: Unfinished moves in journal {journal_path}; re-run with --resume first")
+            return
+        stats = new_merge_stats()
+        moves = plan_moves(plan)
+        stats['total_processed'] = len(moves)
+        stats['duplicates_renamed'] = plan["options"].get("duplicates_renamed", 0)
+        stats['duplicates_skipped'] = plan["options"].get("duplicates_skipped", 0)
+        execute_moves(moves, {}, journal, stats)
+        journal.close()
+        print_merge_summary(stats)
+        return
 
     # Default source directories if none provided
     source_dirs = args.source_dirs if args.source_dirs else [
@@ -153,17 +322,29 @@ def main() -> None:
         exists = "✓" if os.path.isdir(src) else "✗"
         print(f"  {exists} {src}")
 
+    if args.plan_out:
+        # Snapshot the listings the plan depends on before scanning them
+        watch = dir_stamps(merge_watch_dirs(source_dirs, medicines_dir))
+        stats = new_merge_stats()
+        moves, _ = plan_merge(source_dirs, medicines_dir, stats)
+        write_plan(args.plan_out, os.path.basename(__file__), move_ops(moves), watch, {"duplicates_renamed": stats['duplicates_renamed'], "duplicates_skipped": stats['duplicates_skipped']})
+        print_merge_summary(stats)
+        print(f"\nNote: Nothing was moved. Review the plan, then apply it with --apply {args.plan_out}")
+        return
+
+    journal = MoveJournal(None if dry_run else journal_path, os.path.basename(__file__))
+    if journal.has_pending():
+        print(f"ERROR: Unfinished moves in journal {journal_path}; re-run with --resume first")
+        return
+
     if not dry_run:
         os.makedirs(medicines_dir, exist_ok=True)
 
     # Merge medicines from directories
-    stats = merge_medicines(source_dirs, medicines_dir, dry_run)
+    stats = merge_medicines(source_dirs, medicines_dir, dry_run, journal)
+    journal.close()
 
-    print(f"\nMerge Summary:")
-    print(f"  Total medicines processed: {stats['total_processed']}")
-    print(f"  Successfully moved: {stats['total_moved']}")
-    print(f"  Duplicates renamed: {stats['duplicates_renamed']}")
-    print(f"  Errors: {stats['errors']}")
+    print_merge_summary(stats)
 
     if dry_run:
         print("\nNote: This was a dry run. Re-run without --dry-run to apply changes.")
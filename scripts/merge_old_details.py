@@ -1,12 +1,49 @@
+"""Restore details lost from medicines.json using previous snapshots of it.
+
+Each current entry is matched to a previous entry by id, then by slugified name / Brand
+Name, and finally by fuzzy token overlap (Jaccard >= 0.5 over name and Brand Name tokens,
+best score wins, earliest entry on ties). The fuzzy step used to compare every entry with
+every previous entry; it now goes through an inverted token index with prefix filtering
+(TokenIndex), which returns exactly the same match while only scoring entries that can
+reach the threshold. --matcher minhash uses MinHash/LSH buckets instead for very large
+histories (approximate candidates, exact scoring).
+
+When the catalog history store (catalog_history.py, medicines.history.jsonl) exists, the
+previous entries come from it instead of the medicines.previous*.json copies: one entry per
+id ever recorded, each field (and each details row) holding its last non-empty value.
+--record appends the restored catalog to the store as a new version.
+
+medicines.json is rewritten through a temp file and an atomic rename. --stream also reads
+it one entry at a time (json_stream.py), so very large exports need memory only for the
+previous entries and one current entry.
+
+Usage (PowerShell):
+  py .\\scripts\\merge_old_details.py
+  py .\\scripts\\merge_old_details.py --extra "s:\\MedCare\\old\\medicines.json"
+  py .\\scripts\\merge_old_details.py --record
+  py .\\scripts\\merge_old_details.py --stream
+
+  # Compare the linear scan, the inverted index and MinHash on the real data at 1x/10x/100x history
+  py .\\scripts\\merge_old_details.py --benchmark
+"""
+import os
 import json
+import math
 import sys
+import time
+import zlib
+import random
 from pathlib import Path
 import argparse
 import re
 
+from catalog_history import CatalogHistory
+from json_stream import stream_transform
+
 CURRENT_PATH = Path(r"S:\MedCare\src\data\medicines.json")
 PREV_PATH = Path(r"S:\MedCare\src\data\medicines.previous.json")
 PREV2_PATH = Path(r"S:\MedCare\src\data\medicines.previous2.json")
+HISTORY_PATH = Path(r"S:\MedCare\src\data\medicines.history.jsonl")
 
 # Labels to prefer restoring when missing
 PREFER_LABELS = {
@@ -38,6 +75,167 @@ DETAIL_LABELS = [
     "Storage",
 ]
 
+# Fuzzy matching: tokens of name and Brand Name, ignoring form/unit words
+STOPWORDS = {"tablet", "tablets", "capsule", "capsules", "mg", "ml", "g", "tab", "tabs"}
+WORD_RE = re.compile(r"[a-z0-9]+")
+FUZZY_THRESHOLD = 0.5
+
+
+def tokens(s: str):
+    words = [w for w in WORD_RE.findall(str(s or '').lower()) if w and w not in STOPWORDS]
+    return set(words)
+
+
+def entry_tokens(e):
+    toks = tokens(str(e.get("name", "")))
+    # include Brand Name from details
+    d = e.get("details")
+    if isinstance(d, list):
+        for row in d:
+            if str(row.get("label", "")).lower() == "brand name":
+                toks |= tokens(row.get("value", ""))
+                break
+    return toks
+
+
+def linear_best_match(etoks, prev_token_index, threshold=FUZZY_THRESHOLD):
+    """Reference O(M) scan; returns (entry or None, score, candidates scored)."""
+    best = None
+    best_score = 0.0
+    for ptoks, cand in prev_token_index:
+        if not ptoks:
+            continue
+        inter = len(etoks & ptoks)
+        if inter == 0:
+            continue
+        denom = len(etoks | ptoks)
+        score = inter / denom if denom else 0.0
+        # Require reasonable overlap
+        if score > best_score and score >= threshold:
+            best = cand
+            best_score = score
+    return best, best_score, len(prev_token_index)
+
+
+def _prefix_length(n, threshold):
+    # Any set with Jaccard >= threshold against an n-token set shares >= ceil(threshold * n) tokens
+    return n - math.ceil(threshold * n - 1e-9) + 1
+
+
+class TokenIndex:
+    """Exact replacement for linear_best_match: inverted index plus prefix filtering.
+
+    Tokens are ordered rarest first. Each distinct token set is indexed only under its
+    first n - ceil(t*n) + 1 tokens; two sets with Jaccard >= t must share a token within
+    both prefixes, so only entries in the query prefix's postings are scored (after a
+    length filter). Repeated token sets (the same medicine in several snapshots) are
+    indexed once, keeping the earliest entry, which is the one the linear scan would
+    pick on a tie.
+    """
+
+    def __init__(self, prev_token_index, threshold=FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self.sets = []
+        self.entries = []
+        seen = set()
+        df = {}
+        for ptoks, cand in prev_token_index:
+            key = frozenset(ptoks)
+            if not ptoks or key in seen:
+                continue
+            seen.add(key)
+            self.sets.append(key)
+            self.entries.append(cand)
+            for tok in key:
+                df[tok] = df.get(tok, 0) + 1
+        self.df = df
+        self.postings = {}
+        for i, toks in enumerate(self.sets):
+            ordered = self.order(toks)
+            for tok in ordered[:_prefix_length(len(ordered), threshold)]:
+                self.postings.setdefault(tok, []).append(i)
+
+    def order(self, toks):
+        return sorted(toks, key=lambda t: (self.df.get(t, 0), t))
+
+    def best_match(self, etoks):
+        """Returns (entry or None, score, candidates scored)."""
+        if not etoks:
+            return None, 0.0, 0
+        ordered = self.order(etoks)
+        candidates = set()
+        for tok in ordered[:_prefix_length(len(ordered), self.threshold)]:
+            candidates.update(self.postings.get(tok, ()))
+        n = len(etoks)
+        lo, hi = self.threshold * n, n / self.threshold
+        best_i = None
+        best_score = 0.0
+        for i in sorted(candidates):
+            ptoks = self.sets[i]
+            if not lo <= len(ptoks) <= hi:
+                continue
+            inter = len(etoks & ptoks)
+            score = inter / (n + len(ptoks) - inter)
+            if score > best_score and score >= self.threshold:
+                best_i = i
+                best_score = score
+        return (self.entries[best_i] if best_i is not None else None), best_score, len(candidates)
+
+
+class MinHashIndex:
+    """Approximate candidates from MinHash/LSH banding, then exact Jaccard scoring.
+
+    With 32 bands of 4 rows a pair at Jaccard 0.5 collides in some band with probability
+    ~0.87 and at 0.7 ~0.999, so rare borderline matches can be missed; use it only when the
+    history is too large for TokenIndex postings.
+    """
+
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, prev_token_index, threshold=FUZZY_THRESHOLD, bands=32, rows=4, seed=1):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, self.PRIME), rng.randrange(0, self.PRIME)) for _ in range(bands * rows)]
+        self.sets = []
+        self.entries = []
+        self.buckets = {}
+        seen = set()
+        for ptoks, cand in prev_token_index:
+            key = frozenset(ptoks)
+            if not ptoks or key in seen:
+                continue
+            seen.add(key)
+            i = len(self.sets)
+            self.sets.append(key)
+            self.entries.append(cand)
+            for band in self.band_keys(key):
+                self.buckets.setdefault(band, []).append(i)
+
+    def band_keys(self, toks):
+        hashes = [zlib.crc32(t.encode("utf-8")) for t in toks]
+        sig = [min((a * h + b) % self.PRIME for h in hashes) for a, b in self.perms]
+        return [(b, tuple(sig[b * self.rows:(b + 1) * self.rows])) for b in range(self.bands)]
+
+    def best_match(self, etoks):
+        if not etoks:
+            return None, 0.0, 0
+        candidates = set()
+        for band in self.band_keys(etoks):
+            candidates.update(self.buckets.get(band, ()))
+        best_i = None
+        best_score = 0.0
+        for i in sorted(candidates):
+            ptoks = self.sets[i]
+            inter = len(etoks & ptoks)
+            score = inter / (len(etoks) + len(ptoks) - inter)
+            if score > best_score and score >= self.threshold:
+                best_i = i
+                best_score = score
+        return (self.entries[best_i] if best_i is not None else None), best_score, len(candidates)
+
+
 def load_json(path: Path):
     if not path.exists():
         return []
@@ -118,17 +316,76 @@ def merge_details_with_old(entry, current, old):
     return merged
 
 
+def synthetic_history(prev_token_index, copies, seed=7):
+    """Simulate more snapshots: repeat the history, renaming ~20% of each extra copy."""
+    rng = random.Random(seed)
+    out = list(prev_token_index)
+    for c in range(1, copies):
+        for toks, e in prev_token_index:
+            if toks and rng.random() < 0.2:
+                toks = set(toks) | {f"s{c}r{rng.randrange(1000)}"}
+            out.append((toks, e))
+    return out
+
+
+def benchmark(cur, prev_token_index):
+    queries = [tokens(e.get("name")) for e in cur]
+    for copies in (1, 10, 100):
+        history = synthetic_history(prev_token_index, copies)
+        print(f"History {copies}x: {len(history)} entries, {len(queries)} queries")
+        reference = None
+        for name, build in (("linear", None), ("index", TokenIndex), ("minhash", MinHashIndex)):
+            started = time.perf_counter()
+            matcher = build(history) if build else None
+            built = time.perf_counter() - started
+            started = time.perf_counter()
+            results = []
+            scored = 0
+            for q in queries:
+                best, _, n = matcher.best_match(q) if matcher else linear_best_match(q, history)
+                results.append(id(best) if best is not None else None)
+                scored += n
+            elapsed = time.perf_counter() - started
+            if reference is None:
+                reference = results
+            same = sum(1 for a, b in zip(results, reference) if a == b)
+            print(f"  {name:<8} build {built * 1000:7.1f} ms  query {elapsed * 1000:8.1f} ms  candidates/query {scored / max(1, len(queries)):8.1f}  same match as linear {same}/{len(queries)}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Merge old details into current medicines.json")
     parser.add_argument("--extra", dest="extra", nargs="*", default=[], help="Additional previous JSON file(s) to merge from")
+    parser.add_argument("--matcher", choices=("index", "minhash"), default="index", help="Fuzzy matcher: exact inverted index (default) or approximate MinHash/LSH for very large histories")
+    parser.add_argument("--benchmark", action="store_true", help="Time the fuzzy matchers at 1x/10x/100x history without writing anything")
+    parser.add_argument("--data-dir", default=None, help="Directory holding medicines.json, medicines.previous.json and medicines.previous2.json (default: S:\\MedCare\\src\\data)")
+    parser.add_argument("--history", default=None, help="Catalog history store to restore from (default: medicines.history.jsonl in the data directory; snapshot files are used if it does not exist)")
+    parser.add_argument("--record", action="store_true", help="Append the restored catalog to the history store as a new version")
+    parser.add_argument("--stream", action="store_true", help="Read and rewrite medicines.json one entry at a time (bounded memory for very large catalogs; --record still loads the result)")
     args = parser.parse_args()
 
-    cur = load_json(CURRENT_PATH)
-    prev = load_json(PREV_PATH)
-    prev2 = load_json(PREV2_PATH)
+    current_path, prev_path, prev2_path, history_path = CURRENT_PATH, PREV_PATH, PREV2_PATH, HISTORY_PATH
+    if args.data_dir:
+        data_dir = Path(args.data_dir)
+        current_path, prev_path, prev2_path, history_path = (data_dir / n for n in ("medicines.json", "medicines.previous.json", "medicines.previous2.json", "medicines.history.jsonl"))
+    if args.history:
+        history_path = Path(args.history)
+    history = CatalogHistory(str(history_path))
+
+    if args.stream and not current_path.exists():
+        print(f"ERROR: {current_path} does not exist")
+        return
+    # Streaming reads the current catalog entry by entry below instead
+    cur = load_json(current_path) if not args.stream or args.benchmark else None
     combined_prev = []
-    combined_prev.extend([e for e in prev if isinstance(e, dict)])
-    combined_prev.extend([e for e in prev2 if isinstance(e, dict)])
+    if history_path.exists():
+        # Last non-empty values per id across every recorded version; no snapshot is loaded whole
+        combined_prev.extend(history.composite_entries())
+        print(f"Restoring from history store: {history_path} ({len(history.versions())} versions, {len(combined_prev)} ids)")
+    else:
+        prev = load_json(prev_path)
+        prev2 = load_json(prev2_path)
+        combined_prev.extend([e for e in prev if isinstance(e, dict)])
+        combined_prev.extend([e for e in prev2 if isinstance(e, dict)])
     # Load any extra previous files supplied
     for p in args.extra:
         try:
@@ -172,50 +429,22 @@ def main():
                     break
 
     # Build token index for fuzzy matching when id/name differ (e.g., brand vs generic)
-    STOPWORDS = {"tablet", "tablets", "capsule", "capsules", "mg", "ml", "g", "tab", "tabs"}
-    WORD_RE = re.compile(r"[a-z0-9]+")
-
-    def tokens(s: str):
-        words = [w for w in WORD_RE.findall(str(s or '').lower()) if w and w not in STOPWORDS]
-        return set(words)
-
-    prev_token_index = []
-    for e in combined_prev:
-        nm = str(e.get("name", ""))
-        toks = tokens(nm)
-        # include Brand Name from details
-        d = e.get("details")
-        if isinstance(d, list):
-            for row in d:
-                if str(row.get("label", "")).lower() == "brand name":
-                    toks |= tokens(row.get("value", ""))
-                    break
-        prev_token_index.append((toks, e))
+    prev_token_index = [(entry_tokens(e), e) for e in combined_prev]
+    if args.benchmark:
+        benchmark(cur, prev_token_index)
+        return
+    matcher = MinHashIndex(prev_token_index) if args.matcher == "minhash" else TokenIndex(prev_token_index)
 
-    updated = []
     restored_count = 0
 
-    for entry in cur:
+    def restore(entry):
+        nonlocal restored_count
         old = prev_by_id.get(entry.get("id"))
         if not old:
             old = prev_by_name.get(slug(entry.get("name")))
         # If still not found, try fuzzy match by tokens overlap
         if not old:
-            etoks = tokens(entry.get("name"))
-            best = None
-            best_score = 0.0
-            for ptoks, cand in prev_token_index:
-                if not ptoks:
-                    continue
-                inter = len(etoks & ptoks)
-                if inter == 0:
-                    continue
-                denom = len(etoks | ptoks)
-                score = inter / denom if denom else 0.0
-                # Require reasonable overlap
-                if score > best_score and score >= 0.5:
-                    best = cand
-                    best_score = score
+            best, _, _ = matcher.best_match(tokens(entry.get("name")))
             if best is not None:
                 old = best
         if old:
@@ -229,12 +458,24 @@ def main():
             restored_count += 1 if isinstance(old_details, list) and len(old_details) > 0 else 0
         # Ensure normalization pass (labels ordering and default fill)
         entry["details"] = normalize_details(entry, entry.get("details"))
-        updated.append(entry)
+        return entry
 
-    with CURRENT_PATH.open("w", encoding="utf-8") as f:
-        json.dump(updated, f, indent=2, ensure_ascii=False)
+    if args.stream:
+        # Entries go to a temp file that atomically replaces medicines.json at the end
+        total = stream_transform(str(current_path), str(current_path), restore)
+        updated = None
+    else:
+        updated = [restore(entry) for entry in cur]
+        total = len(updated)
+        tmp_path = current_path.with_name(current_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(updated, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, current_path)
 
-    print(f"Restored details for {restored_count} medicines. Total entries: {len(updated)}")
+    print(f"Restored details for {restored_count} medicines. Total entries: {total}")
+    if args.record:
+        version = history.append_version(updated if updated is not None else load_json(current_path), current_path.name)
+        print(f"Recorded version {version} in {history_path}" if version else f"History unchanged: {history_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+"""Crash-safe, resumable folder moves for categorize_medicines*.py and merge_medicines.py.
+
+Those scripts used to shutil.move one folder at a time with no record of progress, so an
+interrupted run left the tree half reorganized and the only way forward was to rescan
+and re-plan everything. MoveJournal is a small write-ahead log (JSON lines):
+
+  {"op": "begin", "script": "merge_medicines.py", "started": 1734950000.0}
+  {"op": "plan", "seq": 0, "src": "...\\\\final_web\\\\ED\\\\Kamagra", "dst": "...\\\\medicines\\\\ED\\\\Kamagra"}
+  ...
+  {"op": "copied", "seq": 2}
+  {"op": "done", "seq": 0}
+  {"op": "failed", "seq": 1, "error": "Destination already exists: ..."}
+
+Moves run in batches: the batch's plan records are fsynced before any of its folders move
+(so no move can happen unrecorded), and its done records are fsynced once after the
+batch, costing two fsyncs per batch rather than per folder. A failed move is recorded (and
+fsynced) before the next move starts. A folder on the same device is moved with a single
+os.rename; across devices it is copied to <dst>.partial, every copied file and directory
+is fsynced, the copy is renamed into place, recorded as "copied" (fsynced) and only then
+removed from the source.
+
+--resume replays just the planned moves without a done/failed record, reconciling each with the
+filesystem (already moved, half-copied, or untouched), without rescanning the tree. A source
+is only deleted on resume when its "copied" record proves the destination is our finished
+copy; if both exist without one, the destination came from elsewhere and the move fails.
+The journal is deleted once every planned move has completed.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import shutil
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_BATCH_SIZE = 64
+PARTIAL_SUFFIX = ".partial"
+
+
+def default_journal_path(tree_dir: str, script: str) -> str:
+    """Journal beside (not inside) the tree being reorganized, e.g. medicines.merge.journal."""
+    return f"{os.path.abspath(tree_dir).rstrip(os.sep)}.{script}.journal"
+
+
+def _fsync_dirs(paths: Sequence[str]) -> None:
+    # Makes renames durable on POSIX; Windows cannot open directories for fsync
+    if os.name == "nt":
+        return
+    for path in set(paths):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def _fsync_tree(path: str) -> None:
+    """fsync every file and directory under path (or path itself when it is a file)."""
+    if os.path.isfile(path):
+        files, dirs = [path], []
+    else:
+        files, dirs = [], []
+        for dirpath, _, filenames in os.walk(path):
+            dirs.append(dirpath)
+            files.extend(os.path.join(dirpath, f) for f in filenames)
+    for fpath in files:
+        try:
+            # Windows only flushes handles opened for writing
+            fd = os.open(fpath, os.O_RDWR if os.name == "nt" else os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    _fsync_dirs(dirs)
+
+
+def _same_device(src: str, dst_parent: str) -> bool:
+    try:
+        return os.stat(src).st_dev == os.stat(dst_parent).st_dev
+    except OSError:
+        return False
+
+
+def move_folder(src: str, dst: str, on_copied: Optional[Callable[[], None]] = None) -> None:
+    """Move src to dst (which must not exist): os.rename on one device, copy-then-delete across devices.
+
+    on_copied runs after a cross-device copy is in place at dst and before src is removed.
+    """
+    if os.path.exists(dst):
+        raise FileExistsError(f"Destination already exists: {dst}")
+    parent = os.path.dirname(dst)
+    os.makedirs(parent, exist_ok=True)
+    if _same_device(src, parent):
+        os.rename(src, dst)
+        return
+    partial = dst + PARTIAL_SUFFIX
+    if os.path.exists(partial):
+        shutil.rmtree(partial)
+    if os.path.isdir(src):
+        shutil.copytree(src, partial)
+    else:
+        shutil.copy2(src, partial)
+    # The copy must be on disk before anything (journal record, source removal) relies on it
+    _fsync_tree(partial)
+    os.rename(partial, dst)
+    _fsync_dirs([parent])
+    if on_copied is not None:
+        on_copied()
+    if os.path.isdir(src):
+        shutil.rmtree(src)
+    else:
+        os.remove(src)
+
+
+def _finish_move(src: str, dst: str, copied: bool = False, on_copied: Optional[Callable[[], None]] = None) -> str:
+    """Complete a journaled move whose outcome is unknown. Returns what was done.
+
+    copied says the journal holds a "copied" record for this move, i.e. dst is the finished
+    cross-device copy of src.
+    """
+    partial = dst + PARTIAL_SUFFIX
+    if os.path.exists(partial):
+        # Cross-device copy was interrupted before the rename into place
+        shutil.rmtree(partial) if os.path.isdir(partial) else os.remove(partial)
+    src_exists = os.path.exists(src)
+    if os.path.exists(dst):
+        if src_exists:
+            if not copied:
+                # Without a "copied" record dst is not our copy (and a same-device move is one
+                # rename), so it came from elsewhere: never delete the only copy of src
+                raise FileExistsError(f"Destination already exists: {dst}")
+            # The copy was recorded complete; only the source cleanup is left
+            shutil.rmtree(src) if os.path.isdir(src) else os.remove(src)
+            return "cleaned"
+        return "already"
+    if not src_exists:
+        raise FileNotFoundError(f"Neither source nor destination exists: {src}")
+    move_folder(src, dst, on_copied)
+    return "moved"
+
+
+class MoveJournal:
+    """Write-ahead journal of folder moves. path=None disables journaling (moves still use os.rename)."""
+
+    def __init__(self, path: Optional[str], script: str = "", batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.script = script
+        self.batch_size = max(1, batch_size)
+        self._fh = None
+        self._next_seq = 0
+
+    # Journal file handling
+
+    def _write(self, records: Sequence[Dict], sync: bool) -> None:
+        if self.path is None:
+            return
+        if self._fh is None:
+            new = not os.path.exists(self.path)
+            torn = False
+            if not new and os.path.getsize(self.path):
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            self._fh = open(self.path, "a", encoding="utf-8")
+            if new:
+                self._fh.write(json.dumps({"op": "begin", "script": self.script, "started": time.time()}, ensure_ascii=False) + "\n")
+            elif torn:
+                # Terminate a line cut short by a crash so new records parse
+                self._fh.write("\n")
+        for rec in records:
+            self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        if sync:
+            os.fsync(self._fh.fileno())
+
+    def _copied_callback(self, seq: int) -> Optional[Callable[[], None]]:
+        if self.path is None:
+            return None
+        return lambda: self._write([{"op": "copied", "seq": seq}], sync=True)
+
+    @staticmethod
+    def read_copied(path: str) -> Set[int]:
+        """Seqs whose cross-device copy was recorded complete."""
+        copied: Set[int] = set()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("op") == "copied":
+                    copied.add(rec["seq"])
+        return copied
+
+    @staticmethod
+    def read_pending(path: str) -> Tuple[List[Tuple[int, str, str]], int]:
+        """Return ([(seq, src, dst)] planned but not done, next free seq) from a journal file."""
+        plans: Dict[int, Tuple[str, str]] = {}
+        done = set()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash mid-write
+                if rec.get("op") == "plan":
+                    plans[rec["seq"]] = (rec["src"], rec["dst"])
+                elif rec.get("op") in ("done", "failed"):
+                    done.add(rec["seq"])
+        pending = [(seq, src, dst) for seq, (src, dst) in sorted(plans.items()) if seq not in done]
+        return pending, (max(plans) + 1 if plans else 0)
+
+    def has_pending(self) -> bool:
+        return bool(self.path and os.path.exists(self.path) and self.read_pending(self.path)[0])
+
+    # Executing moves
+
+    def execute(self, moves: Sequence[Tuple[str, str]]) -> Iterator[Tuple[str, str, Optional[Exception]]]:
+        """Journal and perform moves in batches, yielding (src, dst, error or None) per move."""
+        if self.path is not None and self._fh is None and os.path.exists(self.path):
+            self._next_seq = self.read_pending(self.path)[1]
+        for start in range(0, len(moves), self.batch_size):
+            batch = moves[start:start + self.batch_size]
+            seqs = list(range(self._next_seq, self._next_seq + len(batch)))
+            self._next_seq += len(batch)
+            self._write([{"op": "plan", "seq": seq, "src": src, "dst": dst} for seq, (src, dst) in zip(seqs, batch)], sync=True)
+            done: List[Dict] = []
+            touched: List[str] = []
+            for seq, (src, dst) in zip(seqs, batch):
+                try:
+                    move_folder(src, dst, self._copied_callback(seq))
+                except Exception as e:
+                    # Recorded right away: a resume must never retry (or "clean up") a failed move
+                    self._write([{"op": "failed", "seq": seq, "error": str(e)}], sync=True)
+                    yield src, dst, e
+                    continue
+                done.append({"op": "done", "seq": seq})
+                touched.extend((os.path.dirname(src), os.path.dirname(dst)))
+                yield src, dst, None
+            _fsync_dirs(touched)
+            self._write(done, sync=True)
+
+    def resume(self) -> Iterator[Tuple[str, str, str, Optional[Exception]]]:
+        """Finish every journaled move without a done/failed record, yielding (src, dst, outcome, error).
+
+        outcome is "moved", "already" (it had completed before the crash), "cleaned" (only the
+        source removal was left) or "error".
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        pending, self._next_seq = self.read_pending(self.path)
+        copied = self.read_copied(self.path)
+        for start in range(0, len(pending), self.batch_size):
+            done: List[Dict] = []
+            touched: List[str] = []
+            for seq, src, dst in pending[start:start + self.batch_size]:
+                try:
+                    outcome = _finish_move(src, dst, seq in copied, self._copied_callback(seq))
+                except Exception as e:
+                    self._write([{"op": "failed", "seq": seq, "error": str(e)}], sync=True)
+                    yield src, dst, "error", e
+                    continue
+                done.append({"op": "done", "seq": seq})
+                touched.extend((os.path.dirname(src), os.path.dirname(dst)))
+                yield src, dst, outcome, None
+            _fsync_dirs(touched)
+            self._write(done, sync=True)
+
+    def close(self) -> None:
+        """Close the journal, deleting it when no planned move is left unfinished."""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self.path and os.path.exists(self.path) and not self.read_pending(self.path)[0]:
+            os.remove(self.path)
+
+
+def resume_moves(path: str, script: str) -> Dict[str, int]:
+    """Finish the journaled moves at path, printing each outcome; returns counts per outcome."""
+    counts: Dict[str, int] = {"moved": 0, "already": 0, "cleaned": 0, "error": 0}
+    if not os.path.exists(path):
+        print(f"Nothing to resume: no journal at {path}")
+        return counts
+    journal = MoveJournal(path, script)
+    print(f"Resuming moves from journal: {path}")
+    for src, dst, outcome, err in journal.resume():
+        counts[outcome] += 1
+        if err is not None:
+            print(f"  ERROR resuming '{src}' -> '{dst}': {err}")
+        else:
+            print(f"  RESUMED ({outcome}): '{src}' -> '{dst}'")
+    journal.close()
+    print(f"\nResume Summary:\n  Moved: {counts['moved']}\n  Already moved: {counts['already']}\n  Source cleaned up: {counts['cleaned']}\n  Errors: {counts['error']}")
+    return counts
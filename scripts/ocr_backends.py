@@ -0,0 +1,366 @@
+"""Pluggable OCR backends for update_names_from_ocr.py.
+
+ocr_image used to call pytesseract.image_to_string once per image, which spawns a
+tesseract process per pack shot; on small images process start-up and model loading
+dominate. Every backend here takes a batch of image paths and returns
+({path: text}, [(path, error)]). Engines that report confidences also fill
+backend.confidences[path]: the mean word confidence (0-100) of each non-empty text line,
+in the order the lines appear in the text.
+
+  tesseract        one pytesseract call (one tesseract process) per image; the old behavior
+  tesseract-batch  writes the batch to a list file and runs a single tesseract process over
+                   it (tesseract <list.txt> stdout tsv); the TSV carries a page number and
+                   a confidence for every word. A chunk whose page count does not match
+                   (an unreadable image) is retried image by image, so one bad file cannot
+                   shift texts onto the wrong images.
+  tesserocr        one long-lived Tesseract API (tesserocr) reused for every image
+  stub             deterministic canned text, no OCR engine needed: texts come from a
+                   fixtures JSON ({image path, file name or folder name: text or
+                   {"text": ..., "confidence": ...}}) or are synthesized from the image's
+                   folder name, with a confidence derived from the file name. Lets extract_name_brand and
+                   the whole update flow be tested and benchmarked anywhere.
+
+Every backend takes a preprocess profile (ocr_preprocess.py). With a profile other than
+"none" each image is downscaled, binarized, optionally deskewed and cropped to its text
+before OCR, and the per-image preprocessing report (timing per stage) is kept in
+backend.reports. The batch backend hands tesseract the preprocessed images as temporary
+PNGs; the stub still runs preprocessing so its cost can be measured without tesseract.
+
+Requirements (real OCR):
+  Tesseract OCR engine on PATH (winget install -e --id UB-Mannheim.Tesseract-OCR)
+  pip install pillow pytesseract      (tesseract backend)
+  pip install tesserocr               (tesserocr backend, optional)
+"""
+from __future__ import annotations
+import os
+import re
+import json
+import zlib
+import shutil
+import tempfile
+import subprocess
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ocr_preprocess import preprocess_image
+
+try:
+    from PIL import Image
+    import pytesseract
+except Exception:  # pragma: no cover - optional dependency notification
+    Image = None
+    pytesseract = None
+
+try:
+    import tesserocr
+except Exception:  # pragma: no cover - optional dependency notification
+    tesserocr = None
+
+OCR_BACKENDS = ("tesseract-batch", "tesseract", "tesserocr", "stub")
+DEFAULT_BATCH_SIZE = 64
+
+OcrResult = Tuple[Dict[str, str], List[Tuple[str, str]]]
+# (text, mean confidence per non-empty line, or None if the engine has none)
+OcrPage = Tuple[str, Optional[List[float]]]
+
+
+def pages_from_rows(rows: Iterable[Dict[str, str]]) -> List[OcrPage]:
+    """Rebuild (text, line confidences) per page from tesseract's TSV/data rows.
+
+    Level 1 rows open a page, level 5 rows are words; words are grouped into lines by
+    (block, paragraph, line) in reading order.
+    """
+    pages: List[Dict[Tuple[str, str, str], List[Tuple[str, float]]]] = []
+    for row in rows:
+        level = str(row.get("level"))
+        if level == "1":
+            pages.append({})
+        elif level == "5" and pages:
+            word = str(row.get("text") or "").strip()
+            if word:
+                key = (str(row.get("block_num")), str(row.get("par_num")), str(row.get("line_num")))
+                pages[-1].setdefault(key, []).append((word, max(0.0, float(row.get("conf") or 0))))
+    result: List[OcrPage] = []
+    for lines in pages:
+        texts = [" ".join(w for w, _ in words) for words in lines.values()]
+        confs = [round(sum(c for _, c in words) / len(words), 1) for words in lines.values()]
+        result.append(("\n".join(texts) + ("\n" if texts else ""), confs))
+    return result
+
+
+def parse_tsv(tsv: str) -> List[OcrPage]:
+    header: List[str] = []
+    rows: List[Dict[str, str]] = []
+    for line in tsv.splitlines():
+        if not line:
+            continue
+        if line.startswith("level\t"):
+            header = line.split("\t")
+            continue
+        if header:
+            rows.append(dict(zip(header, line.split("\t", len(header) - 1))))
+    return pages_from_rows(rows)
+
+
+class OcrBackend:
+    name = "base"
+
+    def __init__(self, preprocess: str = "none"):
+        self.preprocess = preprocess
+        self.reports: Dict[str, Dict] = {}
+        self.confidences: Dict[str, List[float]] = {}
+
+    def load_image(self, path: str):
+        """Preprocessed PIL image for path; records its preprocessing report."""
+        img, report = preprocess_image(path, self.preprocess)
+        self.reports[path] = report
+        return img
+
+    def recognize(self, paths: Sequence[str]) -> OcrResult:
+        """OCR every path; returns ({path: text}, [(path, error)])."""
+        texts: Dict[str, str] = {}
+        errors: List[Tuple[str, str]] = []
+        for path in paths:
+            try:
+                texts[path], confidences = self.recognize_one(path)
+            except Exception as e:
+                errors.append((path, str(e)))
+                continue
+            if confidences is not None:
+                self.confidences[path] = confidences
+        return texts, errors
+
+    def recognize_one(self, path: str) -> OcrPage:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class TesseractBackend(OcrBackend):
+    """One pytesseract call per image (grayscale first, as ocr_image always did)."""
+
+    name = "tesseract"
+
+    def __init__(self, config: str = "", preprocess: str = "none"):
+        if Image is None or pytesseract is None:
+            raise RuntimeError("pytesseract and pillow are required. See script header for install steps.")
+        super().__init__(preprocess)
+        self.config = config
+
+    def recognize_one(self, path: str) -> OcrPage:
+        data = pytesseract.image_to_data(self.load_image(path), config=self.config, output_type=pytesseract.Output.DICT)
+        keys = list(data)
+        rows = [dict(zip(keys, values)) for values in zip(*(data[k] for k in keys))]
+        pages = pages_from_rows(rows)
+        return pages[0] if pages else ("", [])
+
+
+def tesseract_command() -> str:
+    cmd = getattr(getattr(pytesseract, "pytesseract", None), "tesseract_cmd", None) if pytesseract else None
+    if cmd and (os.path.isfile(cmd) or shutil.which(cmd)):
+        return cmd
+    found = shutil.which("tesseract")
+    if not found:
+        raise RuntimeError("tesseract executable not found on PATH. See script header for install steps.")
+    return found
+
+
+class BatchTesseractBackend(OcrBackend):
+    """A single tesseract process per chunk of images, fed through a list file."""
+
+    name = "tesseract-batch"
+
+    def __init__(self, config: str = "", batch_size: int = DEFAULT_BATCH_SIZE, preprocess: str = "none"):
+        super().__init__(preprocess)
+        self.command = tesseract_command()
+        self.config = config.split() if config else []
+        self.batch_size = max(1, batch_size)
+
+    def _run(self, target: str) -> str:
+        proc = subprocess.run([self.command, target, "stdout", *self.config, "tsv"], capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip() or f"tesseract exited with {proc.returncode}")
+        return proc.stdout.decode("utf-8", "replace")
+
+    def _target(self, path: str, tmp_dir: str, index: int) -> str:
+        """File tesseract should read for path: the image itself, or its preprocessed PNG."""
+        if self.preprocess == "none":
+            return os.path.abspath(path)
+        target = os.path.join(tmp_dir, f"{index:05d}.png")
+        self.load_image(path).save(target)
+        return target
+
+    def _run_one(self, target: str) -> OcrPage:
+        pages = parse_tsv(self._run(target))
+        return pages[0] if pages else ("", [])
+
+    def recognize_one(self, path: str) -> OcrPage:
+        with tempfile.TemporaryDirectory(prefix="ocr-") as tmp_dir:
+            return self._run_one(self._target(path, tmp_dir, 0))
+
+    def recognize(self, paths: Sequence[str]) -> OcrResult:
+        texts: Dict[str, str] = {}
+        errors: List[Tuple[str, str]] = []
+        for start in range(0, len(paths), self.batch_size):
+            with tempfile.TemporaryDirectory(prefix="ocr-batch-") as tmp_dir:
+                chunk: List[str] = []
+                targets: List[str] = []
+                for i, path in enumerate(paths[start:start + self.batch_size]):
+                    try:
+                        targets.append(self._target(path, tmp_dir, i))
+                        chunk.append(path)
+                    except Exception as e:
+                        errors.append((path, str(e)))
+                if not chunk:
+                    continue
+                list_path = os.path.join(tmp_dir, "list.txt")
+                with open(list_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(targets) + "\n")
+                try:
+                    pages = parse_tsv(self._run(list_path))
+                except Exception:
+                    pages = []
+                if len(pages) != len(chunk):
+                    # Some image failed inside the batch; pages can no longer be attributed safely
+                    pages = []
+                    for path, target in zip(chunk, targets):
+                        try:
+                            pages.append(self._run_one(target))
+                        except Exception as e:
+                            errors.append((path, str(e)))
+                            pages.append(None)
+                for path, page in zip(chunk, pages):
+                    if page is not None:
+                        texts[path], self.confidences[path] = page
+        return texts, errors
+
+
+def tesserocr_variables(config: str) -> List[Tuple[str, str]]:
+    """Parse the "-c key=value" pairs of a tesseract config string (glued "-ckey=value" too).
+
+    The API instance can only apply variables, so any other option (e.g. --psm 6) raises
+    ValueError rather than being silently ignored.
+    """
+    tokens = (config or "").split()
+    out: List[Tuple[str, str]] = []
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok == "-c" and i + 1 < len(tokens):
+            i += 1
+            pair = tokens[i]
+        elif tok.startswith("-c") and tok != "-c":
+            pair = tok.removeprefix("-c")
+        else:
+            raise ValueError(f"Unsupported option for the tesserocr backend: {tok} (only -c key=value)")
+        key, sep, value = pair.partition("=")
+        if not sep or not key:
+            raise ValueError(f"Expected key=value after -c, got: {pair}")
+        out.append((key, value))
+        i += 1
+    return out
+
+
+class TesserocrBackend(OcrBackend):
+    """One long-lived Tesseract API instance reused for every image."""
+
+    name = "tesserocr"
+
+    def __init__(self, config: str = "", preprocess: str = "none"):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is required for the tesserocr backend. See script header for install steps.")
+        super().__init__(preprocess)
+        variables = tesserocr_variables(config)
+        self.api = tesserocr.PyTessBaseAPI()
+        for key, value in variables:
+            if not self.api.SetVariable(key, value):
+                self.api.End()
+                raise ValueError(f"Unknown tesseract variable for the tesserocr backend: {key}")
+
+    def recognize_one(self, path: str) -> OcrPage:
+        if self.preprocess == "none":
+            self.api.SetImageFile(path)
+        else:
+            self.api.SetImage(self.load_image(path))
+        self.api.Recognize()
+        level = tesserocr.RIL.TEXTLINE
+        lines: List[str] = []
+        confidences: List[float] = []
+        for item in tesserocr.iterate_level(self.api.GetIterator(), level):
+            line = (item.GetUTF8Text(level) or "").strip()
+            if line:
+                lines.append(line)
+                confidences.append(round(item.Confidence(level), 1))
+        return "\n".join(lines) + ("\n" if lines else ""), confidences
+
+    def close(self) -> None:
+        self.api.End()
+
+
+FORM_BY_WORD = (("inj", "Injection"), ("capsule", "Capsules"), ("cap", "Capsules"), ("gel", "Gel"), ("cream", "Cream"), ("syrup", "Syrup"))
+STUB_MANUFACTURERS = ("Cipla Ltd", "Sun Pharma", "Intas", "Zydus", "Glenmark", "Lupin")
+STRENGTH_RE = re.compile(r"\d*(?:mg|ml|g)?", re.IGNORECASE)
+
+
+class StubBackend(OcrBackend):
+    """Deterministic canned OCR text; no engine or image decoding involved."""
+
+    name = "stub"
+
+    def __init__(self, fixtures: Optional[Dict] = None, preprocess: str = "none"):
+        super().__init__(preprocess)
+        self.fixtures = fixtures or {}
+
+    @classmethod
+    def from_file(cls, path: Optional[str], preprocess: str = "none") -> "StubBackend":
+        if not path:
+            return cls(preprocess=preprocess)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), preprocess)
+
+    def recognize_one(self, path: str) -> OcrPage:
+        if self.preprocess != "none":
+            # Preprocessing cost is real even when the OCR text is canned
+            self.load_image(path)
+        folder = os.path.basename(os.path.dirname(path))
+        name = os.path.basename(path)
+        # Same image name, same confidence: 40..99, so thresholds exercise the early exit
+        confidence = float(40 + zlib.crc32(name.encode("utf-8")) % 60)
+        text = None
+        for key in (path, path.replace(os.sep, "/"), name, folder):
+            if key in self.fixtures:
+                text = self.fixtures[key]
+                break
+        if isinstance(text, dict):
+            confidence = float(text.get("confidence", confidence))
+            text = text.get("text", "")
+        if text is None:
+            text = synthesize_text(folder)
+        lines = [ln for ln in text.splitlines() if ln.strip()]
+        return text, [confidence] * len(lines)
+
+
+def synthesize_text(folder: str) -> str:
+    """Pack-shot-like text from a folder slug: maker line, name + strength + form, noise."""
+    words = [w for w in re.split(r"[^A-Za-z0-9]+", folder) if w]
+    strength = next((w for w in words if w[0].isdigit() and STRENGTH_RE.fullmatch(w)), "")
+    if strength.isdigit():
+        strength += " mg"
+    form_keys = tuple(key for key, _ in FORM_BY_WORD) + ("tab",)
+    name = " ".join(w.upper() for w in words if not STRENGTH_RE.fullmatch(w) and not w.lower().startswith(form_keys))
+    form = next((f for key, f in FORM_BY_WORD if any(w.lower().startswith(key) for w in words)), "Tablets")
+    maker = STUB_MANUFACTURERS[sum(map(ord, folder)) % len(STUB_MANUFACTURERS)]
+    return "\n".join(["Rx only", maker, " ".join(filter(None, [name, strength, form])), "10 x 10", "Store below 30°C"]) + "\n"
+
+
+def get_backend(name: str, config: str = "", batch_size: int = DEFAULT_BATCH_SIZE, fixtures: Optional[str] = None,
+                preprocess: str = "none") -> OcrBackend:
+    if name == "tesseract":
+        return TesseractBackend(config, preprocess)
+    if name == "tesseract-batch":
+        return BatchTesseractBackend(config, batch_size, preprocess)
+    if name == "tesserocr":
+        return TesserocrBackend(config, preprocess)
+    if name == "stub":
+        return StubBackend.from_file(fixtures, preprocess)
+    raise ValueError(f"Unknown OCR backend: {name}")
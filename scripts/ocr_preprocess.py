@@ -0,0 +1,384 @@
+"""Image preprocessing before OCR, with per-image timing.
+
+ocr_image only converted pack shots to grayscale, so tesseract spent most of its time on
+full-resolution background. This module turns an image into a small, clean, binary text
+image with vectorized NumPy stages:
+
+  load       decode (JPEG draft mode) at no more than max_side pixels, grayscale
+  threshold  adaptive mean threshold: a pixel is ink when darker than its local mean
+             (separable running-sum box filter) minus an offset
+  deskew     the rotation whose row projection of ink pixels is sharpest, searched over
+             all candidate angles at once
+  crop       edge density per tile; keep the bounding box of dense (text-like) tiles and
+             blank sparse tiles far from any dense one
+  scale      resize so the median text line height is about text_height pixels
+
+Profiles pick the stages and their settings:
+
+  none      grayscale only (the old ocr_image behavior)
+  fast      downscale + threshold
+  balanced  downscale + threshold + crop + text-height scaling
+  accurate  larger working size, deskew as well, taller target text
+
+Every call returns a report with milliseconds per stage, the deskew angle, the crop box
+and the final size. Run this script to compare profiles on the catalog (timing only, or
+timing plus OCR accuracy with --ocr-backend):
+
+Requirements:
+  pip install pillow numpy
+
+Usage (PowerShell):
+  py .\\scripts\\ocr_preprocess.py --root "s:\\MedCare" --limit 100
+  py .\\scripts\\ocr_preprocess.py --root "s:\\MedCare" --profile none --profile balanced --ocr-backend tesseract-batch --report "s:\\MedCare\\ocr-profiles.json"
+  py .\\scripts\\ocr_preprocess.py --root "s:\\MedCare" --profile accurate --limit 20 --save-dir "s:\\MedCare\\ocr-preview"
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    from PIL import Image
+except Exception:  # pragma: no cover - optional dependency notification
+    np = None
+    Image = None
+
+PROFILES: Dict[str, Dict] = {
+    "none": {"max_side": 0, "threshold": False, "deskew": False, "crop": False, "text_height": 0},
+    "fast": {"max_side": 1600, "threshold": True, "deskew": False, "crop": False, "text_height": 0},
+    "balanced": {"max_side": 1600, "threshold": True, "deskew": False, "crop": True, "text_height": 32},
+    "accurate": {"max_side": 2400, "threshold": True, "deskew": True, "crop": True, "text_height": 40},
+}
+THRESHOLD_OFFSET = 12
+EDGE_THRESHOLD = 40
+TILE = 32
+KEEP_MARGIN_TILES = 2
+MAX_SKEW_DEGREES = 10.0
+SKEW_STEP_DEGREES = 0.5
+MIN_SCALE = 0.25
+MAX_SCALE = 2.0
+DENSITY_SIZE = 256
+
+
+def _require_deps() -> None:
+    if np is None or Image is None:
+        raise RuntimeError("pillow and numpy are required for OCR preprocessing. See script header for install steps.")
+
+
+def load_gray(path: str, max_side: int = 0):
+    """Decode as grayscale, using JPEG draft mode and a reduce when max_side is set."""
+    with Image.open(path) as img:
+        if max_side:
+            img.draft("L", (max_side, max_side))
+        gray = img.convert("L")
+    if max_side and max(gray.size) > max_side:
+        gray.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    return gray
+
+
+def box_mean(a, radius: int):
+    """Mean over a (2*radius+1)^2 window at every pixel, clipped at the borders.
+
+    Separable running sums: a cumulative sum down the rows, then across the columns, each
+    read back with two shifted slices. The sums are float64 so large images stay exact.
+    """
+    h, w = a.shape
+    k = 2 * radius + 1
+    # Cumulative sums shifted by radius+1, flat past the last row/column (= zero padding)
+    c = np.zeros((h + k, w), dtype=np.float64)
+    np.cumsum(a, axis=0, out=c[radius + 1:h + radius + 1])
+    c[h + radius + 1:] = c[h + radius]
+    rows = c[k:] - c[:h]
+    c = np.zeros((h, w + k), dtype=np.float64)
+    np.cumsum(rows, axis=1, out=c[:, radius + 1:w + radius + 1])
+    c[:, w + radius + 1:] = c[:, w + radius:w + radius + 1]
+    total = c[:, k:] - c[:, :w]
+    ny = np.minimum(np.arange(h) + radius + 1, h) - np.maximum(np.arange(h) - radius, 0)
+    nx = np.minimum(np.arange(w) + radius + 1, w) - np.maximum(np.arange(w) - radius, 0)
+    total /= ny[:, None] * nx[None, :]
+    return total
+
+
+def adaptive_threshold(gray, offset: int = THRESHOLD_OFFSET):
+    """Boolean ink mask: darker than the local mean by more than offset."""
+    radius = max(7, min(gray.shape) // 40)
+    return gray < box_mean(gray, radius) - offset
+
+
+def skew_angle(ink, max_degrees: float = MAX_SKEW_DEGREES, step: float = SKEW_STEP_DEGREES, samples: int = 20000) -> float:
+    """Skew of the text (degrees, counter-clockwise) found by making ink rows sharpest; 0.0 if there is too little ink."""
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 100:
+        return 0.0
+    stride = max(1, len(ys) // samples)
+    ys = ys[::stride].astype(np.float64)
+    xs = xs[::stride].astype(np.float64)
+    angles = np.arange(-max_degrees, max_degrees + step / 2, step)
+    rad = np.deg2rad(angles)[:, None]
+    rows = ys[None, :] * np.cos(rad) + xs[None, :] * np.sin(rad)
+    rows = np.floor(rows - rows.min(axis=1, keepdims=True)).astype(np.int64)
+    nbins = int(rows.max()) + 1
+    # One bincount for all angles: offset each angle's rows into its own range
+    counts = np.bincount((rows + np.arange(len(angles))[:, None] * nbins).ravel(), minlength=len(angles) * nbins)
+    scores = (counts.reshape(len(angles), nbins).astype(np.float64) ** 2).sum(axis=1)
+    return float(angles[int(np.argmax(scores))])
+
+
+def text_box(gray, ink, tile: int = TILE, edge_threshold: int = EDGE_THRESHOLD) -> Tuple[Tuple[int, int, int, int], object]:
+    """Bounding box (left, top, right, bottom) of edge-dense tiles, and the tile keep-mask."""
+    h, w = gray.shape
+    edges = np.zeros((h, w), dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(gray, axis=1)) > edge_threshold
+    edges[1:, :] |= np.abs(np.diff(gray, axis=0)) > edge_threshold
+    th, tw = max(1, h // tile), max(1, w // tile)
+    density = edges[:th * tile, :tw * tile].reshape(th, tile, tw, tile).mean(axis=(1, 3))
+    dense = density >= max(0.02, density.max() * 0.15)
+    dense &= ink[:th * tile, :tw * tile].reshape(th, tile, tw, tile).any(axis=(1, 3))
+    if not dense.any():
+        return (0, 0, w, h), None
+    # Keep dense tiles plus a margin of neighbours: large glyphs have sparse interiors
+    # (3x3 dilation per step, done separably)
+    keep = dense
+    for _ in range(KEEP_MARGIN_TILES):
+        grown = keep.copy()
+        grown[1:, :] |= keep[:-1, :]
+        grown[:-1, :] |= keep[1:, :]
+        rows_kept = grown.copy()
+        grown[:, 1:] |= rows_kept[:, :-1]
+        grown[:, :-1] |= rows_kept[:, 1:]
+        keep = grown
+    rows = np.nonzero(keep.any(axis=1))[0]
+    cols = np.nonzero(keep.any(axis=0))[0]
+    top, bottom = rows[0] * tile, min(h, (rows[-1] + 1) * tile)
+    left, right = cols[0] * tile, min(w, (cols[-1] + 1) * tile)
+    if bottom == th * tile:
+        bottom = h
+    if right == tw * tile:
+        right = w
+    return (int(left), int(top), int(right), int(bottom)), keep
+
+
+def line_height(ink) -> float:
+    """Median height of runs of ink-bearing rows (text lines); 0.0 if none are found.
+
+    Runs taller than a quarter of the image are blocks of merged lines, not text lines,
+    and are ignored.
+    """
+    profile = ink.mean(axis=1)
+    if not profile.any():
+        return 0.0
+    rows = profile > max(0.01, profile.max() * 0.1)
+    edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+    runs = np.nonzero(edges == -1)[0] - np.nonzero(edges == 1)[0]
+    runs = runs[(runs >= 3) & (runs <= len(rows) // 4)]
+    return float(np.median(runs)) if len(runs) else 0.0
+
+
+def text_density(path: str, size: int = DENSITY_SIZE) -> float:
+    """Cheap text-likelihood score for ordering an entry's images: the fraction of strong
+    edges in a small draft-mode thumbnail. Busy packaging scores high, plain pills low."""
+    _require_deps()
+    gray = np.asarray(load_gray(path, size), dtype=np.int16)
+    if min(gray.shape) < 2:
+        return 0.0
+    edges = (np.abs(np.diff(gray, axis=1))[:-1, :] > EDGE_THRESHOLD) | (np.abs(np.diff(gray, axis=0))[:, :-1] > EDGE_THRESHOLD)
+    return float(edges.mean())
+
+
+def preprocess_image(path: str, profile: str = "none"):
+    """Return (PIL image ready for OCR, report dict with per-stage milliseconds)."""
+    settings = PROFILES[profile]
+    timings: Dict[str, float] = {}
+    report: Dict = {"profile": profile, "ms": timings}
+    start = mark = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = round((now - mark) * 1000, 2)
+        mark = now
+
+    if Image is None:
+        _require_deps()
+    gray_img = load_gray(path, settings["max_side"])
+    lap("load")
+    if not settings["threshold"]:
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+        report["size"] = list(gray_img.size)
+        return gray_img, report
+
+    _require_deps()
+    gray = np.asarray(gray_img, dtype=np.float32)
+    ink = adaptive_threshold(gray)
+    lap("threshold")
+
+    if settings["deskew"]:
+        angle = skew_angle(ink)
+        report["angle"] = angle
+        if abs(angle) >= SKEW_STEP_DEGREES / 2:
+            rotated = Image.fromarray(gray.astype(np.uint8)).rotate(-angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+            gray = np.asarray(rotated, dtype=np.float32)
+            ink = adaptive_threshold(gray)
+        lap("deskew")
+
+    if settings["crop"]:
+        (left, top, right, bottom), keep = text_box(gray, ink)
+        if keep is not None:
+            mask = np.repeat(np.repeat(keep, TILE, axis=0), TILE, axis=1)
+            sparse = np.zeros(ink.shape, dtype=bool)
+            sparse[:mask.shape[0], :mask.shape[1]] = ~mask
+            ink = ink & ~sparse
+        ink = ink[top:bottom, left:right]
+        report["crop"] = [left, top, right, bottom]
+        lap("crop")
+
+    out = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+    if settings["text_height"]:
+        height = line_height(ink)
+        scale = min(MAX_SCALE, max(MIN_SCALE, settings["text_height"] / height)) if height else 1.0
+        report["scale"] = round(scale, 3)
+        if abs(scale - 1.0) > 0.05:
+            size = (max(1, round(out.width * scale)), max(1, round(out.height * scale)))
+            out = out.resize(size, Image.BILINEAR).point(lambda v: 255 if v > 127 else 0)
+        lap("scale")
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+    report["size"] = list(out.size)
+    return out, report
+
+
+def summarize_reports(reports: List[Dict]) -> Dict:
+    """Mean per stage plus p50/p95 of the total, in milliseconds."""
+    if not reports:
+        return {"images": 0}
+    stages: Dict[str, List[float]] = {}
+    for rep in reports:
+        for stage, ms in rep["ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    totals = sorted(stages.get("total", []))
+    pixels = [rep["size"][0] * rep["size"][1] for rep in reports if rep.get("size")]
+    return {
+        "images": len(reports),
+        "mean_ms": {stage: round(sum(v) / len(v), 2) for stage, v in stages.items()},
+        "p50_ms": totals[len(totals) // 2] if totals else 0.0,
+        "p95_ms": totals[min(len(totals) - 1, int(len(totals) * 0.95))] if totals else 0.0,
+        "mean_megapixels": round(sum(pixels) / len(pixels) / 1e6, 3) if pixels else 0.0,
+    }
+
+
+def print_timing_summary(profile: str, summary: Dict) -> None:
+    if not summary.get("images"):
+        return
+    stages = ", ".join(f"{stage} {ms:.1f}" for stage, ms in summary["mean_ms"].items() if stage != "total")
+    print(f"Preprocess ({profile}): {summary['images']} images, mean {summary['mean_ms']['total']:.1f} ms "
+          f"(p50 {summary['p50_ms']:.1f}, p95 {summary['p95_ms']:.1f}), {summary['mean_megapixels']:.2f} MP out")
+    print(f"  per stage (mean ms): {stages}")
+
+
+def catalog_images(root: str, json_path: str, limit: int = 0) -> List[Tuple[Dict, str]]:
+    """(entry, first image path) for catalog entries whose image exists under root/public or root."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    found: List[Tuple[Dict, str]] = []
+    for item in data[:limit] if limit else data:
+        images = item.get("images") or ([item.get("image")] if item.get("image") else [])
+        if not images:
+            continue
+        rel = images[0].lstrip("/").replace("/", os.sep)
+        for candidate in (os.path.join(root, "public", rel), os.path.join(root, rel)):
+            if os.path.exists(candidate):
+                found.append((item, candidate))
+                break
+    return found
+
+
+def name_agrees(extracted: Optional[str], current: Optional[str]) -> bool:
+    """Accuracy proxy: the extracted name starts with the catalog name's first word."""
+    if not extracted or not current:
+        return False
+    first = current.split()[0].lower()
+    return extracted.lower().split()[0] == first if extracted.split() else False
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare OCR preprocessing profiles: per-stage timing and, optionally, OCR accuracy.")
+    ap.add_argument("--root", required=True, help="Project root path. Used to resolve /medicines paths.")
+    ap.add_argument("--json", default=os.path.join("src", "data", "medicines.json"), help="Path to medicines.json")
+    ap.add_argument("--profile", action="append", choices=sorted(PROFILES), help="Profile to measure (repeatable; default: all)")
+    ap.add_argument("--limit", type=int, default=0, help="Limit number of entries (0=all)")
+    ap.add_argument("--ocr-backend", help="Also OCR each profile's output with this backend (see ocr_backends.py) and score the names")
+    ap.add_argument("--save-dir", help="Write each profile's preprocessed images here for inspection")
+    ap.add_argument("--report", help="Write per-image reports and summaries to this JSON file")
+    args = ap.parse_args()
+
+    try:
+        _require_deps()
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return
+
+    entries = catalog_images(args.root, args.json, args.limit)
+    if not entries:
+        print("ERROR: No catalog images found")
+        return
+    print(f"Images: {len(entries)}")
+    profiles = args.profile or list(PROFILES)
+    results: Dict[str, Dict] = {}
+
+    for profile in profiles:
+        reports: List[Dict] = []
+        errors = 0
+        for item, path in entries:
+            try:
+                img, rep = preprocess_image(path, profile)
+            except Exception as e:
+                print(f"[error] {profile} {item.get('id')}: {e}")
+                errors += 1
+                continue
+            rep["id"] = item.get("id")
+            reports.append(rep)
+            if args.save_dir:
+                out_dir = os.path.join(args.save_dir, profile)
+                os.makedirs(out_dir, exist_ok=True)
+                img.save(os.path.join(out_dir, f"{item.get('id')}.png"))
+        summary = summarize_reports(reports)
+        summary["errors"] = errors
+        print_timing_summary(profile, summary)
+
+        if args.ocr_backend:
+            # Imported here: ocr_backends imports this module
+            from ocr_backends import get_backend
+            from update_names_from_ocr import extract_name_brand
+            backend = get_backend(args.ocr_backend, preprocess=profile)
+            start = time.perf_counter()
+            try:
+                texts, ocr_errors = backend.recognize([path for _, path in entries])
+            finally:
+                backend.close()
+            ocr_seconds = time.perf_counter() - start
+            detected = agreed = 0
+            by_id = {rep["id"]: rep for rep in reports}
+            for item, path in entries:
+                name, _ = extract_name_brand(texts.get(path, ""))
+                detected += bool(name)
+                agreed += name_agrees(name, item.get("name"))
+                if item.get("id") in by_id:
+                    by_id[item.get("id")]["ocr_name"] = name
+            summary["ocr"] = {"backend": backend.name, "seconds": round(ocr_seconds, 2), "failed": len(ocr_errors),
+                              "names_detected": detected, "names_agreeing": agreed}
+            print(f"  OCR ({backend.name}): {ocr_seconds:.2f}s, {detected}/{len(entries)} names detected, "
+                  f"{agreed} agree with the catalog name, {len(ocr_errors)} failed")
+        results[profile] = {"summary": summary, "images": reports}
+
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Wrote report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
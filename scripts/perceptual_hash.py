@@ -0,0 +1,289 @@
+"""Near-duplicate image detection with perceptual hashes.
+
+Many medicine folders hold the same pack shot re-encoded or resized, which SHA-256 (the
+content store, merge dedupe) cannot see. This stage computes two 64-bit perceptual hashes
+per image in a process pool:
+
+  pHash  32x32 grayscale -> 2-D DCT -> 8x8 lowest frequencies compared to their median
+  dHash  9x8 grayscale -> each pixel compared to its right neighbour
+
+Two images are near-duplicates when both Hamming distances are within their thresholds
+(requiring both keeps false positives down). Neighbours are found by XOR-ing each block of
+hashes against all others as uint64 arrays and counting bits in NumPy, so there is no
+Python loop over pairs. Pairs are then grouped into clusters (union-find) and reported:
+
+  within_medicine   images in one folder that look alike (prune all but "keep")
+  across_medicines  folders sharing a pack shot (candidates to merge before publishing)
+
+Hashes are cached by path, size and mtime (--cache), so reruns only decode new or
+changed images.
+
+Note: public/medicines* holds copies of medicines/ images, so scanning both roots together
+pairs every published image with its source; scan them separately.
+
+Requirements:
+  pip install pillow numpy
+
+Usage (PowerShell):
+  py .\\scripts\\perceptual_hash.py --root "s:\\MedCare\\medicines" --report "s:\\MedCare\\near-duplicates.json"
+  py .\\scripts\\perceptual_hash.py --root "s:\\MedCare\\public\\medicines" --root "s:\\MedCare\\public\\medicines_web2" --threshold 4
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    from PIL import Image
+except Exception:  # pragma: no cover - optional dependency notification
+    np = None
+    Image = None
+
+from medicine_tree import is_image_name
+
+HASH_VERSION = 1
+DEFAULT_PHASH_THRESHOLD = 6
+DEFAULT_DHASH_THRESHOLD = 10
+BLOCK_ROWS = 512
+
+
+def _require_deps() -> None:
+    if np is None or Image is None:
+        raise RuntimeError("pillow and numpy are required for perceptual hashing. See script header for install steps.")
+
+
+def _dct_matrix(n: int):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+def _bits_to_int(bits) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def image_hashes(path: str) -> Tuple[int, int]:
+    """Return (pHash, dHash) of one image. Runs in a worker process."""
+    with Image.open(path) as img:
+        # JPEG draft mode decodes at 1/2..1/8 scale, which is all a 32x32 hash needs
+        img.draft("L", (64, 64))
+        gray = img.convert("L")
+        small = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+        tiny = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    dct = _dct_matrix(32)
+    low = (dct @ small @ dct.T)[:8, :8]
+    phash = _bits_to_int(low > np.median(low))
+    dhash = _bits_to_int(tiny[:, 1:] > tiny[:, :-1])
+    return phash, dhash
+
+
+def _hash_job(path: str) -> Tuple[str, Optional[Tuple[int, int]], Optional[str]]:
+    try:
+        return path, image_hashes(path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def collect_images(roots: Sequence[str]) -> List[Tuple[str, str]]:
+    """Return (image path, medicine key) for every image under roots; the key is the folder relative to its root."""
+    images: List[Tuple[str, str]] = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            rel = os.path.relpath(dirpath, root).replace(os.sep, "/")
+            key = f"{os.path.basename(os.path.abspath(root))}/{rel}" if rel != "." else os.path.basename(os.path.abspath(root))
+            for name in sorted(filenames):
+                if is_image_name(name):
+                    images.append((os.path.join(dirpath, name), key))
+    return images
+
+
+def load_cache(path: Optional[str]) -> Dict[str, List]:
+    if not path or not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    if not isinstance(data, dict) or data.get("version") != HASH_VERSION:
+        return {}
+    return data.get("files") or {}
+
+
+def save_cache(path: str, files: Dict[str, List]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": HASH_VERSION, "files": files}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def hash_images(paths: Sequence[str], cache: Optional[Dict[str, List]] = None, workers: Optional[int] = None) -> Tuple[Dict[str, Tuple[int, int]], List[Tuple[str, str]], int]:
+    """Hash every image, reusing cache entries whose size and mtime match.
+
+    Returns ({path: (phash, dhash)}, [(path, error)], number reused). cache is updated in place.
+    """
+    _require_deps()
+    cache = cache if cache is not None else {}
+    results: Dict[str, Tuple[int, int]] = {}
+    errors: List[Tuple[str, str]] = []
+    stats: Dict[str, Tuple[int, int]] = {}
+    todo: List[str] = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            errors.append((path, str(e)))
+            continue
+        stats[path] = (st.st_size, st.st_mtime_ns)
+        cached = cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            results[path] = (int(cached[2], 16), int(cached[3], 16))
+        else:
+            todo.append(path)
+    reused = len(results)
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            for path, hashes, err in pool.map(_hash_job, todo, chunksize=16):
+                if err is not None:
+                    errors.append((path, err))
+                    continue
+                results[path] = hashes
+                size, mtime_ns = stats[path]
+                cache[path] = [size, mtime_ns, f"{hashes[0]:016x}", f"{hashes[1]:016x}"]
+    return results, errors, reused
+
+
+def _popcount(x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    # NumPy < 2.0: count set bits per byte through a lookup table
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[x.view(np.uint8).reshape(x.shape + (8,))].sum(axis=-1)
+
+
+def near_pairs(phashes: Sequence[int], dhashes: Sequence[int], phash_threshold: int = DEFAULT_PHASH_THRESHOLD, dhash_threshold: int = DEFAULT_DHASH_THRESHOLD, block_rows: int = BLOCK_ROWS) -> List[Tuple[int, int, int, int]]:
+    """Return (i, j, phash distance, dhash distance) for every i < j within both thresholds.
+
+    Each block of rows is XOR-ed against all later hashes at once, so memory stays at
+    block_rows x n and no Python code runs per pair.
+    """
+    _require_deps()
+    ph = np.array(phashes, dtype=np.uint64)
+    dh = np.array(dhashes, dtype=np.uint64)
+    n = len(ph)
+    pairs: List[Tuple[int, int, int, int]] = []
+    for start in range(0, n, block_rows):
+        stop = min(n, start + block_rows)
+        pd = _popcount(ph[start:stop, None] ^ ph[None, :])
+        dd = _popcount(dh[start:stop, None] ^ dh[None, :])
+        rows, cols = np.nonzero((pd <= phash_threshold) & (dd <= dhash_threshold))
+        keep = cols > rows + start
+        for r, c in zip(rows[keep].tolist(), cols[keep].tolist()):
+            pairs.append((r + start, c, int(pd[r, c]), int(dd[r, c])))
+    return pairs
+
+
+def clusters_from_pairs(n: int, pairs: Sequence[Tuple[int, int, int, int]]) -> List[List[int]]:
+    """Group indices connected by pairs (union-find); returns clusters of two or more, sorted."""
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j, _, _ in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return sorted((g for g in groups.values() if len(g) > 1), key=lambda g: g[0])
+
+
+def build_report(images: Sequence[Tuple[str, str]], hashes: Dict[str, Tuple[int, int]], phash_threshold: int = DEFAULT_PHASH_THRESHOLD, dhash_threshold: int = DEFAULT_DHASH_THRESHOLD) -> Dict:
+    """Find near-duplicate clusters and split them into within- and across-medicine groups."""
+    hashed = [(path, key) for path, key in images if path in hashes]
+    pairs = near_pairs([hashes[p][0] for p, _ in hashed], [hashes[p][1] for p, _ in hashed], phash_threshold, dhash_threshold)
+    within: List[Dict] = []
+    across: List[Dict] = []
+    for cluster in clusters_from_pairs(len(hashed), pairs):
+        members = []
+        for i in cluster:
+            path, key = hashed[i]
+            members.append({"path": path, "medicine": key, "bytes": os.path.getsize(path), "phash": f"{hashes[path][0]:016x}", "dhash": f"{hashes[path][1]:016x}"})
+        medicines = sorted({m["medicine"] for m in members})
+        if len(medicines) == 1:
+            # Keep the largest file (usually the highest resolution); the rest can be pruned
+            keep = max(members, key=lambda m: m["bytes"])
+            within.append({"medicine": medicines[0], "keep": keep["path"], "prune": [m["path"] for m in members if m is not keep], "images": members})
+        else:
+            across.append({"medicines": medicines, "images": members})
+    return {
+        "version": HASH_VERSION,
+        "images": len(hashed),
+        "thresholds": {"phash": phash_threshold, "dhash": dhash_threshold},
+        "pairs": len(pairs),
+        "within_medicine": within,
+        "across_medicines": across,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Find near-duplicate medicine images with perceptual hashes.")
+    parser.add_argument("--root", action="append", dest="roots", help="Image tree to scan (repeatable; default: ./medicines)")
+    parser.add_argument("--report", default=None, help="Write clusters as JSON")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_PHASH_THRESHOLD, help="Maximum pHash Hamming distance (of 64 bits)")
+    parser.add_argument("--dhash-threshold", type=int, default=DEFAULT_DHASH_THRESHOLD, help="Maximum dHash Hamming distance (of 64 bits)")
+    parser.add_argument("--cache", default=None, help="Hash cache path (default: <first root>.phash-cache.json beside it)")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = CPU count)")
+    args = parser.parse_args()
+    _require_deps()
+
+    roots = args.roots or [os.path.join(os.getcwd(), "medicines")]
+    for root in roots:
+        if not os.path.isdir(root):
+            print(f"ERROR: Image directory not found: {root}")
+            return
+    cache_path = args.cache or f"{os.path.abspath(roots[0]).rstrip(os.sep)}.phash-cache.json"
+
+    images = collect_images(roots)
+    cache = load_cache(cache_path)
+    started = time.perf_counter()
+    hashes, errors, reused = hash_images([p for p, _ in images], cache, args.workers or None)
+    hashed_in = time.perf_counter() - started
+    save_cache(cache_path, cache)
+    for path, err in errors:
+        print(f"  ERROR hashing '{path}': {err}")
+
+    started = time.perf_counter()
+    report = build_report(images, hashes, args.threshold, args.dhash_threshold)
+    matched_in = time.perf_counter() - started
+
+    for group in report["across_medicines"]:
+        print(f"ACROSS: {', '.join(group['medicines'])} ({len(group['images'])} images)")
+    for group in report["within_medicine"]:
+        print(f"WITHIN: {group['medicine']} keep {os.path.basename(group['keep'])}, prune {', '.join(os.path.basename(p) for p in group['prune'])}")
+
+    print("\nSummary:")
+    print(f"  Images: {len(images)} ({reused} hashes reused from cache) hashed in {hashed_in:.2f}s")
+    print(f"  Near-duplicate pairs: {report['pairs']} (pHash <= {args.threshold}, dHash <= {args.dhash_threshold}) found in {matched_in * 1000:.1f} ms")
+    print(f"  Clusters within one medicine: {len(report['within_medicine'])} ({sum(len(g['prune']) for g in report['within_medicine'])} images prunable)")
+    print(f"  Clusters across medicines: {len(report['across_medicines'])}")
+    print(f"  Errors: {len(errors)}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"  Wrote: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Plan/apply support for the tree-mutating scripts.
+
+--dry-run computes every decision and throws it away; the real run then rescans and
+recomputes. With --plan-out the scripts instead serialize the operations they would
+perform and exit without touching anything:
+
+  {
+    "version": 1,
+    "script": "merge_medicines.py",
+    "created": 1734950000.0,
+    "watch": {"<path>": <mtime_ns>, ...},    directories (and files) the plan was computed from
+    "options": {...},                          script-specific settings needed to apply
+    "operations": [
+      {"op": "move", "src": "...", "dst": "..."},
+      {"op": "copy", "src": "...", "dst": "...", "size": 1234, "mtime_ns": ...},
+      {"op": "write_json", "path": "...", "data": [...], "indent": 2, "ensure_ascii": false}
+    ]
+  }
+
+--apply plan.json executes the operations directly after a cheap staleness check: every
+watched path must still have its recorded mtime (a folder added, removed or renamed inside
+a directory changes that) and every copy source its recorded size and mtime. Stale plans
+are refused unless --force is given. Moves go through move_journal.py, copies through
+publish_images.py, so applying is as safe as a normal run. Plans are plain, stably
+ordered JSON, so they can be reviewed and diffed.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from publish_images import ImagePublisher, print_publish_summary
+
+PLAN_VERSION = 1
+
+
+class PlanRecorder:
+    """Stands in for ImagePublisher while planning: records copies instead of performing them."""
+
+    def __init__(self):
+        self.copies: List[Tuple[str, str]] = []
+
+    def submit(self, src: str, dst: str) -> None:
+        self.copies.append((src, dst))
+
+
+def dir_stamps(paths: Iterable[str]) -> Dict[str, int]:
+    stamps: Dict[str, int] = {}
+    for path in paths:
+        try:
+            stamps[os.path.abspath(path)] = os.stat(path).st_mtime_ns
+        except OSError:
+            stamps[os.path.abspath(path)] = -1
+    return stamps
+
+
+def move_ops(moves: Sequence[Tuple[str, str]]) -> List[Dict]:
+    return [{"op": "move", "src": src, "dst": dst} for src, dst in moves]
+
+
+def copy_ops(copies: Sequence[Tuple[str, str]]) -> List[Dict]:
+    ops = []
+    for src, dst in copies:
+        st = os.stat(src)
+        ops.append({"op": "copy", "src": src, "dst": dst, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    return ops
+
+
+def write_json_op(path: str, data, indent: Optional[int] = 2, ensure_ascii: bool = False) -> Dict:
+    return {"op": "write_json", "path": path, "data": data, "indent": indent, "ensure_ascii": ensure_ascii}
+
+
+def write_plan(path: str, script: str, operations: List[Dict], watch: Dict[str, int], options: Optional[Dict] = None) -> None:
+    """Write a plan; watch comes from dir_stamps() taken before the scan the plan was computed from."""
+    plan = {
+        "version": PLAN_VERSION,
+        "script": script,
+        "created": time.time(),
+        "watch": watch,
+        "options": options or {},
+        "operations": operations,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    counts: Dict[str, int] = {}
+    for op in operations:
+        counts[op["op"]] = counts.get(op["op"], 0) + 1
+    summary = ", ".join(f"{n} {op}" for op, n in sorted(counts.items())) or "no operations"
+    print(f"Wrote plan: {path} ({summary})")
+
+
+def load_plan(path: str, script: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version in {path}")
+    if plan.get("script") != script:
+        raise ValueError(f"Plan {path} was made by {plan.get('script')}, not {script}")
+    return plan
+
+
+def stale_reasons(plan: Dict) -> List[str]:
+    """Cheap staleness check: stats only, no directory listings or hashing."""
+    reasons: List[str] = []
+    current = dir_stamps(plan.get("watch") or {})
+    for path, mtime_ns in (plan.get("watch") or {}).items():
+        if current.get(path) != mtime_ns:
+            reasons.append(f"changed since planning: {path}")
+    for op in plan.get("operations") or []:
+        if op["op"] == "copy":
+            try:
+                st = os.stat(op["src"])
+                if st.st_size != op["size"] or st.st_mtime_ns != op["mtime_ns"]:
+                    reasons.append(f"source changed: {op['src']}")
+            except OSError:
+                reasons.append(f"source missing: {op['src']}")
+    return reasons
+
+
+def check_plan(plan: Dict, force: bool = False) -> bool:
+    """Print staleness problems; True if the plan may be applied."""
+    reasons = stale_reasons(plan)
+    if not reasons:
+        return True
+    for reason in reasons[:20]:
+        print(f"  STALE: {reason}")
+    if len(reasons) > 20:
+        print(f"  ... and {len(reasons) - 20} more")
+    if force:
+        print("WARNING: Plan is stale; applying anyway (--force)")
+        return True
+    print("ERROR: Plan is stale; re-run with --plan-out to recompute it (or --force to apply anyway)")
+    return False
+
+
+def plan_moves(plan: Dict) -> List[Tuple[str, str]]:
+    return [(op["src"], op["dst"]) for op in plan["operations"] if op["op"] == "move"]
+
+
+def apply_copies(plan: Dict, workers: Optional[int] = None, verify_hash: bool = False) -> Optional[Dict]:
+    """Publish the plan's copy operations with the publish mode the plan was made for."""
+    copies = [op for op in plan["operations"] if op["op"] == "copy"]
+    if not copies:
+        return None
+    publisher = ImagePublisher(workers, verify_hash, plan["options"].get("publish_mode") or "copy")
+    for op in copies:
+        publisher.submit(op["src"], op["dst"])
+    stats = publisher.close()
+    print_publish_summary(stats)
+    return stats
+
+
+def apply_json_writes(plan: Dict) -> List[str]:
+    """Write the plan's JSON outputs atomically; returns the paths written."""
+    written: List[str] = []
+    for op in plan["operations"]:
+        if op["op"] != "write_json":
+            continue
+        path = op["path"]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            if op.get("indent") is None:
+                json.dump(op["data"], f, ensure_ascii=op.get("ensure_ascii", False), separators=(",", ":"))
+            else:
+                json.dump(op["data"], f, indent=op["indent"], ensure_ascii=op.get("ensure_ascii", False))
+        os.replace(tmp, path)
+        print(f"  Wrote: {path}")
+        written.append(path)
+    return written
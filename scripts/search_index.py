@@ -0,0 +1,236 @@
+"""Build-time trigram inverted index for catalog search.
+
+Client-side search scans every entry's name on each keystroke. This module builds, from
+the finished medicines.json, an inverted index from character trigrams to the medicines
+containing them, over these fields:
+
+  name, Brand Name and Composition from `details`, category (plus `categories`)
+
+Index layout (compact JSON):
+
+  {
+    "version": 1,
+    "source": {"sha256": "<medicines.json sha256>"},
+    "fields": ["name", "brand", "composition", "category"],
+    "ids": ["kamagra-100-mg", ...],           doc number -> entry id
+    "texts": ["kamagra 100 mg\\n...\\n...", ...],  normalized fields joined by "\\n"
+    "grams": {"kam": [0, 12, 3], ...}          postings: sorted doc numbers, delta-encoded
+  }
+
+Text is lowercased, accent-stripped and reduced to [a-z0-9] runs separated by single
+spaces, so trigrams span word boundaries inside a field but never across fields. A
+substring query intersects the posting lists of its trigrams (shortest first) and then
+verifies the candidates against `texts`, so results match a plain substring scan exactly.
+Queries shorter than three characters union the postings of every trigram containing them
+(fields shorter than three characters have no trigrams and are only found by longer queries).
+
+Usage (PowerShell):
+  py .\\scripts\\search_index.py build --json "s:\\MedCare\\src\\data\\medicines.json" --out "s:\\MedCare\\public\\catalog\\search-index.json"
+  py .\\scripts\\search_index.py query --index "s:\\MedCare\\public\\catalog\\search-index.json" tadalafil
+
+The unified generator runs the same build with --search-index.
+"""
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import argparse
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from catalog_artifacts import dump_compact, load_entries, load_index, sha256_file, write_if_changed
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_FIELDS = ["name", "brand", "composition", "category"]
+NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(value) -> str:
+    s = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode("ascii").lower()
+    return NON_ALNUM_RE.sub(" ", s).strip()
+
+
+def trigrams(text: str) -> Iterable[str]:
+    for i in range(len(text) - 2):
+        yield text[i:i + 3]
+
+
+def detail_value(entry: Dict, label: str) -> str:
+    for row in entry.get("details") or []:
+        if isinstance(row, dict) and str(row.get("label") or "").strip().lower() == label:
+            return str(row.get("value") or "")
+    return ""
+
+
+def entry_fields(entry: Dict) -> List[str]:
+    """Normalized values for SEARCH_FIELDS, in order."""
+    cats = entry.get("categories") if isinstance(entry.get("categories"), list) and entry.get("categories") else [entry.get("category")]
+    return [
+        normalize_text(entry.get("name")),
+        normalize_text(detail_value(entry, "brand name")),
+        normalize_text(detail_value(entry, "composition")),
+        normalize_text(" ".join(str(c) for c in cats if c)),
+    ]
+
+
+def delta_encode(postings: Sequence[int]) -> List[int]:
+    out: List[int] = []
+    prev = 0
+    for n in postings:
+        out.append(n - prev)
+        prev = n
+    return out
+
+
+def delta_decode(deltas: Sequence[int]) -> List[int]:
+    out: List[int] = []
+    total = 0
+    for d in deltas:
+        total += d
+        out.append(total)
+    return out
+
+
+def build_search_index(entries: List[Dict], source_sha256: Optional[str] = None) -> Dict:
+    ids: List[str] = []
+    texts: List[str] = []
+    postings: Dict[str, List[int]] = {}
+    for e in entries:
+        if not isinstance(e, dict) or not e.get("id") or e.get("deletedAt"):
+            continue
+        doc = len(ids)
+        fields = entry_fields(e)
+        ids.append(str(e["id"]))
+        texts.append("\n".join(fields))
+        seen = set()
+        for field in fields:
+            seen.update(trigrams(field))
+        # Docs are visited in increasing order, so every posting list stays sorted
+        for gram in seen:
+            postings.setdefault(gram, []).append(doc)
+    return {
+        "version": SEARCH_INDEX_VERSION,
+        "source": {"sha256": source_sha256} if source_sha256 else None,
+        "fields": SEARCH_FIELDS,
+        "ids": ids,
+        "texts": texts,
+        "grams": {g: delta_encode(p) for g, p in sorted(postings.items())},
+    }
+
+
+def write_search_index(entries: List[Dict], path: str, source_sha256: Optional[str] = None) -> Dict:
+    index = build_search_index(entries, source_sha256)
+    payload = dump_compact(index)
+    write_if_changed(path, payload)
+    print(f"  Search index: {len(index['ids'])} docs, {len(index['grams'])} trigrams, {len(payload)} bytes -> {path}")
+    return index
+
+
+def search_index_up_to_date(path: str, source_sha256: Optional[str]) -> bool:
+    index = load_index(path)
+    return bool(source_sha256) and index.get("version") == SEARCH_INDEX_VERSION and (index.get("source") or {}).get("sha256") == source_sha256
+
+
+class SearchIndex:
+    """Loaded index with posting lists decoded lazily and cached."""
+
+    def __init__(self, data: Dict):
+        self.ids: List[str] = data["ids"]
+        self.texts: List[str] = data["texts"]
+        self._grams: Dict[str, List[int]] = data["grams"]
+        self._decoded: Dict[str, List[int]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def postings(self, gram: str) -> List[int]:
+        cached = self._decoded.get(gram)
+        if cached is None:
+            cached = self._decoded[gram] = delta_decode(self._grams.get(gram) or [])
+        return cached
+
+    def candidates(self, q: str) -> List[int]:
+        if len(q) < 3:
+            docs = set()
+            for gram in self._grams:
+                if q in gram:
+                    docs.update(self.postings(gram))
+            return sorted(docs)
+        lists = sorted((self.postings(g) for g in set(trigrams(q))), key=len)
+        if not lists[0]:
+            return []
+        result = set(lists[0])
+        for plist in lists[1:]:
+            result.intersection_update(plist)
+            if not result:
+                break
+        return sorted(result)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Return ids of entries whose indexed fields contain query; name matches rank first."""
+        q = normalize_text(query)
+        if not q:
+            return []
+        in_name: List[int] = []
+        elsewhere: List[int] = []
+        for doc in self.candidates(q):
+            fields = self.texts[doc].split("\n")
+            if q in fields[0]:
+                in_name.append(doc)
+            elif any(q in f for f in fields[1:]):
+                elsewhere.append(doc)
+        docs = in_name + elsewhere
+        if limit is not None:
+            docs = docs[:limit]
+        return [self.ids[d] for d in docs]
+
+
+def linear_search(texts: Sequence[str], query: str) -> List[int]:
+    """Baseline full scan over the same normalized texts (used for benchmarking)."""
+    q = normalize_text(query)
+    return [i for i, t in enumerate(texts) if q and any(q in f for f in t.split("\n"))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the catalog trigram search index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Build the index from medicines.json")
+    p_build.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="Source medicines.json")
+    p_build.add_argument("--out", default=os.path.join(os.getcwd(), "public", "catalog", "search-index.json"), help="Index output path")
+
+    p_query = sub.add_parser("query", help="Run queries against a built index")
+    p_query.add_argument("--index", default=os.path.join(os.getcwd(), "public", "catalog", "search-index.json"), help="Index path")
+    p_query.add_argument("--limit", type=int, default=10, help="Maximum results to print per query")
+    p_query.add_argument("--repeat", type=int, default=200, help="Timing repetitions per query")
+    p_query.add_argument("queries", nargs="+", help="Query strings")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        write_search_index(load_entries(args.json), args.out, sha256_file(args.json))
+        return
+
+    index = SearchIndex.load(args.index)
+    for query in args.queries:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            index._decoded.clear()
+            ids = index.search(query)
+        indexed_ms = (time.perf_counter() - started) * 1000 / args.repeat
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            linear = linear_search(index.texts, query)
+        linear_ms = (time.perf_counter() - started) * 1000 / args.repeat
+        if sorted(ids) != sorted(index.ids[d] for d in linear):
+            print(f"ERROR: index and linear scan disagree for '{query}'")
+        print(f"'{query}': {len(ids)} matches, index {indexed_ms:.3f} ms vs scan {linear_ms:.3f} ms")
+        for eid in ids[:args.limit]:
+            print(f"  {eid}")
+
+
+if __name__ == "__main__":
+    main()
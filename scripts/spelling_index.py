@@ -0,0 +1,252 @@
+"""Typo-tolerant search dictionary (SymSpell-style symmetric deletes) for the catalog.
+
+Customers misspell drug names ("tadalafill", "ivermectine", "azithromicin"). Comparing a
+query against every known word is O(vocabulary) per keystroke. SymSpell instead
+precomputes, for every dictionary word, all strings reachable by deleting up to
+`max_distance` characters (from the word's first `prefix_length` characters). At query
+time the same deletes are generated for the input and looked up in that table, so the
+cost depends on the query length, not the vocabulary size; only the handful of
+candidates found are verified with an edit distance.
+
+Vocabulary: alphabetic tokens (4+ letters) from entry names, Brand Name and Composition in
+`details`, plus the generic names in auto_fill_details.ACTIVE_KEYWORDS. Word frequency
+breaks ties between equally close suggestions.
+
+File layout (compact JSON):
+
+  {
+    "version": 1,
+    "source": {"sha256": "<medicines.json sha256>"},
+    "max_distance": 2,
+    "prefix_length": 7,
+    "words": ["tadalafil", ...],
+    "counts": [31, ...],
+    "deletes": {"tadalaf": [0], "adalaf": [0, 57], ...}   delete -> word indexes
+  }
+
+Usage (PowerShell):
+  py .\\scripts\\spelling_index.py build --json "s:\\MedCare\\src\\data\\medicines.json" --out "s:\\MedCare\\public\\catalog\\spelling-index.json"
+  py .\\scripts\\spelling_index.py query --index "s:\\MedCare\\public\\catalog\\spelling-index.json" tadalafill ivermectine azithromicin
+  py .\\scripts\\spelling_index.py query --json "s:\\MedCare\\src\\data\\medicines.json" --benchmark
+
+--benchmark pads the vocabulary with synthetic words up to 100x its size and reports
+lookup latency at each size, which should stay flat.
+
+The unified generator runs the same build with --spelling-index.
+"""
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import random
+import argparse
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from auto_fill_details import ACTIVE_KEYWORDS
+from catalog_artifacts import dump_compact, load_entries, load_index, sha256_file, write_if_changed
+from search_index import detail_value, normalize_text
+
+SPELLING_INDEX_VERSION = 1
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 4
+WORD_RE = re.compile(r"[a-z]+")
+
+
+def vocabulary(entries: Sequence[Dict]) -> Dict[str, int]:
+    """Word -> frequency over catalog text and ACTIVE_KEYWORDS."""
+    counts: Dict[str, int] = {}
+    for e in entries:
+        if not isinstance(e, dict) or e.get("deletedAt"):
+            continue
+        text = " ".join([str(e.get("name") or ""), detail_value(e, "brand name"), detail_value(e, "composition")])
+        for word in WORD_RE.findall(normalize_text(text)):
+            if len(word) >= MIN_WORD_LENGTH:
+                counts[word] = counts.get(word, 0) + 1
+    for kw in ACTIVE_KEYWORDS:
+        counts.setdefault(kw, 1)
+    return counts
+
+
+def deletes(word: str, max_distance: int) -> Set[str]:
+    """All strings obtained by deleting up to max_distance characters from word (including word)."""
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        nxt = set()
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= out
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count once); > max_distance if exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            row_min = min(row_min, v)
+        if row_min > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def build_spelling_index(counts: Dict[str, int], source_sha256: Optional[str] = None, max_distance: int = MAX_DISTANCE, prefix_length: int = PREFIX_LENGTH) -> Dict:
+    words = sorted(counts)
+    table: Dict[str, List[int]] = {}
+    for idx, word in enumerate(words):
+        for d in deletes(word[:prefix_length], max_distance):
+            table.setdefault(d, []).append(idx)
+    return {
+        "version": SPELLING_INDEX_VERSION,
+        "source": {"sha256": source_sha256} if source_sha256 else None,
+        "max_distance": max_distance,
+        "prefix_length": prefix_length,
+        "words": words,
+        "counts": [counts[w] for w in words],
+        "deletes": dict(sorted(table.items())),
+    }
+
+
+def write_spelling_index(entries: List[Dict], path: str, source_sha256: Optional[str] = None) -> Dict:
+    index = build_spelling_index(vocabulary(entries), source_sha256)
+    payload = dump_compact(index)
+    write_if_changed(path, payload)
+    print(f"  Spelling index: {len(index['words'])} words, {len(index['deletes'])} deletes, {len(payload)} bytes -> {path}")
+    return index
+
+
+def spelling_index_up_to_date(path: str, source_sha256: Optional[str]) -> bool:
+    index = load_index(path)
+    return bool(source_sha256) and index.get("version") == SPELLING_INDEX_VERSION and (index.get("source") or {}).get("sha256") == source_sha256
+
+
+class SpellingIndex:
+    def __init__(self, data: Dict):
+        self.words: List[str] = data["words"]
+        self.counts: List[int] = data["counts"]
+        self.max_distance: int = data["max_distance"]
+        self.prefix_length: int = data["prefix_length"]
+        self._deletes: Dict[str, List[int]] = data["deletes"]
+        self._known = {w: i for i, w in enumerate(self.words)}
+
+    @classmethod
+    def load(cls, path: str) -> "SpellingIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def lookup(self, term: str, max_distance: Optional[int] = None, limit: int = 3) -> List[Tuple[str, int, int]]:
+        """Return up to `limit` (word, distance, count) suggestions, closest then most frequent first."""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        term = term.lower()
+        if term in self._known:
+            return [(term, 0, self.counts[self._known[term]])]
+        seen: Set[int] = set()
+        found: List[Tuple[int, int, str]] = []
+        for d in deletes(term[:self.prefix_length], max_distance):
+            for idx in self._deletes.get(d, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                word = self.words[idx]
+                dist = edit_distance(term, word, max_distance)
+                if dist <= max_distance:
+                    found.append((dist, -self.counts[idx], word))
+        found.sort()
+        return [(w, dist, -neg) for dist, neg, w in found[:limit]]
+
+    def correct(self, query: str) -> str:
+        """Replace each unknown word of query with its best suggestion, leaving short/numeric tokens alone."""
+        out: List[str] = []
+        for token in normalize_text(query).split():
+            if len(token) >= MIN_WORD_LENGTH and token.isalpha():
+                hits = self.lookup(token, limit=1)
+                out.append(hits[0][0] if hits else token)
+            else:
+                out.append(token)
+        return " ".join(out)
+
+
+def linear_lookup(words: Sequence[str], term: str, max_distance: int) -> List[str]:
+    """Baseline: compare term against every word (used for benchmarking)."""
+    return [w for w in words if edit_distance(term, w, max_distance) <= max_distance]
+
+
+def synthetic_words(n: int, rng: random.Random) -> Iterable[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    for _ in range(n):
+        yield "".join(rng.choice(letters) for _ in range(rng.randint(6, 14)))
+
+
+def run_benchmark(counts: Dict[str, int], queries: Sequence[str], repeat: int) -> None:
+    rng = random.Random(42)
+    base = len(counts)
+    for factor in (1, 10, 100):
+        padded = dict(counts)
+        for w in synthetic_words(base * factor - base, rng):
+            padded.setdefault(w, 1)
+        started = time.perf_counter()
+        index = SpellingIndex(build_spelling_index(padded))
+        build_s = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for q in queries:
+                index.lookup(q)
+        lookup_us = (time.perf_counter() - started) * 1e6 / (repeat * len(queries))
+        started = time.perf_counter()
+        for q in queries:
+            linear_lookup(index.words, q, index.max_distance)
+        linear_us = (time.perf_counter() - started) * 1e6 / len(queries)
+        print(f"  {len(padded):>7} words: build {build_s:.2f}s, lookup {lookup_us:.1f} us/query, linear scan {linear_us:.1f} us/query")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the catalog typo-tolerant spelling index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Build the delete dictionary from medicines.json")
+    p_build.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="Source medicines.json")
+    p_build.add_argument("--out", default=os.path.join(os.getcwd(), "public", "catalog", "spelling-index.json"), help="Index output path")
+
+    p_query = sub.add_parser("query", help="Suggest corrections (from --index, or built in memory from --json)")
+    p_query.add_argument("--index", default=None, help="Built spelling index path")
+    p_query.add_argument("--json", default=os.path.join(os.getcwd(), "src", "data", "medicines.json"), help="medicines.json to build from when --index is not given")
+    p_query.add_argument("--benchmark", action="store_true", help="Measure lookup latency as the vocabulary grows 1x/10x/100x")
+    p_query.add_argument("--repeat", type=int, default=200, help="Benchmark repetitions per query")
+    p_query.add_argument("terms", nargs="*", help="Misspelled words or queries")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        write_spelling_index(load_entries(args.json), args.out, sha256_file(args.json))
+        return
+
+    if args.benchmark:
+        terms = args.terms or ["tadalafill", "ivermectine", "azithromicin", "paracetmol", "sildenafl"]
+        run_benchmark(vocabulary(load_entries(args.json)), terms, args.repeat)
+        return
+    index = SpellingIndex.load(args.index) if args.index else SpellingIndex(build_spelling_index(vocabulary(load_entries(args.json))))
+    for term in args.terms:
+        suggestions = ", ".join(f"{w} (d={d}, n={n})" for w, d, n in index.lookup(term)) or "no suggestion"
+        print(f"{term} -> {index.correct(term)}  [{suggestions}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Statistical fallback classifier for folders keyword matching leaves in Unclear.
+
+detect_category only knows the keywords in CATEGORY_KEYWORDS; everything else lands in
+Unclear (211 of 516 folders in medicines/ today). This module learns from the folders that
+are already categorized:
+
+  features  character 2–4-grams of the normalized folder name, sublinear TF × smoothed IDF,
+            rows L2-normalized (a SciPy CSR matrix)
+  model     multinomial logistic regression (softmax) trained with full-batch gradient
+            descent in NumPy
+
+and scores every Unclear folder in one sparse matrix multiply, proposing a category with
+its probability as the confidence. The model is saved as a single .npz (vocabulary, IDF,
+weights, class names), so scoring thousands of names only costs loading it plus one
+multiply.
+
+Requirements:
+  pip install numpy scipy
+
+Usage (PowerShell):
+  # Train from the categorized tree (Unclear is excluded from training)
+  py .\\scripts\\unclear_classifier.py train --medicines-dir "s:\\MedCare\\medicines" --model "s:\\MedCare\\medicines.classifier.npz"
+
+  # Propose categories for everything in Unclear
+  py .\\scripts\\unclear_classifier.py score --medicines-dir "s:\\MedCare\\medicines" --model "s:\\MedCare\\medicines.classifier.npz" --report proposals.json
+
+categorize_medicines.py and categorize_medicines_web2.py accept --classifier-model to use
+the proposals for folders keyword matching cannot place.
+"""
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import argparse
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except Exception:  # pragma: no cover - optional dependency notification
+    np = None
+    sparse = None
+
+from medicine_tree import walk_tree
+
+UNCLEAR_CATEGORY = "Unclear"
+NGRAM_RANGE = (2, 4)
+MODEL_VERSION = 1
+NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _require_deps() -> None:
+    if np is None or sparse is None:
+        raise RuntimeError("numpy and scipy are required for the Unclear classifier. See script header for install steps.")
+
+
+def normalize_name(name: str) -> str:
+    # Pad with spaces so word starts/ends get their own n-grams
+    return f" {NON_ALNUM_RE.sub(' ', name.lower()).strip()} "
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> List[str]:
+    lo, hi = ngram_range
+    return [text[i:i + n] for n in range(lo, hi + 1) for i in range(len(text) - n + 1)]
+
+
+class UnclearClassifier:
+    def __init__(self, vocab: Dict[str, int], idf, weights, bias, classes: Sequence[str], ngram_range: Tuple[int, int] = NGRAM_RANGE):
+        self.vocab = vocab
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.classes = list(classes)
+        self.ngram_range = ngram_range
+
+    def transform(self, names: Sequence[str]):
+        """TF-IDF CSR matrix (rows L2-normalized) for names; unknown n-grams are ignored."""
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for name in names:
+            counts: Dict[int, int] = {}
+            for gram in char_ngrams(normalize_name(name), self.ngram_range):
+                col = self.vocab.get(gram)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        X = sparse.csr_matrix((np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)), shape=(len(names), len(self.vocab)))
+        X.data = 1.0 + np.log(X.data)
+        X = X.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ X
+
+    def predict_proba(self, names: Sequence[str]):
+        scores = self.transform(names) @ self.weights + self.bias
+        return _softmax(scores)
+
+    def predict(self, names: Sequence[str]) -> List[Tuple[str, float]]:
+        """Return (category, confidence) per name from one batched multiply."""
+        if not names:
+            return []
+        proba = self.predict_proba(names)
+        best = proba.argmax(axis=1)
+        return [(self.classes[c], float(proba[i, c])) for i, c in enumerate(best)]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        grams = sorted(self.vocab, key=self.vocab.get)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            version=np.array(MODEL_VERSION),
+            vocab=np.array(grams),
+            idf=self.idf,
+            weights=self.weights,
+            bias=self.bias,
+            classes=np.array(self.classes),
+            ngram_range=np.array(self.ngram_range),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "UnclearClassifier":
+        _require_deps()
+        with np.load(path, allow_pickle=False) as z:
+            if int(z["version"]) != MODEL_VERSION:
+                raise RuntimeError(f"Unsupported classifier model version in {path}; retrain it.")
+            vocab = {g: i for i, g in enumerate(z["vocab"].tolist())}
+            lo, hi = (int(n) for n in z["ngram_range"])
+            return cls(vocab, z["idf"], z["weights"], z["bias"], z["classes"].tolist(), (lo, hi))
+
+
+def _softmax(scores):
+    scores = np.asarray(scores)
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def train(names: Sequence[str], labels: Sequence[str], epochs: int = 300, learning_rate: float = 2.0, l2: float = 1e-4, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> UnclearClassifier:
+    """Fit TF-IDF features and a softmax regression on (name, category) pairs."""
+    _require_deps()
+    if not names:
+        raise ValueError("No categorized folders to train on")
+    vocab: Dict[str, int] = {}
+    df: Dict[int, int] = {}
+    for name in names:
+        for gram in set(char_ngrams(normalize_name(name), ngram_range)):
+            col = vocab.setdefault(gram, len(vocab))
+            df[col] = df.get(col, 0) + 1
+    n_docs = len(names)
+    df_arr = np.array([df[i] for i in range(len(vocab))], dtype=np.float64)
+    idf = np.log((1.0 + n_docs) / (1.0 + df_arr)) + 1.0
+
+    classes = sorted(set(labels))
+    class_index = {c: i for i, c in enumerate(classes)}
+    y = np.zeros((n_docs, len(classes)))
+    y[np.arange(n_docs), [class_index[l] for l in labels]] = 1.0
+
+    model = UnclearClassifier(vocab, idf, np.zeros((len(vocab), len(classes))), np.zeros(len(classes)), classes, ngram_range)
+    X = model.transform(names)
+    Xt = X.T.tocsr()
+    for _ in range(epochs):
+        grad = (_softmax(X @ model.weights + model.bias) - y) / n_docs
+        model.weights -= learning_rate * (Xt @ grad + l2 * model.weights)
+        model.bias -= learning_rate * grad.sum(axis=0)
+    return model
+
+
+def collect_training_data(medicines_dir: str, exclude: Sequence[str] = (UNCLEAR_CATEGORY,)) -> Tuple[List[str], List[str]]:
+    names: List[str] = []
+    labels: List[str] = []
+    for folder in walk_tree(medicines_dir, with_images=False):
+        if folder.category not in exclude:
+            names.append(folder.name)
+            labels.append(folder.category)
+    return names, labels
+
+
+def default_model_path(medicines_dir: str) -> str:
+    return f"{os.path.abspath(medicines_dir).rstrip(os.sep)}.classifier.npz"
+
+
+def propose_categories(model: UnclearClassifier, names: Sequence[str], allowed: Optional[Sequence[str]] = None, min_confidence: float = 0.0) -> Dict[str, Tuple[str, float]]:
+    """Batch-score names, proposing each one's most probable category among `allowed`.
+
+    Disallowed classes are masked out before the argmax, so min_confidence applies to the
+    best eligible category; names whose best eligible probability is below it are dropped.
+    """
+    out: Dict[str, Tuple[str, float]] = {}
+    names = list(names)
+    if not names:
+        return out
+    proba = np.asarray(model.predict_proba(names))
+    if allowed is not None:
+        allowed_set = set(allowed)
+        mask = np.array([c in allowed_set for c in model.classes])
+        if not mask.any():
+            return out
+        proba = np.where(mask, proba, -1.0)
+    best = proba.argmax(axis=1)
+    for i, (name, c) in enumerate(zip(names, best)):
+        confidence = float(proba[i, c])
+        if confidence >= min_confidence:
+            out[name] = (model.classes[c], confidence)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train or apply the character n-gram classifier for Unclear medicine folders.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("train", "Train from categorized folders"), ("score", "Propose categories for Unclear folders")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--medicines-dir", default=os.path.join(os.getcwd(), "medicines"), help="Categorized medicines directory")
+        p.add_argument("--model", default=None, help="Model path (default: <medicines-dir>.classifier.npz)")
+        if name == "train":
+            p.add_argument("--epochs", type=int, default=300, help="Gradient descent iterations")
+            p.add_argument("--holdout", type=float, default=0.0, help="Fraction of folders held out to report accuracy (0 = train on all)")
+        else:
+            p.add_argument("--category", default=UNCLEAR_CATEGORY, help="Category folder whose contents are scored")
+            p.add_argument("--min-confidence", type=float, default=0.0, help="Only print proposals at or above this confidence")
+            p.add_argument("--report", default=None, help="Write proposals as JSON")
+    args = parser.parse_args()
+    _require_deps()
+
+    model_path = args.model or default_model_path(args.medicines_dir)
+    if not os.path.isdir(args.medicines_dir):
+        print(f"ERROR: Medicines directory not found: {args.medicines_dir}")
+        return
+
+    if args.command == "train":
+        names, labels = collect_training_data(args.medicines_dir)
+        if args.holdout > 0:
+            rng = np.random.default_rng(0)
+            order = rng.permutation(len(names))
+            cut = int(len(names) * (1 - args.holdout))
+            train_idx, test_idx = order[:cut], order[cut:]
+            started = time.perf_counter()
+            model = train([names[i] for i in train_idx], [labels[i] for i in train_idx], epochs=args.epochs)
+            predicted = model.predict([names[i] for i in test_idx])
+            correct = sum(1 for (cat, _), i in zip(predicted, test_idx) if cat == labels[i])
+            print(f"Holdout accuracy: {correct}/{len(test_idx)} ({100.0 * correct / max(1, len(test_idx)):.1f}%) trained in {time.perf_counter() - started:.2f}s")
+        started = time.perf_counter()
+        model = train(names, labels, epochs=args.epochs)
+        model.save(model_path)
+        print(f"Trained on {len(names)} folders, {len(model.classes)} categories, {len(model.vocab)} n-grams in {time.perf_counter() - started:.2f}s")
+        print(f"Wrote {model_path}")
+        return
+
+    names = [f.name for f in walk_tree(args.medicines_dir, categories=[args.category], with_images=False)]
+    started = time.perf_counter()
+    proposals = propose_categories(UnclearClassifier.load(model_path), names)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    shown = 0
+    for name in names:
+        category, confidence = proposals[name]
+        if confidence >= args.min_confidence:
+            print(f"{confidence:.2f}  {category:<28} {name}")
+            shown += 1
+    print(f"\nSummary:\n  Scored: {len(names)} folders in {elapsed_ms:.1f} ms (including model load)\n  Shown (>= {args.min_confidence:.2f}): {shown}")
+    if args.report:
+        report = [{"name": n, "category": proposals[n][0], "confidence": round(proposals[n][1], 4)} for n in names]
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"  Wrote: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 """
 Update product names in src/data/medicines.json using OCR from product images.
 
-This script reads medicines.json, runs OCR on each product's first available image,
-extracts a likely display name (e.g., "Iressa Tablet", "Rolimus Everolimus"),
-and optionally updates the JSON file. By default it performs a dry run and prints
-the proposed changes.
+This script reads medicines.json, runs OCR on each product's images, extracts a likely
+display name (e.g., "Iressa Tablet", "Rolimus Everolimus"), and optionally updates the
+JSON file. By default it performs a dry run and prints the proposed changes.
+
+Images of an entry are tried in order of expected text density (busy packaging before
+plain pills), one round at a time: every entry's best image is OCR'd in one batch, and
+only entries whose name line is still below --min-confidence (tesseract's mean word
+confidence for that line) go on to their next image. Most entries stop after one image.
+The most confident candidate wins; names below the threshold are not applied but listed
+for review, and --report writes every entry's candidates and confidences to JSON.
 
 Requirements:
   - Python packages: pillow, pytesseract
@@ -21,23 +27,33 @@ Usage examples:
   # Apply changes to medicines.json in-place
   py scripts/update_names_from_ocr.py --root "s:\\MedCare" --json "src\\data\\medicines.json" --apply
 
+  # Stricter acceptance, at most 3 images per entry, review report
+  py scripts/update_names_from_ocr.py --root "s:\\MedCare" --min-confidence 85 --max-images 3 --report "s:\\MedCare\\ocr-review.json"
+
+  # Exercise / benchmark the update flow without tesseract (canned text, optional fixtures)
+  py scripts/update_names_from_ocr.py --root "s:\\MedCare" --ocr-backend stub --ocr-fixtures ocr-fixtures.json
+
 Notes:
   - The script uses the `images` array in medicines.json when available; falls back to `image`.
+  - Backends without confidences (none currently) accept the first image with a name.
   - Heuristics aim for practical accuracy but may require manual review.
+  - OCR runs through ocr_backends.py. The default tesseract-batch backend OCRs many images
+    per tesseract process (--batch-size) instead of one process per image; see that
+    module for the other backends. --preprocess picks an ocr_preprocess.py profile
+    (downscale, binarize, deskew, crop to text) applied before OCR.
 """
 from __future__ import annotations
 import os
 import re
 import json
+import time
 import argparse
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+from ocr_backends import OCR_BACKENDS, DEFAULT_BATCH_SIZE, get_backend
+from ocr_preprocess import PROFILES, summarize_reports, print_timing_summary, text_density
 
-try:
-    from PIL import Image
-    import pytesseract
-except Exception as e:  # pragma: no cover - optional dependency notification
-    Image = None
-    pytesseract = None
+DEFAULT_MIN_CONFIDENCE = 80.0
 
 
 def load_json(path: str):
@@ -52,34 +68,34 @@ FORM_WORDS = [
 ]
 
 
-def ocr_image(path: str) -> str:
-    if Image is None or pytesseract is None:
-        raise RuntimeError("pytesseract and pillow are required. See script header for install steps.")
-    img = Image.open(path)
-    # Simple pre-processing: convert to grayscale
-    img = img.convert("L")
-    # OCR
-    text = pytesseract.image_to_string(img)
-    return text
+def pick_name_line(lines: List[str]) -> Optional[int]:
+    """Index of the line most likely to hold the product name."""
+    for i, ln in enumerate(lines):
+        for w in FORM_WORDS:
+            if w.lower() in ln.lower():
+                return i
+    if lines:
+        # fallback: pick the longest reasonable line
+        return max(range(len(lines)), key=lambda i: len(lines[i]))
+    return None
+
+
+def name_confidence(text: str, line_confidences: Optional[List[float]]) -> Optional[float]:
+    """OCR confidence of the line extract_name_brand takes the name from."""
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    idx = pick_name_line(lines)
+    if idx is None or line_confidences is None or idx >= len(line_confidences):
+        return None
+    return line_confidences[idx]
 
 
 def extract_name_brand(text: str) -> Tuple[Optional[str], Optional[str]]:
     # Consider line-based analysis
     lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    best_line = None
-    for ln in lines:
-        for w in FORM_WORDS:
-            if w.lower() in ln.lower():
-                best_line = ln
-                break
-        if best_line:
-            break
-    if not best_line and lines:
-        # fallback: pick the longest reasonable line
-        best_line = max(lines, key=len)
-
-    if not best_line:
+    idx = pick_name_line(lines)
+    if idx is None:
         return None, None
+    best_line = lines[idx]
 
     # Remove dosage tokens and excessive symbols
     cleaned = DOSAGE_RE.sub("", best_line)
@@ -120,52 +136,171 @@ def extract_name_brand(text: str) -> Tuple[Optional[str], Optional[str]]:
     return (name if name else None), brand
 
 
+def resolve_image(root: str, url: str) -> Optional[str]:
+    """Image path under root/public, else relative to root; None if missing."""
+    img_rel = url.lstrip("/").replace("/", os.sep)  # e.g., medicines/slug/file.jpg
+    for candidate in (os.path.join(root, "public", img_rel), os.path.join(root, img_rel)):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def order_by_text_density(paths: List[str]) -> List[str]:
+    """Most text-like images first; unreadable ones last. Stable for equal scores."""
+    scores: Dict[str, float] = {}
+    for path in paths:
+        try:
+            scores[path] = text_density(path)
+        except Exception:
+            scores[path] = -1.0
+    return sorted(paths, key=lambda p: -scores[p])
+
+
+def best_candidate(candidates: List[Dict]) -> Optional[Dict]:
+    named = [c for c in candidates if c.get("name")]
+    if not named:
+        return None
+    return max(named, key=lambda c: -1.0 if c.get("confidence") is None else c["confidence"])
+
+
 def main():
     ap = argparse.ArgumentParser(description="Update medicine names from OCR of images.")
     ap.add_argument("--root", required=True, help="Project root path. Used to resolve /medicines paths.")
     ap.add_argument("--json", default=os.path.join("src", "data", "medicines.json"), help="Path to medicines.json")
     ap.add_argument("--apply", action="store_true", help="Write changes back to JSON")
     ap.add_argument("--limit", type=int, default=0, help="Limit number of entries to process (0=all)")
+    ap.add_argument("--ocr-backend", choices=OCR_BACKENDS, default="tesseract-batch", help="OCR implementation (default: tesseract-batch)")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Images per tesseract process for tesseract-batch (default: {DEFAULT_BATCH_SIZE})")
+    ap.add_argument("--preprocess", choices=sorted(PROFILES), default="none", help="Image preprocessing profile before OCR (see ocr_preprocess.py; default: none)")
+    ap.add_argument("--ocr-fixtures", help="JSON of canned OCR text for the stub backend ({image path|file name|folder: text})")
+    ap.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE, help=f"Name-line confidence that accepts a name and stops trying further images (default: {DEFAULT_MIN_CONFIDENCE:g})")
+    ap.add_argument("--max-images", type=int, default=0, help="Try at most this many images per entry (0=all)")
+    ap.add_argument("--report", help="Write per-entry candidates and confidences to this JSON file for review")
     args = ap.parse_args()
 
+    try:
+        backend = get_backend(args.ocr_backend, batch_size=args.batch_size, fixtures=args.ocr_fixtures, preprocess=args.preprocess)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        return
+
     data = load_json(args.json)
     updated = 0
 
+    # Resolve every image first; each entry's images in order of expected text
+    queue: List[Tuple[Dict, List[str]]] = []
+    urls: Dict[str, str] = {}
+    start = time.perf_counter()
     for i, item in enumerate(data):
         if args.limit and i >= args.limit:
             break
         images = item.get("images") or ([item.get("image")] if item.get("image") else [])
         if not images:
             continue
-        # Resolve first image path under root/public
-        img_rel = images[0].lstrip("/")  # e.g., medicines/slug/file.jpg
-        img_path = os.path.join(args.root, "public", img_rel.replace("/", os.sep))
-        if not os.path.exists(img_path):
-            # Try direct relative to root
-            img_path = os.path.join(args.root, img_rel.replace("/", os.sep))
-            if not os.path.exists(img_path):
-                print(f"[skip] image not found for {item.get('id')}: {images[0]}")
-                continue
+        paths: List[str] = []
+        for url in images:
+            path = resolve_image(args.root, url)
+            if path and path not in paths:
+                paths.append(path)
+                urls[path] = url
+        if not paths:
+            print(f"[skip] image not found for {item.get('id')}: {images[0]}")
+            continue
+        if len(paths) > 1:
+            paths = order_by_text_density(paths)
+        if args.max_images:
+            paths = paths[:args.max_images]
+        queue.append((item, paths))
+    order_seconds = time.perf_counter() - start
 
-        try:
-            text = ocr_image(img_path)
-        except Exception as e:
-            print(f"[error] OCR failed for {item.get('id')}: {e}")
+    # Round n OCRs the n-th image of every entry still below the confidence threshold, as one batch
+    results: Dict[str, Dict] = {}
+    candidates: List[List[Dict]] = [[] for _ in queue]
+    active = list(range(len(queue)))
+    ocr_seconds = 0.0
+    round_no = 0
+    try:
+        while active:
+            batch = sorted({queue[k][1][round_no] for k in active} - set(results))
+            start = time.perf_counter()
+            texts, errors = backend.recognize(batch)
+            ocr_seconds += time.perf_counter() - start
+            for path, err in errors:
+                results[path] = {"error": err}
+            for path, text in texts.items():
+                name, brand = extract_name_brand(text)
+                results[path] = {"name": name, "brand": brand, "confidence": name_confidence(text, backend.confidences.get(path))}
+            still_open = []
+            for k in active:
+                path = queue[k][1][round_no]
+                cand = {"image": urls[path], **results[path]}
+                candidates[k].append(cand)
+                confident = cand.get("name") and (cand.get("confidence") is None or cand["confidence"] >= args.min_confidence)
+                if not confident and round_no + 1 < len(queue[k][1]):
+                    still_open.append(k)
+            active = still_open
+            round_no += 1
+    finally:
+        backend.close()
+
+    report: List[Dict] = []
+    below = 0
+    for (item, paths), tried in zip(queue, candidates):
+        best = best_candidate(tried)
+        old_name = item.get("name")
+        entry = {
+            "id": item.get("id"),
+            "name": old_name,
+            "ocr_name": best["name"] if best else None,
+            "brand": best["brand"] if best else None,
+            "confidence": best["confidence"] if best else None,
+            "image": best["image"] if best else None,
+            "images_tried": len(tried),
+            "images_total": len(paths),
+            "candidates": tried,
+        }
+        report.append(entry)
+        if not best:
+            failures = [c for c in tried if c.get("error")]
+            if len(failures) == len(tried):
+                entry["status"] = "error"
+                print(f"[error] OCR failed for {item.get('id')}: {failures[0]['error']}")
+            else:
+                entry["status"] = "no-name"
+                print(f"[info] No name detected for {item.get('id')} (kept: {old_name})")
             continue
 
-        new_name, brand = extract_name_brand(text)
-        if not new_name:
-            print(f"[info] No name detected for {item.get('id')} (kept: {item.get('name')})")
+        new_name, brand, confidence = best["name"], best["brand"], best["confidence"]
+        conf_note = f" (confidence {confidence:.0f})" if confidence is not None else ""
+        if not (new_name != old_name or (brand and not item.get("brand"))):
+            entry["status"] = "unchanged"
             continue
+        if confidence is not None and confidence < args.min_confidence:
+            entry["status"] = "review"
+            below += 1
+            print(f"[review] {item.get('id')}: '{old_name}' -> '{new_name}'{conf_note} below {args.min_confidence:g}, not applied")
+            continue
+        entry["status"] = "change"
+        print(f"[change] {item.get('id')}: '{old_name}' -> '{new_name}'" + (f" | brand: {brand}" if brand else "") + conf_note)
+        if args.apply:
+            item["name"] = new_name
+            if brand:
+                item["brand"] = brand
+            updated += 1
 
-        old_name = item.get("name")
-        if new_name != old_name or (brand and not item.get("brand")):
-            print(f"[change] {item.get('id')}: '{old_name}' -> '{new_name}'" + (f" | brand: {brand}" if brand else ""))
-            if args.apply:
-                item["name"] = new_name
-                if brand:
-                    item["brand"] = brand
-                updated += 1
+    images_done = sum(len(t) for t in candidates)
+    failed = sum(1 for r in results.values() if r.get("error"))
+    rate = f", {len(results) / ocr_seconds:.1f} images/s" if ocr_seconds > 0 and results else ""
+    per_entry = f", {images_done / len(queue):.2f} per entry" if queue else ""
+    print(f"OCR ({backend.name}): {len(results)} images in {round_no} rounds, {ocr_seconds:.2f}s{rate}{per_entry}, {failed} failed")
+    print(f"  image ordering: {order_seconds:.2f}s; {below} names below confidence {args.min_confidence:g} left for review")
+    print_timing_summary(args.preprocess, summarize_reports(list(backend.reports.values())))
+
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Wrote review report: {args.report}")
 
     if args.apply:
         with open(args.json, "w", encoding="utf-8") as f:
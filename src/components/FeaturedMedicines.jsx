@@ -4,6 +4,7 @@ import data from '../data/medicines.json';
 import { useScrollAnimation, animationClasses, AnimatedCard } from '../utils/animations.jsx';
 import { useCurrency } from '../store/useStore.jsx';
 import { formatPrice } from '../utils/currency';
+import { responsiveSources } from '../utils/images';
 
 // Pull first 6 actual medicines having an image
 const products = data
@@ -15,17 +16,32 @@ const products = data
     title: m.name,
     price: m.price ?? 0,
     image: m.image || (m.images && m.images[0]) || '',
+    // Keeps the srcset-ready variants (scripts/image_derivatives.py) for <picture>
+    imageMeta: m.imageMeta,
   }));
 
 const FeaturedCard = ({ product, index }) => {
   const { currency } = useCurrency();
+  const sources = responsiveSources(product);
+  const meta = product.imageMeta?.[product.image] || {};
   return (
     <AnimatedCard 
       index={index}
       className="group h-full flex flex-col rounded-2xl border border-emerald-100 bg-white ring-1 ring-emerald-100/60 shadow-sm overflow-hidden transition-all duration-200 hover:-translate-y-1 hover:shadow-md hover:ring-emerald-300/70"
     >
       <div className="relative w-full h-56 md:h-60 lg:h-64">
-        <img src={product.image} alt={product.title} className="absolute inset-0 w-full h-full object-cover" />
+        <picture>
+          {sources.map((s) => (
+            <source key={s.type} type={s.type} srcSet={s.srcSet} sizes="(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 25vw" />
+          ))}
+          <img
+            src={product.image}
+            alt={product.title}
+            width={meta.width}
+            height={meta.height}
+            className="absolute inset-0 w-full h-full object-cover"
+          />
+        </picture>
       </div>
       <div className="p-4 md:p-5 flex-1 flex flex-col">
         <p className="text-xs md:text-sm text-gray-500">{product.category}</p>
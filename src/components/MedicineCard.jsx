@@ -2,22 +2,36 @@ import React, { useState } from 'react';
 import { Link } from 'react-router-dom';
 import { useCurrency } from '../store/useStore.jsx';
 import { formatPrice } from '../utils/currency';
+import { responsiveSources } from '../utils/images';
 import './medicineCard.css';
 
 export default function MedicineCard({ product }) {
   const [loaded, setLoaded] = useState(false);
   const { currency } = useCurrency();
+  const sources = responsiveSources(product);
+  // Dimensions/placeholder precomputed by scripts/image_probe.py (absent on older data)
+  const meta = product.imageMeta?.[product.image] || {};
   
   return (
     <div className={`card ${loaded ? 'is-loaded' : 'is-loading'}`}>
-      <div className="card-image">
-        {!loaded && <div className="img-skeleton" aria-hidden />}
-        <img 
-          src={product.image || product.imageUrl} 
-          alt={product.name} 
-          loading="lazy" 
-          onLoad={() => setLoaded(true)}
-        />
+      <div
+        className="card-image"
+        style={meta.placeholder ? { backgroundImage: `url(${meta.placeholder})`, backgroundSize: 'cover' } : undefined}
+      >
+        {!loaded && !meta.placeholder && <div className="img-skeleton" aria-hidden />}
+        <picture>
+          {sources.map((s) => (
+            <source key={s.type} type={s.type} srcSet={s.srcSet} sizes="(max-width: 640px) 100vw, 320px" />
+          ))}
+          <img 
+            src={product.image || product.imageUrl} 
+            alt={product.name} 
+            width={meta.width}
+            height={meta.height}
+            loading="lazy" 
+            onLoad={() => setLoaded(true)}
+          />
+        </picture>
       </div>
       <div className="card-body">
         <div className="card-category">{Array.isArray(product.categories) && product.categories.length ? product.categories[0] : product.category}</div>
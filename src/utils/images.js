@@ -13,3 +13,18 @@ export const productImages = {
 export function getProductImage(imageKey, fallback) {
   return productImages[imageKey] || fallback || imgPain;
 }
+
+// Build <source> props from the srcset-ready variants the Python pipeline records in
+// entry.imageMeta[url].variants (scripts/image_derivatives.py). AVIF is listed before
+// WebP so browsers that support it prefer the smaller file.
+export function responsiveSources(product, url = product?.image) {
+  const variants = product?.imageMeta?.[url]?.variants;
+  if (!Array.isArray(variants) || variants.length === 0) return [];
+  const byType = {};
+  variants.forEach((v) => {
+    (byType[v.type] ||= []).push(`${encodeURI(v.src)} ${v.width}w`);
+  });
+  return ['image/avif', 'image/webp']
+    .filter((type) => byType[type])
+    .map((type) => ({ type, srcSet: byType[type].join(', ') }));
+}